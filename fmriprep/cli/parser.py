@@ -107,6 +107,13 @@ def _build_parser(**kwargs):
             raise parser.error("Argument can't be less than one.")
         return value
 
+    def _min_zero(value, parser):
+        """Ensure an argument is not negative."""
+        value = int(value)
+        if value < 0:
+            raise parser.error("Argument can't be negative.")
+        return value
+
     def _to_gb(value):
         scale = {'G': 1, 'T': 10**3, 'M': 1e-3, 'K': 1e-6, 'B': 1e-9}
         digits = ''.join([c for c in value if c.isdigit()])
@@ -181,6 +188,7 @@ def _build_parser(**kwargs):
     PathExists = partial(_path_exists, parser=parser)
     IsFile = partial(_is_file, parser=parser)
     PositiveInt = partial(_min_one, parser=parser)
+    NonNegativeInt = partial(_min_zero, parser=parser)
     BIDSFilter = partial(_bids_filter, parser=parser)
     SliceTimeRef = partial(_slice_time_ref, parser=parser)
     FallbackTRT = partial(_fallback_trt, parser=parser)
@@ -320,6 +328,27 @@ def _build_parser(**kwargs):
         action='store_true',
         help='Attempt to reduce memory usage (will increase disk usage in working directory)',
     )
+    g_perfm.add_argument(
+        '--work-compression',
+        action='store',
+        choices=['none', 'fast', 'default'],
+        default='default',
+        help='Compression of NIfTI intermediates in the working directory: uncompressed '
+        '(none; larger, memory-mappable files), gzip level 1 (fast) or the default of each '
+        'writer. Final derivatives are always compressed as required by BIDS.',
+    )
+    g_perfm.add_argument(
+        '--resample-in-mask',
+        dest='resample_mask_dilation',
+        action='store',
+        type=NonNegativeInt,
+        default=None,
+        metavar='DILATION',
+        help='Resample volumetric outputs (in standard spaces and, when it is not an output, '
+        'in T1w space) only within the brain mask dilated by DILATION voxels, setting the '
+        'background to zero. The goodvoxels mask (--project-goodvoxels) is then also empty '
+        'outside the dilated brain mask.',
+    )
     g_perfm.add_argument(
         '--use-plugin',
         '--nipype-plugin-file',
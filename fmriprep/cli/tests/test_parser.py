@@ -230,6 +230,32 @@ def test_use_syn_sdc(tmp_path, args, expectation):
     _reset_config()
 
 
+@pytest.mark.parametrize(
+    ('args', 'expectation'),
+    [
+        ([], None),
+        (['--resample-in-mask', '0'], 0),
+        (['--resample-in-mask', '2'], 2),
+        (['--resample-in-mask', '-1'], SystemExit),
+    ],
+)
+def test_resample_in_mask(tmp_path, args, expectation):
+    bids_path = tmp_path / 'data'
+    out_path = tmp_path / 'out'
+    args = [str(bids_path), str(out_path), 'participant'] + args
+    bids_path.mkdir()
+
+    parser = _build_parser()
+
+    if expectation is SystemExit:
+        with pytest.raises(SystemExit):
+            parser.parse_args(args)
+    else:
+        assert parser.parse_args(args).resample_mask_dilation == expectation
+
+    _reset_config()
+
+
 def test_derivatives(tmp_path):
     """Check the correct parsing of the derivatives argument."""
     bids_path = tmp_path / 'data'
@@ -452,6 +452,9 @@ class execution(_Config):
     """The root folder of the TemplateFlow client."""
     work_dir = Path('work').absolute()
     """Path to a working directory where intermediate results will be available."""
+    work_compression = 'default'
+    """Compression of NIfTI intermediates written to the working directory: ``none``
+    (uncompressed), ``fast`` (gzip level 1) or ``default`` (the writer's default)."""
     write_graph = False
     """Write out the computational graph corresponding to the planned preprocessing."""
     dataset_links = {}
@@ -603,6 +606,9 @@ class workflow(_Config):
     """Fill medial surface with :abbr:`NaNs (not-a-number)` when sampling."""
     project_goodvoxels = False
     """Exclude voxels with locally high coefficient of variation from sampling."""
+    resample_mask_dilation = None
+    """Resample volumetric outputs only within the brain mask, dilated by this number of
+    voxels (``None`` resamples the full field of view)."""
     regressors_all_comps = None
     """Return all CompCor components."""
     regressors_dvars_th = None
@@ -1,10 +1,103 @@
 # emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
 # vi: set ft=python sts=4 ts=4 sw=4 et:
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import cache, wraps
+
+from nipype import logging
+from nipype.interfaces.base import traits
+from niworkflows.interfaces import bids as _nwbids
 from niworkflows.interfaces.bids import DerivativesDataSink as _DDSink
+from niworkflows.interfaces.bids import _DerivativesDataSinkInputSpec
+
+from ..utils import compression
+
+LOGGER = logging.getLogger('nipype.interface')
+
+
+class _DerivativesDataSinkThreadsInputSpec(_DerivativesDataSinkInputSpec):
+    num_threads = traits.Int(1, usedefault=True, desc='Number of threads compressing outputs')
 
 
 class DerivativesDataSink(_DDSink):
+    """Store derivative files, compressing them with ``num_threads`` threads
+
+    ``num_threads`` is set by the ``n_procs`` argument of the node.
+    Inputs that are already in the output format are hard linked or cloned
+    instead of copied, and uncompressed inputs that only need a header fix
+    are cloned and patched (see :mod:`fmriprep.utils.compression`).
+    """
+
+    input_spec = _DerivativesDataSinkThreadsInputSpec
     out_path_base = ''
+    # Allow series of affines to be stored as NumPy arrays
+    _file_patterns = tuple(
+        pattern.replace('{extension<.txt|.h5>}', '{extension<.txt|.h5|.npy>}')
+        for pattern in _DDSink._file_patterns
+    )
+
+    def _run_interface(self, runtime):
+        if not _install_writers():
+            return super()._run_interface(runtime)
+        with _fast_writers(self.inputs.num_threads):
+            return super()._run_interface(runtime)
+
+
+# Module-level writers of niworkflows.interfaces.bids replaced by _fast_writers
+_NWBIDS_WRITERS = {
+    '_copy_any': compression.copy_file,
+    'unsafe_write_nifti_header_and_data': compression.write_nifti_header_and_data,
+}
+# Threads available to the writers of the DerivativesDataSink running in this thread, if any
+_sink_threads = ContextVar('_sink_threads', default=None)
+
+
+@contextmanager
+def _fast_writers(nthreads):
+    """Make niworkflows' DerivativesDataSink use the writers of fmriprep.utils.compression
+
+    The writers are looked up as globals of :mod:`niworkflows.interfaces.bids`, so they
+    are replaced there, once, by dispatchers that only call the fast writers within this
+    context and in the current thread. Any other sink keeps the original writers.
+    Requires :func:`_install_writers` to have succeeded.
+    """
+    token = _sink_threads.set(nthreads)
+    try:
+        yield
+    finally:
+        _sink_threads.reset(token)
+
+
+@cache
+def _install_writers():
+    """Install the dispatchers once per process, returning whether they are in place
+
+    niworkflows offers no hook to replace its writers, so if a release renames them,
+    the sinks fall back to niworkflows' own writers (a warning is logged once).
+    """
+    missing = [name for name in _NWBIDS_WRITERS if not callable(getattr(_nwbids, name, None))]
+    if missing:
+        LOGGER.warning(
+            'niworkflows.interfaces.bids does not define %s; derivatives will be '
+            "written with niworkflows' writers.",
+            ', '.join(missing),
+        )
+        return False
+
+    for name in _NWBIDS_WRITERS:
+        setattr(_nwbids, name, _dispatch(name, getattr(_nwbids, name)))
+    return True
+
+
+def _dispatch(name, original):
+    @wraps(original)
+    def dispatcher(*args, **kwargs):
+        nthreads = _sink_threads.get()
+        if nthreads is None:
+            return original(*args, **kwargs)
+        return _NWBIDS_WRITERS[name](*args, nthreads=nthreads, **kwargs)
+
+    return dispatcher
 
 
 __all__ = ('DerivativesDataSink',)
@@ -30,8 +30,11 @@ Handling confounds.
 
 """
 
+import hashlib
 import os
 import re
+import shutil
+from pathlib import Path
 
 import nibabel as nb
 import nitransforms as nt
@@ -40,6 +43,7 @@ import pandas as pd
 from nipype import logging
 from nipype.interfaces.base import (
     BaseInterfaceInputSpec,
+    Directory,
     File,
     InputMultiObject,
     OutputMultiObject,
@@ -54,7 +58,10 @@ from niworkflows.utils.timeseries import _cifti_timeseries, _nifti_timeseries
 from scipy import ndimage as ndi
 from scipy.spatial import transform as sst
 
+from ..utils.transforms import load_transform
+
 LOGGER = logging.getLogger('nipype.interface')
+MOTION_PARAMS = ['trans_x', 'trans_y', 'trans_z', 'rot_x', 'rot_y', 'rot_z']
 
 
 class _aCompCorMasksInputSpec(BaseInterfaceInputSpec):
@@ -65,6 +72,17 @@ class _aCompCorMasksInputSpec(BaseInterfaceInputSpec):
     bold_zooms = traits.Tuple(
         traits.Float, traits.Float, traits.Float, mandatory=True, desc='BOLD series zooms'
     )
+    work_compression = traits.Enum(
+        'default',
+        'fast',
+        'none',
+        usedefault=True,
+        desc='Compression of the output masks (see --work-compression)',
+    )
+    cache_dir = Directory(
+        desc='Directory to store the masks, reused by other runs with the same '
+        'volume fractions and BOLD zooms',
+    )
 
 
 class _aCompCorMasksOutputSpec(TraitedSpec):
@@ -74,22 +92,79 @@ class _aCompCorMasksOutputSpec(TraitedSpec):
 
 
 class aCompCorMasks(SimpleInterface):
-    """Generate masks in T1w space for aCompCor."""
+    """Generate masks in T1w space for aCompCor.
+
+    The masks only depend on the volume fractions of the subject and on the BOLD
+    zooms, which are usually shared by all runs. If ``cache_dir`` is set, masks
+    are stored there, keyed by those inputs, and linked into the working directory
+    of every other run requesting them.
+    """
 
     input_spec = _aCompCorMasksInputSpec
     output_spec = _aCompCorMasksOutputSpec
 
     def _run_interface(self, runtime):
+        from ..utils.compression import clone_file, work_filename
         from ..utils.confounds import acompcor_masks
 
-        self._results['out_masks'] = acompcor_masks(
+        if not isdefined(self.inputs.cache_dir):
+            self._results['out_masks'] = acompcor_masks(
+                self.inputs.in_vfs,
+                self.inputs.is_aseg,
+                self.inputs.bold_zooms,
+                self.inputs.work_compression,
+            )
+            return runtime
+
+        key = _acompcor_cache_key(
             self.inputs.in_vfs,
             self.inputs.is_aseg,
             self.inputs.bold_zooms,
+            self.inputs.work_compression,
         )
+        cache_entry = Path(self.inputs.cache_dir) / f'acompcor_{key}'
+        if not cache_entry.exists():
+            tmp_entry = cache_entry.with_name(f'{cache_entry.name}.{os.getpid()}')
+            tmp_entry.mkdir(parents=True, exist_ok=True)
+            acompcor_masks(
+                self.inputs.in_vfs,
+                self.inputs.is_aseg,
+                self.inputs.bold_zooms,
+                self.inputs.work_compression,
+                out_dir=tmp_entry,
+            )
+            try:
+                os.replace(tmp_entry, cache_entry)
+            except OSError:  # Another process stored the same entry first
+                shutil.rmtree(tmp_entry, ignore_errors=True)
+
+        # The CSF PV map (BIDS labeling, CSF=2) is used as is, unless converted from aseg
+        out_masks = [self.inputs.in_vfs[2]]
+        names = ['acompcor_wm', 'acompcor_wmcsf']
+        if self.inputs.is_aseg:
+            out_masks = []
+            names.insert(0, 'acompcor_csf')
+        for name in names:
+            fname = work_filename(f'{name}.nii.gz', self.inputs.work_compression)
+            out_file = Path(runtime.cwd) / fname
+            out_file.unlink(missing_ok=True)
+            clone_file(cache_entry / fname, out_file)
+            out_masks.append(str(out_file))
+        self._results['out_masks'] = out_masks
         return runtime
 
 
+def _acompcor_cache_key(in_files, is_aseg, zooms, work_compression):
+    """Identify a set of aCompCor masks by path and modification time of their inputs"""
+    digest = hashlib.sha256()
+    for path in in_files:
+        path = Path(path).absolute()
+        stat = path.stat()
+        digest.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size}\n'.encode())
+    digest.update(f'{bool(is_aseg)}:{np.round(zooms, 4).tolist()}:{work_compression}'.encode())
+    return digest.hexdigest()
+
+
 class _FSLRMSDeviationInputSpec(BaseInterfaceInputSpec):
     xfm_file = File(exists=True, mandatory=True, desc='Head motion transform file')
     boldref_file = File(exists=True, mandatory=True, desc='BOLD reference file')
@@ -111,32 +186,9 @@ class FSLRMSDeviation(SimpleInterface):
         )
 
         boldref = nb.load(self.inputs.boldref_file)
-        hmc = nt.linear.load(self.inputs.xfm_file)
-
-        center = 0.5 * (np.array(boldref.shape[:3]) - 1) * boldref.header.get_zooms()[:3]
+        fsl_matrix = _fsl_hmc_matrices(load_transform(self.inputs.xfm_file), boldref)
 
-        # Revert to vox2vox transforms
-        fsl_hmc = nt.io.fsl.FSLLinearTransformArray.from_ras(
-            hmc.matrix, reference=boldref, moving=boldref
-        )
-        fsl_matrix = np.stack([xfm['parameters'] for xfm in fsl_hmc.xforms])
-
-        diff = fsl_matrix[1:] @ np.linalg.inv(fsl_matrix[:-1]) - np.eye(4)
-        M = diff[:, :3, :3]
-        t = diff[:, :3, 3] + M @ center
-        Rmax = 80.0
-
-        rmsd = np.concatenate(
-            [
-                [np.nan],
-                np.sqrt(
-                    np.diag(t @ t.T)
-                    + np.trace(M.transpose(0, 2, 1) @ M, axis1=1, axis2=2) * Rmax**2 / 5
-                ),
-            ]
-        )
-
-        params = pd.DataFrame(data=rmsd, columns=['rmsd'])
+        params = pd.DataFrame(data=_fsl_rmsd(fsl_matrix, boldref), columns=['rmsd'])
         params.to_csv(self._results['out_file'], sep='\t', index=False, na_rep='n/a')
 
         return runtime
@@ -163,34 +215,9 @@ class FSLMotionParams(SimpleInterface):
         )
 
         boldref = nb.load(self.inputs.boldref_file)
-        hmc = nt.linear.load(self.inputs.xfm_file)
-
-        # FSL's "center of gravity" is the center of mass scaled by zooms
-        # No rotation is applied.
-        center_of_gravity = np.matmul(
-            np.diag(boldref.header.get_zooms()),
-            ndi.center_of_mass(np.asanyarray(boldref.dataobj)),
-        )
-
-        # Revert to vox2vox transforms
-        fsl_hmc = nt.io.fsl.FSLLinearTransformArray.from_ras(
-            hmc.matrix, reference=boldref, moving=boldref
-        )
-        fsl_matrix = np.stack([xfm['parameters'] for xfm in fsl_hmc.xforms])
-
-        # FSL uses left-handed rotation conventions, so transpose
-        mats = fsl_matrix[:, :3, :3].transpose(0, 2, 1)
-
-        # Rotations are recovered directly
-        rot_xyz = sst.Rotation.from_matrix(mats).as_euler('XYZ')
-        # Translations are recovered by applying the rotation to the center of gravity
-        trans_xyz = fsl_matrix[:, :3, 3] - mats @ center_of_gravity + center_of_gravity
-
-        params = pd.DataFrame(
-            data=np.hstack((trans_xyz, rot_xyz)),
-            columns=['trans_x', 'trans_y', 'trans_z', 'rot_x', 'rot_y', 'rot_z'],
-        )
+        fsl_matrix = _fsl_hmc_matrices(load_transform(self.inputs.xfm_file), boldref)
 
+        params = pd.DataFrame(data=_fsl_motion_params(fsl_matrix, boldref), columns=MOTION_PARAMS)
         params.to_csv(self._results['out_file'], sep='\t', index=False, na_rep='n/a')
 
         return runtime
@@ -219,16 +246,112 @@ class FramewiseDisplacement(SimpleInterface):
         motion = pd.read_csv(self.inputs.in_file, delimiter='\t')
 
         # Filter and ensure we have all parameters
-        diff = motion[['trans_x', 'trans_y', 'trans_z', 'rot_x', 'rot_y', 'rot_z']].diff()
-        diff[['rot_x', 'rot_y', 'rot_z']] *= self.inputs.radius
-
-        fd = pd.DataFrame(diff.abs().sum(axis=1, skipna=False), columns=['FramewiseDisplacement'])
+        fd = pd.DataFrame(
+            _framewise_displacement(motion[MOTION_PARAMS].values, self.inputs.radius),
+            columns=['FramewiseDisplacement'],
+        )
 
         fd.to_csv(self._results['out_file'], sep='\t', index=False, na_rep='n/a')
 
         return runtime
 
 
+class _MotionMetricsInputSpec(BaseInterfaceInputSpec):
+    xfm_file = File(exists=True, mandatory=True, desc='Head motion transform file')
+    boldref_file = File(exists=True, mandatory=True, desc='BOLD reference file')
+    radius = traits.Float(50, usedefault=True, desc='Radius of the head in mm')
+
+
+class _MotionMetricsOutputSpec(TraitedSpec):
+    motion_file = File(exists=True, desc='Output motion parameters file')
+    rmsd_file = File(exists=True, desc='Output root mean square deviation file')
+    fd_file = File(exists=True, desc='Output framewise displacement file')
+
+
+class MotionMetrics(SimpleInterface):
+    """Calculate motion parameters, RMSD and framewise displacement in one go.
+
+    The head-motion transforms and the BOLD reference are loaded once, and the
+    outputs are those of :class:`FSLMotionParams`, :class:`FSLRMSDeviation` and
+    :class:`FramewiseDisplacement`, respectively.
+    """
+
+    input_spec = _MotionMetricsInputSpec
+    output_spec = _MotionMetricsOutputSpec
+
+    def _run_interface(self, runtime):
+        boldref = nb.load(self.inputs.boldref_file)
+        fsl_matrix = _fsl_hmc_matrices(load_transform(self.inputs.xfm_file), boldref)
+
+        params = _fsl_motion_params(fsl_matrix, boldref)
+        for name, data, columns in (
+            ('motion', params, MOTION_PARAMS),
+            ('rmsd', _fsl_rmsd(fsl_matrix, boldref), ['rmsd']),
+            ('fd', _framewise_displacement(params, self.inputs.radius), ['FramewiseDisplacement']),
+        ):
+            self._results[f'{name}_file'] = os.path.join(runtime.cwd, f'{name}.tsv')
+            pd.DataFrame(data, columns=columns).to_csv(
+                self._results[f'{name}_file'], sep='\t', index=False, na_rep='n/a'
+            )
+
+        return runtime
+
+
+def _fsl_hmc_matrices(hmc, boldref):
+    """Revert head-motion transforms to FSL's vox2vox convention, as a (T, 4, 4) array"""
+    fsl_hmc = nt.io.fsl.FSLLinearTransformArray.from_ras(
+        hmc.matrix, reference=boldref, moving=boldref
+    )
+    return np.stack([xfm['parameters'] for xfm in fsl_hmc.xforms])
+
+
+def _fsl_motion_params(fsl_matrix, boldref):
+    """Translations and rotations of each volume, as calculated by MCFLIRT"""
+    # FSL's "center of gravity" is the center of mass scaled by zooms
+    # No rotation is applied.
+    center_of_gravity = np.matmul(
+        np.diag(boldref.header.get_zooms()),
+        ndi.center_of_mass(np.asanyarray(boldref.dataobj)),
+    )
+
+    # FSL uses left-handed rotation conventions, so transpose
+    mats = fsl_matrix[:, :3, :3].transpose(0, 2, 1)
+
+    # Rotations are recovered directly
+    rot_xyz = sst.Rotation.from_matrix(mats).as_euler('XYZ')
+    # Translations are recovered by applying the rotation to the center of gravity
+    trans_xyz = fsl_matrix[:, :3, 3] - mats @ center_of_gravity + center_of_gravity
+    return np.hstack((trans_xyz, rot_xyz))
+
+
+def _fsl_rmsd(fsl_matrix, boldref, Rmax=80.0):
+    """Root mean square deviation between consecutive volumes (first one is NaN)"""
+    center = 0.5 * (np.array(boldref.shape[:3]) - 1) * boldref.header.get_zooms()[:3]
+
+    diff = fsl_matrix[1:] @ np.linalg.inv(fsl_matrix[:-1]) - np.eye(4)
+    M = diff[:, :3, :3]
+    t = diff[:, :3, 3] + M @ center
+
+    return np.concatenate(
+        [[np.nan], np.sqrt(np.sum(t**2, axis=1) + np.sum(M**2, axis=(1, 2)) * Rmax**2 / 5)]
+    )
+
+
+def _framewise_displacement(params, radius=50):
+    """Power's framewise displacement from the six motion parameters (first one is NaN)
+
+    >>> params = np.zeros((3, 6))
+    >>> params[1, 0] = 0.5
+    >>> params[2, 3] = 0.01
+    >>> _framewise_displacement(params).tolist()
+    [nan, 0.5, 1.0]
+
+    """
+    diff = np.diff(params, axis=0)
+    diff[:, 3:] *= radius
+    return np.concatenate([[np.nan], np.abs(diff).sum(axis=1)])
+
+
 class _FilterDroppedInputSpec(BaseInterfaceInputSpec):
     in_file = File(exists=True, desc='input CompCor metadata')
 
@@ -330,6 +453,238 @@ class RenameACompCor(SimpleInterface):
         return runtime
 
 
+class _ComputeConfoundsInputSpec(BaseInterfaceInputSpec):
+    in_file = File(exists=True, mandatory=True, desc='BOLD series')
+    in_mask = File(exists=True, mandatory=True, desc='BOLD brain mask')
+    acompcor_masks = InputMultiObject(
+        File(exists=True),
+        mandatory=True,
+        desc='binary CSF, WM and combined masks for aCompCor, in this order',
+    )
+    crown_mask = File(exists=True, mandatory=True, desc='binary crown mask')
+    skip_vols = traits.Int(0, usedefault=True, desc='number of non-steady-state volumes')
+    repetition_time = traits.Float(desc='repetition time (TR), in seconds')
+    all_components = traits.Bool(
+        False,
+        usedefault=True,
+        desc='retain all aCompCor and tCompCor components, instead of those '
+        'explaining 50%% of the variance',
+    )
+    crown_components = traits.Int(24, usedefault=True, desc='number of crownCompCor components')
+    percentile_threshold = traits.Range(
+        low=0.0,
+        high=1.0,
+        value=0.02,
+        usedefault=True,
+        desc='fraction of voxels with the highest temporal variance retained for tCompCor',
+    )
+    work_compression = traits.Enum(
+        'default',
+        'fast',
+        'none',
+        usedefault=True,
+        desc='Compression of the tCompCor mask and reference (see --work-compression)',
+    )
+
+
+class _ComputeConfoundsOutputSpec(TraitedSpec):
+    signals = File(exists=True, desc='mean signals within each tissue mask')
+    dvars = File(exists=True, desc='DVARS')
+    std_dvars = File(exists=True, desc='standardized DVARS')
+    acompcor = File(exists=True, desc='aCompCor components')
+    acompcor_metadata = File(exists=True, desc='aCompCor metadata')
+    crowncompcor = File(exists=True, desc='crownCompCor components')
+    crowncompcor_metadata = File(exists=True, desc='crownCompCor metadata')
+    tcompcor = File(exists=True, desc='tCompCor components')
+    tcompcor_metadata = File(exists=True, desc='tCompCor metadata')
+    tcompcor_mask = File(exists=True, desc='high-variance mask used by tCompCor')
+    cos_basis = File(exists=True, desc='cosine basis and non-steady-state outliers')
+    ref_file = File(exists=True, desc='first volume of the series, for reports')
+
+
+class ComputeConfounds(SimpleInterface):
+    """Calculate the confounds derived from the BOLD series in a single pass
+
+    The series is read once as single-precision floating point (or memory-mapped,
+    when uncompressed), and DVARS, tissue mean signals and the aCompCor,
+    crownCompCor and tCompCor decompositions are calculated from the same array.
+    Outputs are formatted as those of :class:`~nipype.algorithms.confounds.ComputeDVARS`
+    (after :class:`~niworkflows.interfaces.utility.AddTSVHeader`),
+    :class:`~niworkflows.interfaces.images.SignalExtraction`,
+    :class:`~nipype.algorithms.confounds.ACompCor` and
+    :class:`~nipype.algorithms.confounds.TCompCor`, as configured in
+    :func:`~fmriprep.workflows.bold.confounds.init_bold_confs_wf`, so they can be
+    fed to :class:`GatherConfounds` and :class:`RenameACompCor` unchanged.
+    DVARS and tissue signals are identical to those for float32 and unscaled integer
+    series, and equivalent to single precision otherwise; CompCor components are
+    calculated with :func:`~fmriprep.utils.confounds.compute_noise_components`.
+    Besides the float32 series, the voxels within each mask are copied while they
+    are processed: DVARS and tissue signals keep these copies in single precision,
+    while CompCor filters them in double precision.
+    """
+
+    input_spec = _ComputeConfoundsInputSpec
+    output_spec = _ComputeConfoundsOutputSpec
+
+    def _run_interface(self, runtime):
+        from ..utils.compression import to_filename, work_compresslevel, work_filename
+        from ..utils.confounds import compute_noise_components, dvars, high_variance_mask
+
+        compresslevel = work_compresslevel(self.inputs.work_compression)
+
+        img = nb.load(self.inputs.in_file)
+        if len(img.shape) != 4:
+            raise ValueError(f'Expected a 4D series, got shape {img.shape}')
+        # A single float32 array (a memory map, for uncompressed float32 series) is used throughout
+        func = img.get_fdata(dtype=np.float32)
+
+        mask_img = nb.load(self.inputs.in_mask)
+        mask = np.asanyarray(mask_img.dataobj).astype(bool)
+        acc_imgs = [nb.load(fname) for fname in self.inputs.acompcor_masks]
+        crown_img = nb.load(self.inputs.crown_mask)
+
+        # DVARS
+        dvars_stdz, dvars_nstd = dvars(func, mask)
+        for name, values in (('dvars', dvars_nstd), ('std_dvars', dvars_stdz)):
+            self._results[name] = _save_column(values, name, runtime.cwd)
+
+        # tCompCor mask
+        skip_vols = self.inputs.skip_vols
+        tcc_mask = high_variance_mask(
+            func[..., skip_vols:], mask, self.inputs.percentile_threshold
+        )
+        tcc_img = nb.Nifti1Image(tcc_mask, mask_img.affine, mask_img.header)
+        self._results['tcompcor_mask'] = work_filename(
+            os.path.join(runtime.cwd, 'tcompcor_mask.nii.gz'), self.inputs.work_compression
+        )
+        to_filename(tcc_img, self._results['tcompcor_mask'], compresslevel=compresslevel)
+
+        # Tissue mean signals
+        labels = ['global_signal', 'csf', 'white_matter', 'csf_wm', 'tcompcor']
+        series = np.zeros((img.shape[3], len(labels)))
+        for j, label_img in enumerate([mask_img, *acc_imgs, tcc_img]):
+            roi = np.asanyarray(label_img.dataobj) >= 0.5
+            # Accumulated in double precision, as SignalExtraction does, without a float64 copy
+            series[:, j] = func[roi].mean(axis=0, dtype='f8')
+        self._results['signals'] = os.path.join(runtime.cwd, 'signals.tsv')
+        np.savetxt(
+            self._results['signals'],
+            np.vstack((labels, series.astype(str))),
+            fmt='%s',
+            delimiter='\t',
+        )
+
+        # CompCor
+        repetition_time = self.inputs.repetition_time
+        if not isdefined(repetition_time):
+            repetition_time = img.header.get_zooms()[3]
+            if img.header.get_xyzt_units()[1] == 'msec':
+                repetition_time /= 1000
+            if repetition_time == 0:
+                raise ValueError('Cannot detect repetition time from image header')
+
+        criterion = 'all' if self.inputs.all_components else 0.5
+        steady = func[..., skip_vols:]
+        for name, prefix, masks, mask_names, n_components in (
+            ('acompcor', 'a_comp_cor_', acc_imgs, ['CSF', 'WM', 'combined'], criterion),
+            ('crowncompcor', 'edge_comp_', [crown_img], ['Edge'], self.inputs.crown_components),
+            ('tcompcor', 't_comp_cor_', [tcc_img], None, criterion),
+        ):
+            components, basis, metadata = compute_noise_components(
+                steady,
+                masks,
+                n_components,
+                'cosine',
+                0,
+                128,
+                repetition_time,
+                'NaN',
+                mask_names,
+            )
+            self._results[name], self._results[f'{name}_metadata'] = _save_compcor(
+                components, metadata, prefix, skip_vols, name, runtime.cwd
+            )
+
+        # Only the cosine basis of tCompCor is used, as all three are the same
+        self._results['cos_basis'] = _save_cosine_basis(
+            basis, skip_vols, img.shape[3], runtime.cwd
+        )
+
+        self._results['ref_file'] = work_filename(
+            os.path.join(runtime.cwd, 'ref.nii.gz'), self.inputs.work_compression
+        )
+        to_filename(
+            nb.Nifti1Image(func[..., 0], img.affine, img.header),
+            self._results['ref_file'],
+            compresslevel=compresslevel,
+        )
+        return runtime
+
+
+def _save_column(values, name, newpath):
+    """Write a single-column TSV with header, as AddTSVHeader would from ComputeDVARS"""
+    out_file = os.path.join(newpath, f'{name}.tsv')
+    # ComputeDVARS writes six decimals, which AddTSVHeader reads back
+    np.savetxt(
+        out_file,
+        np.array([f'{value:0.6f}' for value in values], dtype=float),
+        delimiter='\t',
+        header=name,
+        comments='',
+    )
+    return out_file
+
+
+def _save_compcor(components, metadata, prefix, skip_vols, name, newpath):
+    """Write CompCor components and metadata as nipype's CompCor interfaces do"""
+    if skip_vols:
+        old_comp = components
+        components = np.zeros(
+            (skip_vols + components.shape[0], components.shape[1]), dtype=components.dtype
+        )
+        components[skip_vols:] = old_comp
+
+    components_file = os.path.join(newpath, f'{name}.tsv')
+    header = [f'{prefix}{i:02d}' for i in range(components.shape[1])]
+    np.savetxt(
+        components_file,
+        components,
+        fmt='%.10f',
+        delimiter='\t',
+        header='\t'.join(header),
+        comments='',
+    )
+
+    metadata_file = os.path.join(newpath, f'{name}_metadata.tsv')
+    names = np.empty(len(metadata['mask']), dtype='object_')
+    retained = np.asarray(metadata['retained'], dtype=bool)
+    names[retained] = header
+    names[~retained] = [f'dropped{i}' for i in range(np.count_nonzero(~retained))]
+    with open(metadata_file, 'w') as f:
+        f.write('\t'.join(['component', *metadata.keys()]) + '\n')
+        f.writelines(
+            f'{name}\t{mask}\t{sv:.10f}\t{var:.10f}\t{cumvar:.10f}\t{kept}\n'
+            for name, mask, sv, var, cumvar, kept in zip(names, *metadata.values(), strict=True)
+        )
+    return components_file, metadata_file
+
+
+def _save_cosine_basis(basis, skip_vols, nrows, newpath):
+    """Write the cosine basis and non-steady-state outliers as CompCor's ``pre_filter.tsv``"""
+    out_file = os.path.join(newpath, 'pre_filter.tsv')
+    ncols = basis.shape[1] if basis.size > 0 else 0
+    header = [f'Cosine{i:02d}' for i in range(ncols)]
+    if skip_vols:
+        old_basis = basis
+        basis = np.zeros((nrows, ncols + skip_vols), dtype=basis.dtype)
+        if old_basis.size > 0:
+            basis[skip_vols:, :ncols] = old_basis
+        basis[:skip_vols, -skip_vols:] = np.eye(skip_vols)
+        header.extend([f'NonSteadyStateOutlier{i:02d}' for i in range(skip_vols)])
+    np.savetxt(out_file, basis, fmt='%.10f', delimiter='\t', header='\t'.join(header), comments='')
+    return out_file
+
+
 class GatherConfoundsInputSpec(BaseInterfaceInputSpec):
     signals = File(exists=True, desc='input signals')
     dvars = File(exists=True, desc='file containing DVARS')
@@ -82,3 +82,215 @@ class Label2Mask(SimpleInterface):
 
         self._results['out_file'] = out_file
         return runtime
+
+
+class _GoodVoxelsMaskInputSpec(TraitedSpec):
+    in_file = File(exists=True, mandatory=True, desc='BOLD series in anatomical space')
+    ribbon_file = File(exists=True, mandatory=True, desc='Cortical ribbon mask')
+    sigma = traits.Float(
+        5.0, usedefault=True, desc='Sigma of the Gaussian smoothing kernel, in mm'
+    )
+    max_volumes = traits.Int(
+        0,
+        usedefault=True,
+        desc='Maximum number of volumes to load at a time. '
+        'If zero, the full series is loaded into memory.',
+    )
+
+
+class _GoodVoxelsMaskOutputSpec(TraitedSpec):
+    goodvoxels_mask = File(exists=True, desc='Mask excluding voxels with locally high CoV')
+    goodvoxels_ribbon = File(exists=True, desc='Goodvoxels mask restricted to the ribbon')
+
+
+class GoodVoxelsMask(SimpleInterface):
+    """Calculate an HCP-style "goodvoxels" mask of a BOLD series
+
+    Voxels whose coefficient of variation (CoV), normalized by the mean CoV within the
+    cortical ribbon and modulated by its local (Gaussian-weighted) average in the ribbon,
+    exceeds the ribbon mean plus half a standard deviation are excluded.
+
+    The series is read once, and the temporal mean and standard deviation are
+    accumulated with Welford's algorithm over windows of ``max_volumes`` volumes.
+    The remaining steps reproduce, in memory, the FSL commands of HCP's
+    ``RibbonVolumeToSurfaceMapping.sh``, and the ribbon is projected onto the
+    BOLD grid as ``antsApplyTransforms -n MultiLabel`` does.
+    Unlike FSL, which operates in single precision, all calculations are carried
+    out in double precision, so voxels lying exactly at the threshold may differ.
+    """
+
+    input_spec = _GoodVoxelsMaskInputSpec
+    output_spec = _GoodVoxelsMaskOutputSpec
+
+    def _run_interface(self, runtime):
+        import nibabel as nb
+        from scipy import ndimage as ndi
+
+        img = nb.load(self.inputs.in_file)
+        mean, std = _temporal_mean_std(img, self.inputs.max_volumes or None)
+        ribbon = _project_mask(nb.load(self.inputs.ribbon_file), img)
+
+        cov = _divide(std, mean)
+        cov_ribbon = np.where(ribbon, cov, 0)
+        cov_ribbon_mean = cov_ribbon[cov_ribbon != 0].mean()
+        cov_ribbon_norm = cov_ribbon / cov_ribbon_mean
+
+        # Local average of the normalized CoV, within the ribbon (-s 5 -div ... -dilD)
+        sigma = self.inputs.sigma / np.array(img.header.get_zooms()[:3])
+        weights = ndi.gaussian_filter((cov_ribbon_norm > 0).astype('f8'), sigma, mode='constant')
+        local_cov = _divide(ndi.gaussian_filter(cov_ribbon_norm, sigma, mode='constant'), weights)
+        local_cov = _dilate_modal(local_cov)
+
+        cov_modulated = _divide(cov / cov_ribbon_mean, local_cov)
+        ribbon_values = cov_modulated[ribbon & (cov_modulated != 0)]
+        upper_thresh = ribbon_values.mean() + 0.5 * ribbon_values.std(ddof=1)
+
+        # -thr upper_thresh -bin -sub (mean -bin) -mul -1
+        outliers = (cov_modulated >= upper_thresh) & (cov_modulated > 0)
+        goodvoxels = (mean > 0) & ~outliers
+
+        for name, mask in (
+            ('goodvoxels_mask', goodvoxels),
+            ('goodvoxels_ribbon', goodvoxels & ribbon),
+        ):
+            out_img = img.__class__(mask.astype(np.uint8), img.affine, img.header)
+            out_img.set_data_dtype(np.uint8)
+            self._results[name] = fname_presuffix(
+                self.inputs.in_file, suffix=f'_{name}', newpath=runtime.cwd
+            )
+            out_img.to_filename(self._results[name])
+
+        return runtime
+
+
+def _temporal_mean_std(img, max_volumes=None):
+    """Temporal mean and (sample) standard deviation of a series, read in windows
+
+    Statistics of each window are merged with the parallel form of Welford's
+    algorithm (Chan et al., 1979), so the series is read only once.
+
+    >>> import nibabel as nb
+    >>> data = np.random.default_rng(0).normal(size=(2, 3, 4, 10))
+    >>> img = nb.Nifti1Image(data, np.eye(4))
+    >>> mean, std = _temporal_mean_std(img, max_volumes=3)
+    >>> np.allclose(mean, data.mean(-1), atol=1e-6), np.allclose(std, data.std(-1, ddof=1))
+    (True, True)
+
+    """
+    from .resampling import iter_volumes
+
+    count = 0
+    mean = np.zeros(img.shape[:3])
+    m2 = np.zeros(img.shape[:3])
+    for _, data in iter_volumes(img, max_volumes):
+        data = data.reshape(*img.shape[:3], -1)
+        nvols = data.shape[-1]
+        window_mean = data.mean(axis=-1, dtype='f8')
+        window_m2 = np.sum((data - window_mean[..., np.newaxis]) ** 2, axis=-1, dtype='f8')
+
+        delta = window_mean - mean
+        total = count + nvols
+        mean += delta * (nvols / total)
+        m2 += window_m2 + delta**2 * (count * nvols / total)
+        count = total
+
+    std = np.sqrt(m2 / (count - 1)) if count > 1 else np.zeros_like(m2)
+    return mean, std
+
+
+def _divide(num, den):
+    """Divide as ``fslmaths -div`` does, setting voxels where ``den`` is zero to zero"""
+    out = np.zeros(np.broadcast(num, den).shape)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def _dilate_modal(data):
+    """Fill zero voxels with the mode of their non-zero neighbors, as ``fslmaths -dilD``
+
+    Neighbors are taken from the 3x3x3 box around each voxel (FSL's default kernel),
+    and ties are resolved in favor of the lowest value, so that the lowest neighbor
+    is taken if all values are different.
+
+    >>> data = np.zeros((3, 3, 3))
+    >>> data[0, 0, :] = [3.0, 2.0, 2.0]
+    >>> data[2, 2, 2] = 1.0
+    >>> dilated = _dilate_modal(data)
+    >>> [float(dilated[ijk]) for ijk in ((1, 1, 1), (1, 0, 0), (1, 2, 2), (0, 0, 0))]
+    [2.0, 2.0, 1.0, 3.0]
+
+    """
+    from scipy import ndimage as ndi
+
+    nonzero = data != 0
+    padded = np.pad(np.where(nonzero, data, np.nan), 1, constant_values=np.nan)
+    # Only zero voxels with some non-zero neighbor can be filled
+    fill = np.argwhere(~nonzero & ndi.binary_dilation(nonzero, structure=np.ones((3, 3, 3))))
+
+    # Non-zero neighbors of each voxel to fill, sorted (NaN, i.e., zero, last)
+    offsets = np.stack(np.meshgrid(*[np.arange(3)] * 3, indexing='ij'), axis=-1).reshape(-1, 3)
+    neighbors = padded[tuple((fill[:, np.newaxis, :] + offsets).transpose(2, 0, 1))]
+    neighbors.sort(axis=1)
+
+    # Length of the run of equal values ending at each position
+    runs = np.ones(neighbors.shape, dtype=int)
+    for k in range(1, neighbors.shape[1]):
+        same = neighbors[:, k] == neighbors[:, k - 1]
+        runs[same, k] = runs[same, k - 1] + 1
+    mode = neighbors[np.arange(len(fill)), runs.argmax(axis=1)]
+
+    data = data.copy()
+    has_neighbors = ~np.isnan(mode)
+    data[tuple(fill[has_neighbors].T)] = mode[has_neighbors]
+    return data
+
+
+def _project_mask(mask_img, ref_img, alpha=4.0, chunk_size=10000):
+    """Project a binary mask on the grid of ``ref_img`` as ANTs' ``MultiLabel`` interpolation
+
+    Each voxel of ``ref_img`` is assigned the label (mask or background) with the
+    largest Gaussian-weighted vote among the voxels of ``mask_img`` around it,
+    as :code:`antsApplyTransforms -n MultiLabel` (ITK's
+    ``LabelImageGaussianInterpolateImageFunction``) does with its defaults:
+    a Gaussian of one voxel of ``mask_img`` in standard deviation, integrated over
+    each voxel and truncated at ``alpha`` standard deviations.
+    Voxels of ``ref_img`` outside the field of view of ``mask_img`` are background.
+    """
+    from scipy import ndimage as ndi
+    from scipy.special import erf
+
+    mask = np.asanyarray(mask_img.dataobj) > 0
+    if mask.shape == ref_img.shape[:3] and np.allclose(mask_img.affine, ref_img.affine):
+        return mask
+
+    shape = np.array(mask.shape)
+    vox2vox = np.linalg.inv(mask_img.affine) @ ref_img.affine
+    ijk = np.indices(ref_img.shape[:3]).reshape(3, -1)
+    cindex = vox2vox[:3, :3] @ ijk + vox2vox[:3, 3:]
+
+    # Only voxels within the window of some mask voxel may be labeled
+    width = 2 * int(np.floor(alpha + 0.5)) + 1
+    nearest = np.clip(np.rint(cindex).astype(int), 0, shape[:, np.newaxis] - 1)
+    near_mask = ndi.maximum_filter(mask, size=width + 2, mode='constant')
+    inside = np.all((cindex >= -0.5) & (cindex <= shape[:, np.newaxis] - 0.5), axis=0)
+    candidates = np.flatnonzero(inside & near_mask[tuple(nearest)])
+
+    projected = np.zeros(ijk.shape[1], dtype=bool)
+    for chunk in np.array_split(candidates, max(1, len(candidates) // chunk_size)):
+        point = cindex[:, chunk, np.newaxis]
+        index = np.floor(point - alpha + 0.5).astype(int) + np.arange(width)
+        weights = erf((index + 0.5 - point) / np.sqrt(2)) - erf((index - 0.5 - point) / np.sqrt(2))
+        valid = (index >= 0) & (index < shape[:, np.newaxis, np.newaxis])
+        weights[~valid] = 0
+        index = np.clip(index, 0, shape[:, np.newaxis, np.newaxis] - 1)
+
+        block = mask[
+            index[0][:, :, np.newaxis, np.newaxis],
+            index[1][:, np.newaxis, :, np.newaxis],
+            index[2][:, np.newaxis, np.newaxis, :],
+        ]
+        votes = np.einsum('ni,nj,nk,nijk->n', *weights, block)
+        total = np.prod(weights.sum(axis=-1), axis=0)
+        projected[chunk] = votes > total - votes
+
+    return projected.reshape(ref_img.shape[:3])
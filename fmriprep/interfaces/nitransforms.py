@@ -24,6 +24,7 @@
 
 from pathlib import Path
 
+import numpy as np
 from nipype.interfaces.base import (
     BaseInterfaceInputSpec,
     File,
@@ -99,3 +100,34 @@ class ConvertAffine(SimpleInterface):
             inv_affine.to_filename(out_inv, moving=reference, fmt=self.inputs.out_fmt)
 
         return runtime
+
+
+class _AffinesToArrayInputSpec(BaseInterfaceInputSpec):
+    in_file = File(exists=True, mandatory=True, desc='series of affine transforms (ITK format)')
+
+
+class _AffinesToArrayOutputSpec(TraitedSpec):
+    out_file = File(exists=True, desc='N x 4 x 4 array of RAS-to-RAS affines')
+
+
+class AffinesToArray(SimpleInterface):
+    """Store a series of affine transforms (e.g., head-motion) as a NumPy array.
+
+    The resulting ``.npy`` file can be memory-mapped, and is loaded much faster than
+    the text file by :func:`~fmriprep.utils.transforms.load_transforms`.
+    """
+
+    input_spec = _AffinesToArrayInputSpec
+    output_spec = _AffinesToArrayOutputSpec
+
+    def _run_interface(self, runtime):
+        from nitransforms.linear import load as load_affine
+
+        out_file = fname_presuffix(
+            self.inputs.in_file, suffix='.npy', newpath=runtime.cwd, use_ext=False
+        )
+        matrices = load_affine(self.inputs.in_file).matrix
+        np.save(out_file, np.asarray(matrices, dtype='f8').reshape(-1, 4, 4))
+
+        self._results['out_file'] = out_file
+        return runtime
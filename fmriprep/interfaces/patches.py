@@ -26,60 +26,9 @@ Temporary patches
 
 """
 
-from random import randint
-from time import sleep
-
 import nipype.interfaces.freesurfer as fs
 import nipype.interfaces.io as nio
-from nipype.algorithms import confounds as nac
 from nipype.interfaces.base import File, traits
-from numpy.linalg.linalg import LinAlgError
-
-
-class RobustACompCor(nac.ACompCor):
-    """
-    Runs aCompCor several times if it suddenly fails with
-    https://github.com/nipreps/fmriprep/issues/776
-
-    """
-
-    def _run_interface(self, runtime):
-        failures = 0
-        while True:
-            try:
-                runtime = super()._run_interface(runtime)
-                break
-            except LinAlgError:
-                failures += 1
-                if failures > 10:
-                    raise
-                start = (failures - 1) * 10
-                sleep(randint(start + 4, start + 10))
-
-        return runtime
-
-
-class RobustTCompCor(nac.TCompCor):
-    """
-    Runs tCompCor several times if it suddenly fails with
-    https://github.com/nipreps/fmriprep/issues/940
-
-    """
-
-    def _run_interface(self, runtime):
-        failures = 0
-        while True:
-            try:
-                runtime = super()._run_interface(runtime)
-                break
-            except LinAlgError:
-                failures += 1
-                if failures > 10:
-                    raise
-                start = (failures - 1) * 10
-                sleep(randint(start + 4, start + 10))
-
-        return runtime
 
 
 class _MRICoregInputSpec(fs.registration.MRICoregInputSpec):
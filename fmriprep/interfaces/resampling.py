@@ -1,44 +1,49 @@
 """Interfaces for resampling images in a single shot"""
 
 import asyncio
+import hashlib
 import os
+import typing as ty
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
 from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
 
 import nibabel as nb
 import nitransforms as nt
 import nitransforms.resampling
 import numpy as np
+from nibabel.volumeutils import array_to_file, seek_tell
 from nipype.interfaces.base import (
+    Directory,
     File,
     InputMultiObject,
+    OutputMultiObject,
     SimpleInterface,
     TraitedSpec,
     traits,
 )
 from nipype.utils.filemanip import fname_presuffix
 from scipy import ndimage as ndi
-from scipy.sparse import hstack as sparse_hstack
-from sdcflows.transform import grid_bspline_weights
+from scipy.interpolate import BSpline
 from sdcflows.utils.tools import ensure_positive_cosines
 
 from ..utils.asynctools import worker
-from ..utils.transforms import load_transforms
+from ..utils.compression import (
+    open_nifti,
+    to_filename,
+    work_compresslevel,
+    work_filename,
+)
+from ..utils.transforms import fingerprint_transforms, load_transforms
+
+if ty.TYPE_CHECKING:
+    import scipy.sparse
 
 
-class ResampleSeriesInputSpec(TraitedSpec):
+class _ResampleSeriesBaseInputSpec(TraitedSpec):
     in_file = File(exists=True, mandatory=True, desc='3D or 4D image file to resample')
-    ref_file = File(exists=True, mandatory=True, desc='File to resample in_file to')
-    transforms = InputMultiObject(
-        File(exists=True),
-        desc='Transform files, from in_file to ref_file (image mode)',
-    )
-    inverse = InputMultiObject(
-        traits.Bool,
-        value=[False],
-        usedefault=True,
-        desc='Whether to invert each file in transforms',
-    )
-    fieldmap = File(exists=True, desc='Fieldmap file resampled into reference space')
     ro_time = traits.Float(desc='EPI readout time (s).')
     pe_dir = traits.Enum(
         'i',
@@ -68,6 +73,68 @@ class ResampleSeriesInputSpec(TraitedSpec):
     )
     cval = traits.Float(0.0, usedefault=True, desc='Value to fill past edges of data')
     prefilter = traits.Bool(True, usedefault=True, desc='Spline-prefilter data if order > 1')
+    mask_dilation = traits.Int(
+        0, usedefault=True, desc='Number of voxels to dilate reference masks by'
+    )
+    max_volumes = traits.Int(
+        0,
+        usedefault=True,
+        desc='Maximum number of volumes to load and resample at a time. '
+        'If positive, the resampled series is written progressively to disk. '
+        'If zero, the full series is loaded into memory.',
+    )
+    backend = traits.Enum(
+        'threads',
+        'processes',
+        usedefault=True,
+        desc='Parallelize resampling of volumes over threads, or over processes '
+        'sharing the source and output arrays in shared memory. '
+        'Only applies to coordinate-based resampling (fieldmaps, masks or '
+        'nonlinear transforms); affine resampling always uses threads.',
+    )
+    slab_mem_gb = traits.Float(
+        0.0,
+        usedefault=True,
+        desc='Memory budget (GB) for mapped target coordinates and distortion maps. '
+        'If positive, the target grid is resampled in slabs along its third axis '
+        'that fit the budget. If zero, the full target grid is mapped at once.',
+    )
+    coords_cache_dir = Directory(
+        desc='Directory to cache target coordinates mapped through nonlinear transforms. '
+        'Entries are keyed by transform files and target grid, so the directory may be '
+        'shared by all runs of a subject resampled into the same spaces.',
+    )
+    transforms_cache_dir = Directory(
+        desc='Directory to store parsed transforms in a binary format, '
+        'reused by other processes loading the same transform files',
+    )
+    work_compression = traits.Enum(
+        'default',
+        'fast',
+        'none',
+        usedefault=True,
+        desc='Compression of the resampled series: the extension of in_file (default), '
+        'gzip level 1 (fast) or uncompressed (none)',
+    )
+
+
+class ResampleSeriesInputSpec(_ResampleSeriesBaseInputSpec):
+    ref_file = File(exists=True, mandatory=True, desc='File to resample in_file to')
+    transforms = InputMultiObject(
+        File(exists=True),
+        desc='Transform files, from in_file to ref_file (image mode)',
+    )
+    inverse = InputMultiObject(
+        traits.Bool,
+        value=[False],
+        usedefault=True,
+        desc='Whether to invert each file in transforms',
+    )
+    fieldmap = File(exists=True, desc='Fieldmap file resampled into reference space')
+    ref_mask = File(
+        exists=True,
+        desc='Mask of the voxels of ref_file to resample. Voxels outside are set to cval.',
+    )
 
 
 class ResampleSeriesOutputSpec(TraitedSpec):
@@ -83,37 +150,146 @@ class ResampleSeries(SimpleInterface):
     output_spec = ResampleSeriesOutputSpec
 
     def _run_interface(self, runtime):
-        out_path = fname_presuffix(self.inputs.in_file, suffix='resampled', newpath=runtime.cwd)
+        out_path = work_filename(
+            fname_presuffix(self.inputs.in_file, suffix='resampled', newpath=runtime.cwd),
+            self.inputs.work_compression,
+        )
+        compresslevel = work_compresslevel(self.inputs.work_compression)
 
-        source = nb.load(self.inputs.in_file)
+        source, pe_info = _load_source(
+            self.inputs.in_file, self.inputs.pe_dir, self.inputs.ro_time
+        )
         target = nb.load(self.inputs.ref_file)
         fieldmap = nb.load(self.inputs.fieldmap) if self.inputs.fieldmap else None
-
-        nvols = source.shape[3] if source.ndim > 3 else 1
+        ref_mask = nb.load(self.inputs.ref_mask) if self.inputs.ref_mask else None
 
         # No transforms appear Undefined, pass as empty list
-        transforms = load_transforms(self.inputs.transforms or [], self.inputs.inverse)
+        xfm_paths = self.inputs.transforms or []
+        transforms = load_transforms(
+            xfm_paths, self.inputs.inverse, cache_dir=self.inputs.transforms_cache_dir or None
+        )
+        coords_cache_dir = _coords_cache_dir(
+            self.inputs.coords_cache_dir, xfm_paths, self.inputs.inverse
+        )
+
+        resampled = resample_image(
+            source=source,
+            target=target,
+            transforms=transforms,
+            fieldmap=fieldmap,
+            pe_info=pe_info,
+            jacobian=self.inputs.jacobian,
+            nthreads=self.inputs.num_threads,
+            output_dtype=self.inputs.output_data_type,
+            order=self.inputs.order,
+            mode=self.inputs.mode,
+            cval=self.inputs.cval,
+            prefilter=self.inputs.prefilter,
+            backend=self.inputs.backend,
+            slab_mem_gb=self.inputs.slab_mem_gb or None,
+            coords_cache_dir=coords_cache_dir,
+            target_mask=ref_mask,
+            mask_dilation=self.inputs.mask_dilation,
+            max_volumes=self.inputs.max_volumes or None,
+            out_file=out_path if self.inputs.max_volumes else None,
+            compresslevel=compresslevel,
+        )
+        if not self.inputs.max_volumes:
+            to_filename(
+                resampled, out_path, nthreads=self.inputs.num_threads, compresslevel=compresslevel
+            )
+
+        self._results['out_file'] = out_path
+        return runtime
+
+
+class ResampleSeriesMultiInputSpec(_ResampleSeriesBaseInputSpec):
+    ref_files = InputMultiObject(
+        File(exists=True), mandatory=True, desc='Files to resample in_file to'
+    )
+    transforms = traits.List(
+        InputMultiObject(File(exists=True)),
+        desc='Transform files, from the BOLD reference to each of ref_files (image mode)',
+    )
+    motion_xfm = File(
+        exists=True,
+        desc='Head-motion transforms, from each volume of in_file to the BOLD reference. '
+        'Loaded once and shared by all targets.',
+    )
+    fieldmaps = InputMultiObject(
+        File(exists=True), desc='Fieldmap files resampled into each reference space'
+    )
+    ref_masks = InputMultiObject(
+        File(exists=True),
+        desc='Masks of the voxels of each of ref_files to resample. '
+        'Voxels outside are set to cval.',
+    )
 
-        pe_dir = self.inputs.pe_dir
-        ro_time = self.inputs.ro_time
-        pe_info = None
 
-        if pe_dir and ro_time:
-            pe_axis = 'ijk'.index(pe_dir[0])
-            pe_flip = pe_dir.endswith('-')
+class ResampleSeriesMultiOutputSpec(TraitedSpec):
+    out_files = OutputMultiObject(File, desc='Resampled image or series for each reference')
 
-            # Nitransforms displacements are positive
-            source, axcodes = ensure_positive_cosines(source)
-            axis_flip = axcodes[pe_axis] in 'LPI'
 
-            pe_info = [(pe_axis, -ro_time if (axis_flip ^ pe_flip) else ro_time)] * nvols
+class ResampleSeriesMulti(SimpleInterface):
+    """Resample a time series into several target spaces in a single pass,
+    applying susceptibility and motion correction simultaneously.
 
-        resampled = resample_image(
+    Each volume of the series is read once and sampled into every target,
+    producing one output per element of ``ref_files``.
+    """
+
+    input_spec = ResampleSeriesMultiInputSpec
+    output_spec = ResampleSeriesMultiOutputSpec
+
+    def _run_interface(self, runtime):
+        nrefs = len(self.inputs.ref_files)
+        out_paths = [
+            work_filename(
+                fname_presuffix(
+                    self.inputs.in_file, suffix=f'resampled{idx}', newpath=runtime.cwd
+                ),
+                self.inputs.work_compression,
+            )
+            for idx in range(nrefs)
+        ]
+
+        source, pe_info = _load_source(
+            self.inputs.in_file, self.inputs.pe_dir, self.inputs.ro_time
+        )
+        targets = [nb.load(ref_file) for ref_file in self.inputs.ref_files]
+        fieldmaps = [nb.load(fmap) for fmap in self.inputs.fieldmaps or []] or None
+        ref_masks = [nb.load(mask) for mask in self.inputs.ref_masks or []] or None
+
+        target_xfms = self.inputs.transforms or [[]] * nrefs
+        if len(target_xfms) != nrefs:
+            raise ValueError('Mismatched number of references and transforms')
+
+        # Parse the head-motion transforms once, and append them to each chain
+        xfm_cache_dir = self.inputs.transforms_cache_dir or None
+        hmc = (
+            load_transforms([self.inputs.motion_xfm], [False], cache_dir=xfm_cache_dir)
+            if self.inputs.motion_xfm
+            else None
+        )
+        transforms = []
+        coords_cache_dirs = []
+        for xfm_paths in target_xfms:
+            # Empty chains appear Undefined, pass as empty list
+            chain = load_transforms(xfm_paths or [], [False], cache_dir=xfm_cache_dir)
+            if hmc is not None:
+                chain += hmc
+            transforms.append(chain)
+            coords_cache_dirs.append(
+                _coords_cache_dir(self.inputs.coords_cache_dir, xfm_paths or [], [False])
+            )
+
+        resample_image_multi(
             source=source,
-            target=target,
+            targets=targets,
             transforms=transforms,
-            fieldmap=fieldmap,
+            fieldmaps=fieldmaps,
             pe_info=pe_info,
+            out_files=out_paths,
             jacobian=self.inputs.jacobian,
             nthreads=self.inputs.num_threads,
             output_dtype=self.inputs.output_data_type,
@@ -121,8 +297,75 @@ class ResampleSeries(SimpleInterface):
             mode=self.inputs.mode,
             cval=self.inputs.cval,
             prefilter=self.inputs.prefilter,
+            backend=self.inputs.backend,
+            slab_mem_gb=self.inputs.slab_mem_gb or None,
+            coords_cache_dirs=coords_cache_dirs,
+            target_masks=ref_masks,
+            mask_dilation=self.inputs.mask_dilation,
+            max_volumes=self.inputs.max_volumes or None,
+            compresslevel=work_compresslevel(self.inputs.work_compression),
+        )
+
+        self._results['out_files'] = out_paths
+        return runtime
+
+
+class SplineFilterSeriesInputSpec(TraitedSpec):
+    in_file = File(exists=True, mandatory=True, desc='3D or 4D image file to prefilter')
+    order = traits.Int(3, usedefault=True, desc='Order of interpolation (0=nearest, 3=cubic)')
+    mode = traits.Enum(
+        'grid-constant',
+        'nearest',
+        'constant',
+        'mirror',
+        'reflect',
+        'wrap',
+        'grid-mirror',
+        'grid-wrap',
+        usedefault=True,
+        desc='How data is extended beyond its boundaries. '
+        'Must match the mode used to resample the prefiltered series.',
+    )
+    cval = traits.Float(0.0, usedefault=True, desc='Value to fill past edges of data')
+    max_volumes = traits.Int(
+        0,
+        usedefault=True,
+        desc='Maximum number of volumes to load and prefilter at a time. '
+        'If zero, the full series is loaded into memory.',
+    )
+
+
+class SplineFilterSeriesOutputSpec(TraitedSpec):
+    out_file = File(desc='Uncompressed image of spline coefficients')
+
+
+class SplineFilterSeries(SimpleInterface):
+    """Compute the B-spline coefficients of each volume of a series.
+
+    The coefficients are written uncompressed, so that they can be memory-mapped
+    and shared by several :class:`ResampleSeries` nodes with ``prefilter=False``.
+    """
+
+    input_spec = SplineFilterSeriesInputSpec
+    output_spec = SplineFilterSeriesOutputSpec
+
+    def _run_interface(self, runtime):
+        out_path = fname_presuffix(
+            self.inputs.in_file,
+            suffix='coeffs',
+            newpath=runtime.cwd,
+            use_ext=False,
+        )
+        out_path = f'{out_path}.nii'
+
+        spline_filter_series(
+            source=nb.load(self.inputs.in_file),
+            order=self.inputs.order,
+            mode=self.inputs.mode,
+            cval=self.inputs.cval,
+            max_volumes=self.inputs.max_volumes or None,
+            out_file=out_path,
         )
-        resampled.to_filename(out_path)
 
         self._results['out_file'] = out_path
         return runtime
@@ -149,6 +392,14 @@ class ReconstructFieldmapInputSpec(TraitedSpec):
         usedefault=True,
         desc='Whether to invert each file in transforms',
     )
+    transforms_cache_dir = Directory(
+        desc='Directory to store parsed transforms in a binary format, '
+        'reused by other processes loading the same transform files',
+    )
+    fmap_cache_dir = Directory(
+        desc='Directory to store reconstructed fieldmaps, reused by other nodes '
+        'reconstructing the same coefficients on the same grid with the same transforms',
+    )
 
 
 class ReconstructFieldmapOutputSpec(TraitedSpec):
@@ -162,6 +413,10 @@ class ReconstructFieldmap(SimpleInterface):
     transforms include a warp), then a reference file describing the space
     where it is valid to extrapolate the field will be used as an intermediate
     step.
+
+    If ``fmap_cache_dir`` is set, reconstructed fieldmaps are stored there,
+    keyed by the contents of the coefficient, reference and transform files
+    and by the target grid, and reused whenever the same field is requested.
     """
 
     input_spec = ReconstructFieldmapInputSpec
@@ -170,11 +425,30 @@ class ReconstructFieldmap(SimpleInterface):
     def _run_interface(self, runtime):
         out_path = fname_presuffix(self.inputs.in_coeffs[-1], suffix='rec', newpath=runtime.cwd)
 
-        coefficients = [nb.load(coeff_file) for coeff_file in self.inputs.in_coeffs]
         target = nb.load(self.inputs.target_ref_file)
+
+        cache_file = None
+        if self.inputs.fmap_cache_dir:
+            key = _fieldmap_cache_key(
+                [*self.inputs.in_coeffs, self.inputs.fmap_ref_file],
+                target,
+                self.inputs.transforms,
+                self.inputs.inverse,
+            )
+            cache_file = Path(self.inputs.fmap_cache_dir) / f'fmap_{key}.nii'
+            if cache_file.exists():
+                nb.load(cache_file).to_filename(out_path)
+                self._results['out_file'] = out_path
+                return runtime
+
+        coefficients = [nb.load(coeff_file) for coeff_file in self.inputs.in_coeffs]
         fmapref = nb.load(self.inputs.fmap_ref_file)
 
-        transforms = load_transforms(self.inputs.transforms, self.inputs.inverse)
+        transforms = load_transforms(
+            self.inputs.transforms,
+            self.inputs.inverse,
+            cache_dir=self.inputs.transforms_cache_dir or None,
+        )
 
         fieldmap = reconstruct_fieldmap(
             coefficients=coefficients,
@@ -183,6 +457,11 @@ class ReconstructFieldmap(SimpleInterface):
             transforms=transforms,
         )
         fieldmap.to_filename(out_path)
+        if cache_file is not None:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix(f'.{os.getpid()}.nii')
+            fieldmap.to_filename(tmp_file)
+            os.replace(tmp_file, cache_file)
 
         self._results['out_file'] = out_path
         return runtime
@@ -232,128 +511,694 @@ class DistortionParameters(SimpleInterface):
         return runtime
 
 
-def resample_vol(
-    data: np.ndarray,
-    coordinates: np.ndarray,
-    pe_info: tuple[int, float],
-    jacobian: bool,
-    hmc_xfm: np.ndarray | None,
-    fmap_hz: np.ndarray,
-    output: np.dtype | np.ndarray | None = None,
-    order: int = 3,
-    mode: str = 'constant',
-    cval: float = 0.0,
-    prefilter: bool = True,
-) -> np.ndarray:
-    """Resample a volume at specified coordinates
+class VolumeToSurfaceRibbonInputSpec(TraitedSpec):
+    volume_file = File(exists=True, mandatory=True, desc='the volume to map data from')
+    surface_file = File(exists=True, mandatory=True, desc='the surface to map the data onto')
+    inner_surface = File(exists=True, mandatory=True, desc='the inner surface of the ribbon')
+    outer_surface = File(exists=True, mandatory=True, desc='the outer surface of the ribbon')
+    volume_roi = File(
+        exists=True, desc='ignore voxels that do not have a positive value in this volume'
+    )
+    voxel_subdiv = traits.Int(
+        3, usedefault=True, desc='number of subdivisions of each voxel along each axis'
+    )
+    max_volumes = traits.Int(
+        0,
+        usedefault=True,
+        desc='Maximum number of volumes to load and sample at a time. '
+        'If zero, the full series is loaded into memory.',
+    )
+    weights_cache_dir = Directory(
+        desc='Directory to store the sampling weights, reused by other runs '
+        'sampling the same grid onto the same surfaces',
+    )
 
-    This function implements simultaneous head-motion correction and
-    susceptibility-distortion correction. It accepts coordinates in
-    the source voxel space. It is the responsibility of the caller to
-    transform coordinates from any other target space.
 
-    Parameters
-    ----------
-    data
-        The data array to resample
-    coordinates
-        The first-approximation voxel coordinates to sample from ``data``
-        The first dimension should have length ``data.ndim``. The further
-        dimensions have the shape of the target array.
-    pe_info
-        The readout vector in the form of (axis, signed-readout-time)
-        ``(1, -0.04)`` becomes ``[0, -0.04, 0]``, which indicates that a
-        +1 Hz deflection in the field shifts 0.04 voxels toward the start
-        of the data array in the second dimension.
-    hmc_xfm
-        Affine transformation accounting for head motion from the individual
-        volume into the BOLD reference space. This affine must be in VOX2VOX
-        form.
-    fmap_hz
-        The fieldmap, sampled to the target space, in Hz
-    output
-        The dtype or a pre-allocated array for sampling into the target space.
-        If pre-allocated, ``output.shape == coordinates.shape[1:]``.
-    order
-        Order of interpolation (default: 3 = cubic)
-    mode
-        How ``data`` is extended beyond its boundaries. See
-        :func:`scipy.ndimage.map_coordinates` for more details.
-    cval
-        Value to fill past edges of ``data`` if ``mode`` is ``'constant'``.
-    prefilter
-        Determines if ``data`` is pre-filtered before interpolation.
+class VolumeToSurfaceRibbonOutputSpec(TraitedSpec):
+    out_file = File(desc='the output metric file')
 
-    Returns
-    -------
-    resampled_array
-        The resampled array, with shape ``coordinates.shape[1:]``.
+
+class VolumeToSurfaceRibbon(SimpleInterface):
+    """Map a volume to a surface with the ribbon-constrained method, in-process
+
+    This is equivalent to ``wb_command -volume-to-surface-mapping -ribbon-constrained``
+    (see :class:`~fmriprep.interfaces.workbench.VolumeToSurfaceMapping`).
+    The voxel weights of each vertex only depend on the surfaces and the grid of
+    the volume, so they are calculated once by :func:`ribbon_weights`, as a sparse
+    matrix, and each series is sampled by a sparse matrix product.
+
+    If ``weights_cache_dir`` is set, the weights are stored there, keyed by the
+    contents of the inner and outer surfaces, the grid of the volume and the
+    number of subdivisions, and reused by every run on the same grid.
     """
-    if hmc_xfm is not None:
-        # Move image with the head
-        coords_shape = coordinates.shape
-        coordinates = nb.affines.apply_affine(
-            hmc_xfm, coordinates.reshape(coords_shape[0], -1).T
-        ).T.reshape(coords_shape)
-    else:
-        # Copy coordinates to avoid interfering with other calls
-        coordinates = coordinates.copy()
 
-    vsm = fmap_hz * pe_info[1]
-    coordinates[pe_info[0], ...] += vsm
+    input_spec = VolumeToSurfaceRibbonInputSpec
+    output_spec = VolumeToSurfaceRibbonOutputSpec
 
-    result = ndi.map_coordinates(
-        data,
-        coordinates,
-        output=output,
-        order=order,
-        mode=mode,
-        cval=cval,
-        prefilter=prefilter,
-    )
+    def _run_interface(self, runtime):
+        img = nb.load(self.inputs.volume_file)
+        weights = self._ribbon_weights(img)
 
-    if jacobian:
-        result *= 1 + np.gradient(vsm, axis=pe_info[0])
+        roi = None
+        if self.inputs.volume_roi:
+            roi = np.asanyarray(nb.load(self.inputs.volume_roi).dataobj) > 0
 
-    return result
+        sampled = sample_ribbon(weights, img, roi, max_volumes=self.inputs.max_volumes or None)
+        self._results['out_file'] = self._write_metric(sampled, runtime)
+        return runtime
 
+    def _ribbon_weights(self, target: nb.spatialimages.SpatialImage):
+        """Load the sampling weights on the grid of ``target``, or calculate them"""
+        import scipy.sparse as sp
 
-async def resample_series_async(
-    data: np.ndarray,
-    coordinates: np.ndarray,
-    pe_info: list[tuple[int, float]],
-    jacobian: bool,
-    hmc_xfms: list[np.ndarray] | None,
-    fmap_hz: np.ndarray,
-    output_dtype: np.dtype | None = None,
-    order: int = 3,
-    mode: str = 'constant',
-    cval: float = 0.0,
-    prefilter: bool = True,
-    max_concurrent: int = min(os.cpu_count(), 12),
-) -> np.ndarray:
-    """Resample a 4D time series at specified coordinates
+        cache_file = None
+        if self.inputs.weights_cache_dir:
+            key = _ribbon_cache_key(
+                [self.inputs.inner_surface, self.inputs.outer_surface],
+                target,
+                self.inputs.voxel_subdiv,
+            )
+            cache_file = Path(self.inputs.weights_cache_dir) / f'ribbon_{key}.npz'
+
+        if cache_file is not None and cache_file.exists():
+            return sp.load_npz(cache_file)
+
+        inner = nb.load(self.inputs.inner_surface)
+        outer = nb.load(self.inputs.outer_surface)
+        weights = ribbon_weights(
+            inner.agg_data('pointset'),
+            outer.agg_data('pointset'),
+            inner.agg_data('triangle'),
+            target,
+            subdiv=self.inputs.voxel_subdiv,
+        )
+        if cache_file is not None:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix(f'.{os.getpid()}.npz')
+            sp.save_npz(tmp_file, weights)
+            os.replace(tmp_file, cache_file)
+        return weights
+
+    def _write_metric(self, sampled: np.ndarray, runtime) -> str:
+        """Write the sampled data as a metric file of the surface"""
+        # Metric files carry the structure of the surface, as set by wb_command
+        surface = nb.load(self.inputs.surface_file)
+        structure = {
+            key: value
+            for meta in (surface.meta, surface.darrays[0].meta)
+            for key, value in meta.items()
+            if key.startswith('AnatomicalStructure')
+        }
+        metric = nb.GiftiImage(
+            meta=nb.gifti.GiftiMetaData(structure),
+            darrays=[
+                nb.gifti.GiftiDataArray(
+                    column, intent='NIFTI_INTENT_NONE', datatype='NIFTI_TYPE_FLOAT32'
+                )
+                for column in sampled.astype('f4').T
+            ],
+        )
+        out_file = fname_presuffix(
+            self.inputs.surface_file,
+            suffix='_mapped.func.gii',
+            use_ext=False,
+            newpath=runtime.cwd,
+        )
+        metric.to_filename(out_file)
+        return out_file
 
-    This function implements simultaneous head-motion correction and
-    susceptibility-distortion correction. It accepts coordinates in
-    the source voxel space. It is the responsibility of the caller to
-    transform coordinates from any other target space.
 
-    Parameters
-    ----------
-    data
-        The data array to resample
-    coordinates
-        The first-approximation voxel coordinates to sample from ``data``.
-        The first dimension should have length 3.
-        The further dimensions determine the shape of the target array.
-    pe_info
-        A list of readout vectors in the form of (axis, signed-readout-time)
-        ``(1, -0.04)`` becomes ``[0, -0.04, 0]``, which indicates that a
-        +1 Hz deflection in the field shifts 0.04 voxels toward the start
-        of the data array in the second dimension.
-    hmc_xfm
-        A sequence of affine transformations accounting for head motion from
+class _NativeSamplingInputSpec(TraitedSpec):
+    transforms = InputMultiObject(
+        File(exists=True),
+        desc='Transform files, from the BOLD series to the target space (image mode)',
+    )
+    inverse = InputMultiObject(
+        traits.Bool,
+        value=[False],
+        usedefault=True,
+        desc='Whether to invert each file in transforms',
+    )
+    fieldmap = File(exists=True, desc='Fieldmap file resampled into the target space')
+    ro_time = traits.Float(desc='EPI readout time (s).')
+    pe_dir = traits.Enum(
+        'i',
+        'i-',
+        'j',
+        'j-',
+        'k',
+        'k-',
+        desc='the phase-encoding direction corresponding to the BOLD series',
+    )
+    jacobian = traits.Bool(mandatory=True, desc='Whether to apply Jacobian correction')
+    order = traits.Int(3, usedefault=True, desc='Order of interpolation (0=nearest, 3=cubic)')
+    prefilter = traits.Bool(True, usedefault=True, desc='Spline-prefilter data if order > 1')
+    num_threads = traits.Int(1, usedefault=True, desc='Number of threads to use for resampling')
+    transforms_cache_dir = Directory(
+        desc='Directory to store parsed transforms in a binary format, '
+        'reused by other processes loading the same transform files',
+    )
+
+
+class ResampleSeriesRibbonInputSpec(VolumeToSurfaceRibbonInputSpec, _NativeSamplingInputSpec):
+    volume_file = File(
+        exists=True,
+        mandatory=True,
+        desc='the BOLD series (or its B-spline coefficients) to map data from',
+    )
+    ref_file = File(
+        exists=True,
+        mandatory=True,
+        desc='image defining the grid of the ribbon voxels, in the space of the surfaces',
+    )
+    volume_roi = File(
+        exists=True,
+        desc='ignore voxels of ref_file that do not have a positive value in this volume',
+    )
+
+
+class ResampleSeriesRibbon(VolumeToSurfaceRibbon):
+    """Map a BOLD series to a surface with the ribbon-constrained method, without
+    resampling it into the space of the surfaces first
+
+    Equivalent to resampling ``volume_file`` onto the grid of ``ref_file`` with
+    :class:`ResampleSeries` and mapping the result with :class:`VolumeToSurfaceRibbon`.
+    Instead, only the voxels of ``ref_file`` with ribbon weights are mapped through the
+    transforms, head motion and fieldmap into ``volume_file``, and the series is
+    interpolated at those locations and weighted in one go
+    (see :func:`sample_ribbon_series`).
+    """
+
+    input_spec = ResampleSeriesRibbonInputSpec
+
+    def _run_interface(self, runtime):
+        source, pe_info = _load_source(
+            self.inputs.volume_file, self.inputs.pe_dir, self.inputs.ro_time
+        )
+        target = nb.load(self.inputs.ref_file)
+        weights = self._ribbon_weights(target)
+
+        roi = None
+        if self.inputs.volume_roi:
+            roi = load_target_mask(nb.load(self.inputs.volume_roi), target)
+
+        transforms = load_transforms(
+            self.inputs.transforms or [],
+            self.inputs.inverse,
+            cache_dir=self.inputs.transforms_cache_dir or None,
+        )
+        sampled = sample_ribbon_series(
+            weights,
+            source,
+            target,
+            transforms,
+            nb.load(self.inputs.fieldmap) if self.inputs.fieldmap else None,
+            pe_info,
+            roi=roi,
+            jacobian=self.inputs.jacobian,
+            order=self.inputs.order,
+            prefilter=self.inputs.prefilter,
+            max_volumes=self.inputs.max_volumes or None,
+            nthreads=self.inputs.num_threads,
+        )
+        self._results['out_file'] = self._write_metric(sampled, runtime)
+        return runtime
+
+
+class ResampleSeriesCiftiInputSpec(_NativeSamplingInputSpec):
+    in_file = File(
+        exists=True,
+        mandatory=True,
+        desc='the BOLD series (or its B-spline coefficients) to resample',
+    )
+    surface_bolds = traits.List(
+        File(exists=True),
+        mandatory=True,
+        minlen=2,
+        maxlen=2,
+        desc='left and right hemisphere BOLD series on fsLR surfaces',
+    )
+    grayordinates = traits.Enum('91k', '170k', usedefault=True, desc='final CIFTI grayordinates')
+    TR = traits.Float(mandatory=True, desc='repetition time')
+    max_volumes = traits.Int(
+        0,
+        usedefault=True,
+        desc='Maximum number of volumes to load and resample at a time. '
+        'If zero, the full series is loaded into memory.',
+    )
+
+
+class ResampleSeriesCiftiOutputSpec(TraitedSpec):
+    out_file = File(desc='the CIFTI-2 dense timeseries')
+    out_metadata = File(desc='metadata of the CIFTI-2 dense timeseries')
+
+
+class ResampleSeriesCifti(SimpleInterface):
+    """Generate a BOLD CIFTI-2 dense timeseries, resampling only the subcortical grayordinates
+
+    This is equivalent to resampling the BOLD series into MNI152NLin6Asym with
+    :class:`ResampleSeries` and combining it with the surface series with
+    :class:`niworkflows.interfaces.cifti.GenerateCifti`.
+    Instead, only the voxels of the subcortical structures in the CIFTI template
+    are mapped through the transforms (see :func:`resample_voxels`), and the
+    dense volumetric series is never created.
+    The ``transforms`` and ``fieldmap`` must target the grid of the template's
+    subcortical atlas.
+    """
+
+    input_spec = ResampleSeriesCiftiInputSpec
+    output_spec = ResampleSeriesCiftiOutputSpec
+
+    def _run_interface(self, runtime):
+        import json
+
+        import nibabel.cifti2 as ci
+        from niworkflows.interfaces.cifti import CIFTI_STRUCT_WITH_LABELS, _prepare_cifti
+
+        surface_labels, volume_label, metadata = _prepare_cifti(self.inputs.grayordinates)
+        # Grayordinates are indexed in the HCP orientation (LAS), but sampled on the
+        # label grid, as the series would be resampled into it
+        target = nb.load(volume_label)
+        label_img = _reorient(target, ('L', 'A', 'S'))
+        label_data = np.asanyarray(label_img.dataobj).astype('int16')
+
+        source, pe_info = _load_source(
+            self.inputs.in_file, self.inputs.pe_dir, self.inputs.ro_time
+        )
+        nvols = source.shape[3] if source.ndim > 3 else 1
+
+        brainmodels = []
+        surface_series = {}
+        voxel_ijk = []
+        offset = 0
+        for structure, labels in CIFTI_STRUCT_WITH_LABELS.items():
+            if labels is None:
+                right = structure.split('_')[-1] == 'RIGHT'
+                surf_ts = nb.load(self.inputs.surface_bolds[right])
+                medial = np.nonzero(nb.load(surface_labels[right]).darrays[0].data)[0]
+                surface_series[offset] = np.stack(
+                    [darray.data[medial] for darray in surf_ts.darrays]
+                )
+                model = ci.Cifti2BrainModel(
+                    index_offset=offset,
+                    index_count=len(medial),
+                    model_type='CIFTI_MODEL_TYPE_SURFACE',
+                    brain_structure=structure,
+                    vertex_indices=ci.Cifti2VertexIndices(medial),
+                    n_surface_vertices=len(surf_ts.darrays[0].data),
+                )
+            else:
+                # HCP lists voxels in column-major (Fortran) order
+                ijk = []
+                for label in labels:
+                    k, j, i = np.nonzero(label_data.T == label)
+                    ijk.append(np.stack((i, j, k), axis=-1))
+                ijk = np.concatenate(ijk)
+                voxel_ijk.append(ijk)
+                model = ci.Cifti2BrainModel(
+                    index_offset=offset,
+                    index_count=len(ijk),
+                    model_type='CIFTI_MODEL_TYPE_VOXELS',
+                    brain_structure=structure,
+                    voxel_indices_ijk=ci.Cifti2VoxelIndicesIJK(ijk),
+                )
+            brainmodels.append(model)
+            offset += model.index_count
+
+        series = np.zeros((nvols, offset), dtype='f4')
+        for start, data in surface_series.items():
+            series[:, start : start + data.shape[1]] = data
+
+        # Subcortical grayordinates are resampled directly into their columns
+        columns = np.concatenate(
+            [
+                np.arange(model.index_offset, model.index_offset + model.index_count)
+                for model in brainmodels
+                if model.model_type == 'CIFTI_MODEL_TYPE_VOXELS'
+            ]
+        )
+        target_ijk = nb.affines.apply_affine(
+            np.linalg.inv(target.affine) @ label_img.affine, np.concatenate(voxel_ijk)
+        )
+        voxels = np.ravel_multi_index(tuple(np.rint(target_ijk).astype(int).T), target.shape[:3])
+
+        fieldmap = None
+        if self.inputs.fieldmap:
+            fieldmap = nb.load(self.inputs.fieldmap)
+            if fieldmap.shape[:3] != target.shape[:3] or not np.allclose(
+                fieldmap.affine, target.affine
+            ):
+                fieldmap = nt.resampling.apply(nt.Affine(), fieldmap, reference=target)
+        transforms = load_transforms(
+            self.inputs.transforms or [],
+            self.inputs.inverse,
+            cache_dir=self.inputs.transforms_cache_dir or None,
+        )
+        for volumes, resampled in resample_voxels(
+            source,
+            target,
+            voxels,
+            transforms,
+            fieldmap,
+            pe_info,
+            jacobian=self.inputs.jacobian,
+            order=self.inputs.order,
+            prefilter=self.inputs.prefilter,
+            max_volumes=self.inputs.max_volumes or None,
+            nthreads=self.inputs.num_threads,
+        ):
+            series[volumes, columns] = resampled.T
+
+        brainmodels.append(
+            ci.Cifti2Volume(
+                label_img.shape[:3],
+                ci.Cifti2TransformationMatrixVoxelIndicesIJKtoXYZ(-3, label_img.affine),
+            )
+        )
+        matrix = ci.Cifti2Matrix()
+        matrix.append(
+            ci.Cifti2MatrixIndicesMap(
+                (0,),
+                'CIFTI_INDEX_TYPE_SERIES',
+                number_of_series_points=nvols,
+                series_exponent=0,
+                series_start=0.0,
+                series_step=self.inputs.TR,
+                series_unit='SECOND',
+            )
+        )
+        matrix.append(
+            ci.Cifti2MatrixIndicesMap((1,), 'CIFTI_INDEX_TYPE_BRAIN_MODELS', maps=brainmodels)
+        )
+        matrix.metadata = ci.Cifti2MetaData(metadata)
+        img = ci.Cifti2Image(dataobj=series, header=ci.Cifti2Header(matrix))
+        img.set_data_dtype('f4')
+        img.nifti_header.set_intent('NIFTI_INTENT_CONNECTIVITY_DENSE_SERIES')
+
+        self._results['out_file'] = fname_presuffix(
+            self.inputs.in_file, suffix='.dtseries.nii', use_ext=False, newpath=runtime.cwd
+        )
+        ci.save(img, self._results['out_file'])
+
+        metadata_file = Path(runtime.cwd) / 'dtseries_variables.json'
+        metadata_file.write_text(json.dumps(metadata, indent=2))
+        self._results['out_metadata'] = str(metadata_file)
+        return runtime
+
+
+class MetricResampleSparseInputSpec(TraitedSpec):
+    in_file = File(exists=True, mandatory=True, desc='the metric file to resample')
+    current_sphere = File(
+        exists=True,
+        mandatory=True,
+        desc='a sphere surface with the mesh that the metric is currently on',
+    )
+    new_sphere = File(
+        exists=True,
+        mandatory=True,
+        desc='a sphere surface that is in register with current_sphere and '
+        'has the desired output mesh',
+    )
+    current_area = File(
+        exists=True,
+        mandatory=True,
+        desc='a relevant anatomical surface with the current_sphere mesh, '
+        'for vertex area correction',
+    )
+    new_area = File(
+        exists=True,
+        mandatory=True,
+        desc='a relevant anatomical surface with the new_sphere mesh, for vertex area correction',
+    )
+    current_roi = File(
+        exists=True,
+        desc='ROI metric on the current mesh; vertices outside it are excluded as sources',
+    )
+    new_roi = File(
+        exists=True,
+        desc='ROI metric on the new mesh; vertices outside it are set to zero',
+    )
+    weights_cache_dir = Directory(
+        desc='Directory to store the resampling weights, reused by other runs '
+        'resampling data on the same meshes',
+    )
+
+
+class MetricResampleSparseOutputSpec(TraitedSpec):
+    out_file = File(desc='the output metric')
+
+
+class MetricResampleSparse(SimpleInterface):
+    """Resample a metric file to a different mesh with ADAP_BARY_AREA weights, in-process
+
+    This is equivalent to ``wb_command -metric-resample`` with the ``ADAP_BARY_AREA``
+    method, ``-area-surfs`` and, optionally, ``-current-roi``, followed by
+    ``wb_command -metric-mask`` with ``new_roi``
+    (see :class:`~fmriprep.interfaces.workbench.MetricResample`).
+    The weights only depend on the spheres, the area surfaces and the current ROI,
+    so they are calculated once by :func:`adap_bary_area_weights`, as a sparse matrix,
+    the new ROI is applied to its rows, and all columns of the metric are resampled
+    by a single sparse matrix product.
+
+    If ``weights_cache_dir`` is set, the weights are stored there, keyed by the
+    contents of the spheres, the area surfaces and the current ROI, and reused
+    by every run resampled to the same mesh.
+    """
+
+    input_spec = MetricResampleSparseInputSpec
+    output_spec = MetricResampleSparseOutputSpec
+
+    def _run_interface(self, runtime):
+        import scipy.sparse as sp
+
+        surface_files = [
+            self.inputs.current_sphere,
+            self.inputs.new_sphere,
+            self.inputs.current_area,
+            self.inputs.new_area,
+        ]
+        cache_file = None
+        if self.inputs.weights_cache_dir:
+            key = _metric_resample_cache_key(
+                surface_files + ([self.inputs.current_roi] if self.inputs.current_roi else [])
+            )
+            cache_file = Path(self.inputs.weights_cache_dir) / f'adap_bary_area_{key}.npz'
+
+        if cache_file is not None and cache_file.exists():
+            weights = sp.load_npz(cache_file)
+        else:
+            current, new, current_area, new_area = (nb.load(fname) for fname in surface_files)
+            current_roi = None
+            if self.inputs.current_roi:
+                current_roi = nb.load(self.inputs.current_roi).darrays[0].data > 0
+            weights = adap_bary_area_weights(
+                current.agg_data('pointset'),
+                current.agg_data('triangle'),
+                new.agg_data('pointset'),
+                new.agg_data('triangle'),
+                current_area.agg_data('pointset'),
+                new_area.agg_data('pointset'),
+                current_roi=current_roi,
+            )
+            if cache_file is not None:
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_file = cache_file.with_suffix(f'.{os.getpid()}.npz')
+                sp.save_npz(tmp_file, weights)
+                os.replace(tmp_file, cache_file)
+
+        new_roi = None
+        if self.inputs.new_roi:
+            new_roi = nb.load(self.inputs.new_roi).darrays[0].data > 0
+
+        metric = nb.load(self.inputs.in_file)
+        data = np.stack([darray.data for darray in metric.darrays], axis=-1)
+        resampled = resample_metric(weights, data, new_roi)
+
+        out_metric = nb.GiftiImage(
+            meta=metric.meta,
+            darrays=[
+                nb.gifti.GiftiDataArray(
+                    column,
+                    intent=darray.intent,
+                    datatype='NIFTI_TYPE_FLOAT32',
+                    meta=darray.meta,
+                )
+                for column, darray in zip(resampled.astype('f4').T, metric.darrays, strict=True)
+            ],
+        )
+        self._results['out_file'] = fname_presuffix(
+            self.inputs.new_sphere,
+            suffix='_resampled.func.gii',
+            use_ext=False,
+            newpath=runtime.cwd,
+        )
+        out_metric.to_filename(self._results['out_file'])
+        return runtime
+
+
+def resample_vol(
+    data: np.ndarray,
+    coordinates: np.ndarray,
+    pe_info: tuple[int, float],
+    jacobian: bool | np.ndarray | None,
+    hmc_xfm: np.ndarray | None,
+    fmap_hz: np.ndarray | None,
+    output: np.dtype | np.ndarray | None = None,
+    order: int = 3,
+    mode: str = 'constant',
+    cval: float = 0.0,
+    prefilter: bool = True,
+    mask: np.ndarray | None = None,
+    vsm: np.ndarray | None = None,
+) -> np.ndarray:
+    """Resample a volume at specified coordinates
+
+    This function implements simultaneous head-motion correction and
+    susceptibility-distortion correction. It accepts coordinates in
+    the source voxel space. It is the responsibility of the caller to
+    transform coordinates from any other target space.
+
+    Parameters
+    ----------
+    data
+        The data array to resample
+    coordinates
+        The first-approximation voxel coordinates to sample from ``data``
+        The first dimension should have length ``data.ndim``. The further
+        dimensions have the shape of the target array.
+    pe_info
+        The readout vector in the form of (axis, signed-readout-time)
+        ``(1, -0.04)`` becomes ``[0, -0.04, 0]``, which indicates that a
+        +1 Hz deflection in the field shifts 0.04 voxels toward the start
+        of the data array in the second dimension.
+    jacobian
+        Whether to apply Jacobian correction, or a precomputed map of the
+        Jacobian determinant of the susceptibility distortion to apply.
+    hmc_xfm
+        Affine transformation accounting for head motion from the individual
+        volume into the BOLD reference space. This affine must be in VOX2VOX
+        form.
+    fmap_hz
+        The fieldmap, sampled to the target space, in Hz
+    output
+        The dtype or a pre-allocated array for sampling into the target space.
+        If pre-allocated, ``output.shape == coordinates.shape[1:]``.
+    order
+        Order of interpolation (default: 3 = cubic)
+    mode
+        How ``data`` is extended beyond its boundaries. See
+        :func:`scipy.ndimage.map_coordinates` for more details.
+    cval
+        Value to fill past edges of ``data`` if ``mode`` is ``'constant'``.
+    prefilter
+        Determines if ``data`` is pre-filtered before interpolation.
+    mask
+        A boolean array with shape ``coordinates.shape[1:]``. If provided,
+        only the coordinates inside the mask are sampled, and the remainder
+        of the output is set to ``cval``.
+    vsm
+        A precomputed voxel shift map (``fmap_hz`` scaled by the readout time).
+        If provided, ``fmap_hz`` is ignored.
+
+    Returns
+    -------
+    resampled_array
+        The resampled array, with shape ``coordinates.shape[1:]``.
+    """
+    if vsm is None:
+        vsm = fmap_hz * pe_info[1]
+    if not isinstance(jacobian, np.ndarray):
+        jacobian = 1 + np.gradient(vsm, axis=pe_info[0]) if jacobian else None
+
+    if mask is not None:
+        # Sample a compact list of coordinates, and scatter the results afterwards.
+        sampled = resample_vol(
+            data,
+            coordinates[:, mask],
+            pe_info,
+            None if jacobian is None else jacobian[mask],
+            hmc_xfm,
+            None,
+            getattr(output, 'dtype', output),
+            order,
+            mode,
+            cval,
+            prefilter,
+            vsm=vsm[mask],
+        )
+
+        if not isinstance(output, np.ndarray):
+            output = np.empty(mask.shape, dtype=sampled.dtype)
+        output[~mask] = cval
+        output[mask] = sampled
+        return output
+
+    if hmc_xfm is not None:
+        # Move image with the head
+        coords_shape = coordinates.shape
+        coordinates = nb.affines.apply_affine(
+            hmc_xfm, coordinates.reshape(coords_shape[0], -1).T
+        ).T.reshape(coords_shape)
+    else:
+        # Copy coordinates to avoid interfering with other calls
+        coordinates = coordinates.copy()
+
+    coordinates[pe_info[0], ...] += vsm
+
+    result = ndi.map_coordinates(
+        data,
+        coordinates,
+        output=output,
+        order=order,
+        mode=mode,
+        cval=cval,
+        prefilter=prefilter,
+    )
+
+    if jacobian is not None:
+        result *= jacobian
+
+    return result
+
+
+async def resample_series_async(
+    data: np.ndarray,
+    coordinates: np.ndarray,
+    pe_info: list[tuple[int, float]],
+    jacobian: bool,
+    hmc_xfms: list[np.ndarray] | None,
+    fmap_hz: np.ndarray,
+    output_dtype: np.dtype | None = None,
+    order: int = 3,
+    mode: str = 'constant',
+    cval: float = 0.0,
+    prefilter: bool = True,
+    mask: np.ndarray | None = None,
+    distortions: dict | None = None,
+    max_concurrent: int = min(os.cpu_count(), 12),
+) -> np.ndarray:
+    """Resample a 4D time series at specified coordinates
+
+    This function implements simultaneous head-motion correction and
+    susceptibility-distortion correction. It accepts coordinates in
+    the source voxel space. It is the responsibility of the caller to
+    transform coordinates from any other target space.
+
+    Parameters
+    ----------
+    data
+        The data array to resample
+    coordinates
+        The first-approximation voxel coordinates to sample from ``data``.
+        The first dimension should have length 3.
+        The further dimensions determine the shape of the target array.
+    pe_info
+        A list of readout vectors in the form of (axis, signed-readout-time)
+        ``(1, -0.04)`` becomes ``[0, -0.04, 0]``, which indicates that a
+        +1 Hz deflection in the field shifts 0.04 voxels toward the start
+        of the data array in the second dimension.
+    hmc_xfm
+        A sequence of affine transformations accounting for head motion from
         the individual volume into the BOLD reference space.
         These affines must be in VOX2VOX form.
     fmap_hz
@@ -369,6 +1214,14 @@ async def resample_series_async(
         Value to fill past edges of ``data`` if ``mode`` is ``'constant'``.
     prefilter
         Determines if ``data`` is pre-filtered before interpolation.
+    mask
+        A boolean array with the shape of the target array. If provided, only
+        the coordinates inside the mask are sampled.
+    distortions
+        A cache of the voxel shift and Jacobian maps derived from ``fmap_hz``,
+        indexed by readout vector, as produced by :func:`distortion_maps`.
+        It is filled as needed, and may be shared by calls resampling with the
+        same ``fmap_hz`` and ``jacobian``, to compute the maps only once per run.
     max_concurrent
         Maximum number of volumes to resample concurrently
 
@@ -378,12 +1231,23 @@ async def resample_series_async(
         The resampled array, with shape ``coordinates.shape[1:] + (N,)``,
         where N is the number of volumes in ``data``.
     """
+    if distortions is None:
+        distortions = {}
+    # The readout vector is typically the same for all volumes
+    for readout in {tuple(pe) for pe in pe_info}:
+        if readout not in distortions:
+            distortions[readout] = distortion_maps(fmap_hz, readout, jacobian)
+
+    # Precomputed (VSM, Jacobian) pair for each volume
+    vol_distortions = [distortions[tuple(pe)] for pe in pe_info]
+
     if data.ndim == 3:
+        vsm, jacobian_map = vol_distortions[0]
         return resample_vol(
             data,
             coordinates,
             pe_info[0],
-            jacobian,
+            jacobian_map,
             hmc_xfms[0] if hmc_xfms else None,
             fmap_hz,
             output_dtype,
@@ -391,6 +1255,8 @@ async def resample_series_async(
             mode,
             cval,
             prefilter,
+            mask,
+            vsm,
         )
 
     semaphore = asyncio.Semaphore(max_concurrent)
@@ -407,7 +1273,7 @@ async def resample_series_async(
                     data=volume,
                     coordinates=coordinates,
                     pe_info=pe_info[volid],
-                    jacobian=jacobian,
+                    jacobian=vol_distortions[volid][1],
                     hmc_xfm=hmc_xfms[volid] if hmc_xfms else None,
                     fmap_hz=fmap_hz,
                     output=out_array[..., volid],
@@ -415,6 +1281,8 @@ async def resample_series_async(
                     mode=mode,
                     cval=cval,
                     prefilter=prefilter,
+                    mask=mask,
+                    vsm=vol_distortions[volid][0],
                 ),
                 semaphore,
             )
@@ -439,7 +1307,10 @@ def resample_series(
     mode: str = 'constant',
     cval: float = 0.0,
     prefilter: bool = True,
+    mask: np.ndarray | None = None,
+    distortions: dict | None = None,
     nthreads: int = 1,
+    backend: str = 'threads',
 ) -> np.ndarray:
     """Resample a 4D time series at specified coordinates
 
@@ -478,8 +1349,17 @@ def resample_series(
         Value to fill past edges of ``data`` if ``mode`` is ``'constant'``.
     prefilter
         Determines if ``data`` is pre-filtered before interpolation.
+    mask
+        A boolean array with the shape of the target array. If provided, only
+        the coordinates inside the mask are sampled.
+    distortions
+        A cache of voxel shift and Jacobian maps. See :func:`resample_series_async`.
     nthreads
-        Number of threads to use for parallel resampling
+        Number of threads (or processes) to use for parallel resampling
+    backend
+        ``'threads'`` resamples volumes in a thread pool. ``'processes'``
+        resamples volumes in a process pool, sharing the input and output
+        arrays through shared memory. See :func:`resample_series_processes`.
 
     Returns
     -------
@@ -487,8 +1367,8 @@ def resample_series(
         The resampled array, with shape ``coordinates.shape[1:] + (N,)``,
         where N is the number of volumes in ``data``.
     """
-    return asyncio.run(
-        resample_series_async(
+    if backend == 'processes' and data.ndim == 4 and nthreads > 1:
+        return resample_series_processes(
             data=data,
             coordinates=coordinates,
             pe_info=pe_info,
@@ -500,13 +1380,324 @@ def resample_series(
             mode=mode,
             cval=cval,
             prefilter=prefilter,
-            max_concurrent=nthreads,
+            mask=mask,
+            distortions=distortions,
+            nprocs=nthreads,
         )
-    )
-
 
-def resample_image(
-    source: nb.Nifti1Image,
+    return asyncio.run(
+        resample_series_async(
+            data=data,
+            coordinates=coordinates,
+            pe_info=pe_info,
+            jacobian=jacobian,
+            hmc_xfms=hmc_xfms,
+            fmap_hz=fmap_hz,
+            output_dtype=output_dtype,
+            order=order,
+            mode=mode,
+            cval=cval,
+            prefilter=prefilter,
+            mask=mask,
+            distortions=distortions,
+            max_concurrent=nthreads,
+        )
+    )
+
+
+def resample_series_processes(
+    data: np.ndarray,
+    coordinates: np.ndarray,
+    pe_info: list[tuple[int, float]],
+    jacobian: bool,
+    hmc_xfms: list[np.ndarray] | None,
+    fmap_hz: np.ndarray,
+    output_dtype: np.dtype | None = None,
+    order: int = 3,
+    mode: str = 'constant',
+    cval: float = 0.0,
+    prefilter: bool = True,
+    mask: np.ndarray | None = None,
+    distortions: dict | None = None,
+    nprocs: int = 1,
+) -> np.ndarray:
+    """Resample a 4D time series at specified coordinates in a process pool
+
+    Equivalent to :func:`resample_series`, but volumes are resampled by worker
+    processes instead of threads.
+    The data block, coordinates, distortion maps and the Fortran-ordered output
+    array are placed in shared memory, so workers read their volume and write
+    their slice of the output in place, without pickling arrays.
+    This sidesteps the parts of :func:`scipy.ndimage.map_coordinates` that hold
+    the GIL, at the cost of spawning the pool and one copy of each array.
+
+    Parameters are as for :func:`resample_series`, with ``nprocs`` the number
+    of worker processes.
+
+    Returns
+    -------
+    resampled_array
+        The resampled array, with shape ``coordinates.shape[1:] + (N,)``,
+        where N is the number of volumes in ``data``.
+    """
+    if distortions is None:
+        distortions = {}
+    readouts = list(dict.fromkeys(tuple(pe) for pe in pe_info))
+    for readout in readouts:
+        if readout not in distortions:
+            distortions[readout] = distortion_maps(fmap_hz, readout, jacobian)
+
+    out_shape = coordinates.shape[1:] + data.shape[-1:]
+    out_dtype = np.dtype(output_dtype or data.dtype)
+
+    with ExitStack() as stack:
+        specs = {
+            # Order F ensures individual volumes are contiguous in memory
+            'data': _share_array(stack, data, order='F'),
+            'coordinates': _share_array(stack, coordinates),
+            'vsms': _share_array(stack, np.stack([distortions[ro][0] for ro in readouts])),
+            'out': _share_array(stack, np.zeros(out_shape, dtype=out_dtype), order='F'),
+        }
+        if jacobian:
+            specs['jacobians'] = _share_array(
+                stack, np.stack([distortions[ro][1] for ro in readouts])
+            )
+        if mask is not None:
+            specs['mask'] = _share_array(stack, mask)
+
+        kwargs = {'order': order, 'mode': mode, 'cval': cval, 'prefilter': prefilter}
+        with ProcessPoolExecutor(
+            max_workers=nprocs,
+            initializer=_attach_shared_arrays,
+            initargs=(specs,),
+        ) as executor:
+            # Consume the iterator to raise any errors from workers
+            list(
+                executor.map(
+                    partial(_resample_shared_vol, **kwargs),
+                    range(data.shape[-1]),
+                    [pe_info[volid] for volid in range(data.shape[-1])],
+                    [readouts.index(tuple(pe)) for pe in pe_info],
+                    hmc_xfms or [None] * data.shape[-1],
+                    chunksize=max(data.shape[-1] // (4 * nprocs), 1),
+                )
+            )
+
+        return np.array(_attach_array(stack, *specs['out']), order='F')
+
+
+# Arrays in shared memory, attached once per worker process
+_SHARED_ARRAYS: dict[str, np.ndarray] = {}
+_SHARED_BLOCKS: list[SharedMemory] = []
+
+
+def _share_array(stack: ExitStack, array: np.ndarray, order: str = 'C') -> tuple:
+    """Copy ``array`` into a new shared memory block, released when ``stack`` closes
+
+    Returns the arguments for :func:`_attach_array` to map the block in any process.
+    """
+    shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+    stack.callback(shm.unlink)
+    stack.callback(shm.close)
+    spec = (shm.name, array.shape, array.dtype.str, order)
+    # Do not hold a view once the copy is done, or the block cannot be closed
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, order=order)[...] = array
+    return spec
+
+
+def _attach_array(
+    stack: ExitStack | None, name: str, shape: tuple, dtype: str, order: str
+) -> np.ndarray:
+    """Map the shared memory block ``name`` as an array"""
+    shm = SharedMemory(name=name)
+    if stack is not None:
+        stack.callback(shm.close)
+    else:
+        # Keep the block mapped for the lifetime of the worker
+        _SHARED_BLOCKS.append(shm)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf, order=order)
+
+
+def _attach_shared_arrays(specs: dict[str, tuple]) -> None:
+    """Process pool initializer for :func:`resample_series_processes`"""
+    _SHARED_ARRAYS.update({key: _attach_array(None, *spec) for key, spec in specs.items()})
+
+
+def _resample_shared_vol(
+    volid: int,
+    pe_info: tuple[int, float],
+    readout_idx: int,
+    hmc_xfm: np.ndarray | None,
+    **kwargs,
+) -> None:
+    """Resample volume ``volid`` of the shared data block into the shared output"""
+    jacobians = _SHARED_ARRAYS.get('jacobians')
+    resample_vol(
+        _SHARED_ARRAYS['data'][..., volid],
+        _SHARED_ARRAYS['coordinates'],
+        pe_info,
+        None if jacobians is None else jacobians[readout_idx],
+        hmc_xfm,
+        None,
+        output=_SHARED_ARRAYS['out'][..., volid],
+        mask=_SHARED_ARRAYS.get('mask'),
+        vsm=_SHARED_ARRAYS['vsms'][readout_idx],
+        **kwargs,
+    )
+
+
+def distortion_maps(
+    fmap_hz: np.ndarray,
+    pe_info: tuple[int, float],
+    jacobian: bool,
+) -> tuple[np.ndarray, np.ndarray | None]:
+    """Calculate the voxel shift map and Jacobian determinant for a readout vector
+
+    Parameters
+    ----------
+    fmap_hz
+        The fieldmap, sampled to the target space, in Hz
+    pe_info
+        The readout vector in the form of (axis, signed-readout-time).
+        See :func:`resample_vol`.
+    jacobian
+        Whether to calculate the Jacobian determinant map.
+
+    Returns
+    -------
+    vsm
+        The displacement along ``pe_info[0]`` of each target voxel, in voxels.
+    jacobian_map
+        The Jacobian determinant of the displacement, or :obj:`None` if
+        ``jacobian`` is false.
+    """
+    vsm = fmap_hz * pe_info[1]
+    return vsm, (1 + np.gradient(vsm, axis=pe_info[0]) if jacobian else None)
+
+
+def resample_vol_affine(
+    data: np.ndarray,
+    vox2vox: np.ndarray,
+    hmc_xfm: np.ndarray | None,
+    output_shape: tuple[int, int, int],
+    output: np.dtype | np.ndarray | None = None,
+    order: int = 3,
+    mode: str = 'constant',
+    cval: float = 0.0,
+    prefilter: bool = True,
+) -> np.ndarray:
+    """Resample a volume through an affine mapping of voxel coordinates
+
+    This is equivalent to :func:`resample_vol` without susceptibility-distortion
+    correction, for targets related to the source by a linear transform.
+    The mapping is applied by :func:`scipy.ndimage.affine_transform`, so no
+    coordinate array is allocated.
+
+    Parameters
+    ----------
+    data
+        The data array to resample
+    vox2vox
+        Affine mapping voxel coordinates in the target space to voxel
+        coordinates in the BOLD reference space.
+    hmc_xfm
+        Affine transformation accounting for head motion from the individual
+        volume into the BOLD reference space. This affine must be in VOX2VOX
+        form.
+    output_shape
+        The shape of the target array.
+    output
+        The dtype or a pre-allocated array for sampling into the target space.
+        If pre-allocated, ``output.shape == output_shape``.
+    order
+        Order of interpolation (default: 3 = cubic)
+    mode
+        How ``data`` is extended beyond its boundaries. See
+        :func:`scipy.ndimage.map_coordinates` for more details.
+    cval
+        Value to fill past edges of ``data`` if ``mode`` is ``'constant'``.
+    prefilter
+        Determines if ``data`` is pre-filtered before interpolation.
+
+    Returns
+    -------
+    resampled_array
+        The resampled array, with shape ``output_shape``.
+    """
+    matrix = vox2vox if hmc_xfm is None else hmc_xfm @ vox2vox
+    return ndi.affine_transform(
+        data,
+        matrix,
+        output_shape=output_shape,
+        output=output,
+        order=order,
+        mode=mode,
+        cval=cval,
+        prefilter=prefilter,
+    )
+
+
+def resample_series_affine(
+    data: np.ndarray,
+    vox2vox: np.ndarray,
+    hmc_xfms: list[np.ndarray] | None,
+    output_shape: tuple[int, int, int],
+    output_dtype: np.dtype | None = None,
+    order: int = 3,
+    mode: str = 'constant',
+    cval: float = 0.0,
+    prefilter: bool = True,
+    nthreads: int = 1,
+) -> np.ndarray:
+    """Resample a 4D time series through an affine mapping of voxel coordinates
+
+    See :func:`resample_vol_affine` and :func:`resample_series`.
+
+    Returns
+    -------
+    resampled_array
+        The resampled array, with shape ``output_shape + (N,)``,
+        where N is the number of volumes in ``data``.
+    """
+    resample = partial(
+        resample_vol_affine,
+        vox2vox=vox2vox,
+        output_shape=output_shape,
+        order=order,
+        mode=mode,
+        cval=cval,
+        prefilter=prefilter,
+    )
+    if data.ndim == 3:
+        return resample(data, hmc_xfm=hmc_xfms[0] if hmc_xfms else None, output=output_dtype)
+
+    # Order F ensures individual volumes are contiguous in memory
+    # Also matches NIfTI, making final save more efficient
+    out_array = np.zeros(output_shape + data.shape[-1:], dtype=output_dtype, order='F')
+
+    async def _resample_volumes():
+        semaphore = asyncio.Semaphore(nthreads)
+        await asyncio.gather(
+            *(
+                worker(
+                    partial(
+                        resample,
+                        volume,
+                        hmc_xfm=hmc_xfms[volid] if hmc_xfms else None,
+                        output=out_array[..., volid],
+                    ),
+                    semaphore,
+                )
+                for volid, volume in enumerate(np.rollaxis(data, -1, 0))
+            )
+        )
+
+    asyncio.run(_resample_volumes())
+    return out_array
+
+
+def resample_image(
+    source: nb.Nifti1Image,
     target: nb.Nifti1Image,
     transforms: nt.TransformChain,
     fieldmap: nb.Nifti1Image | None,
@@ -518,6 +1709,14 @@ def resample_image(
     mode: str = 'constant',
     cval: float = 0.0,
     prefilter: bool = True,
+    backend: str = 'threads',
+    slab_mem_gb: float | None = None,
+    coords_cache_dir: str | os.PathLike | None = None,
+    target_mask: nb.Nifti1Image | None = None,
+    mask_dilation: int = 0,
+    max_volumes: int | None = None,
+    out_file: str | os.PathLike | None = None,
+    compresslevel: int | None = None,
 ) -> nb.Nifti1Image:
     """Resample a 3- or 4D image into a target space, applying head-motion
     and susceptibility-distortion correction simultaneously.
@@ -551,11 +1750,585 @@ def resample_image(
         Value to fill past edges of ``data`` if ``mode`` is ``'constant'``.
     prefilter
         Determines if ``data`` is pre-filtered before interpolation.
+    backend
+        Parallelize over ``'threads'`` or ``'processes'``. See :func:`resample_series`.
+        Series resampled with a single affine per volume always use threads.
+    slab_mem_gb
+        If provided, the target grid is split into slabs along its third axis,
+        so that the mapped coordinates and distortion maps of each slab fit
+        this budget (in GB), and slabs are resampled one after another.
+        Peak memory then scales with the slab rather than the full target grid.
+        Combined with ``max_volumes``, coordinates are mapped again for every
+        block of volumes.
+    coords_cache_dir
+        If provided, the target grid mapped through the nonlinear transforms of
+        ``transforms`` is cached in this directory, and reused by later calls.
+        The directory must be specific to those transforms.
+        See :func:`map_target_coordinates`.
+    target_mask
+        If provided, only the voxels of ``target`` inside this mask are resampled,
+        and the rest are set to ``cval``. The mask is projected onto the grid of
+        ``target`` if necessary.
+    mask_dilation
+        Number of voxels to dilate ``target_mask`` by before resampling.
+    max_volumes
+        Maximum number of volumes to read from ``source`` and resample at a time.
+        If :obj:`None`, the full series is loaded at once.
+    out_file
+        If provided, the resampled series is written to this path as it is
+        produced, and the returned image is loaded from it. Combined with
+        ``max_volumes``, peak memory is bounded by the window size instead of
+        the length of the series.
+    compresslevel
+        gzip compression level of ``out_file``, if gzipped. If :obj:`None`,
+        nibabel's default is used.
+
+    Returns
+    -------
+    resampled_bold
+        The BOLD series resampled into the target space
+    """
+    resample = _series_resampler(
+        source,
+        target,
+        transforms,
+        fieldmap,
+        pe_info,
+        target_mask=target_mask,
+        mask_dilation=mask_dilation,
+        jacobian=jacobian,
+        output_dtype=output_dtype,
+        nthreads=nthreads,
+        order=order,
+        mode=mode,
+        cval=cval,
+        prefilter=prefilter,
+        backend=backend,
+        slab_mem_gb=slab_mem_gb,
+        coords_cache_dir=coords_cache_dir,
+    )
+    resampled_chunks = (
+        resample(data, volumes) for volumes, data in iter_volumes(source, max_volumes)
+    )
+
+    resampled_img = _resampled_template(source, target, output_dtype)
+    out_shape = resampled_img.shape
+
+    if out_file is not None:
+        write_series(
+            resampled_img,
+            out_file,
+            resampled_chunks,
+            nthreads=nthreads,
+            compresslevel=compresslevel,
+        )
+        return nb.load(out_file)
+
+    if source.ndim < 4 or not max_volumes or max_volumes >= source.shape[3]:
+        resampled_data = next(resampled_chunks)
+    else:
+        # Order F ensures individual volumes are contiguous in memory
+        resampled_data = np.zeros(out_shape, dtype=output_dtype, order='F')
+        start = 0
+        for chunk in resampled_chunks:
+            resampled_data[..., start : start + chunk.shape[-1]] = chunk
+            start += chunk.shape[-1]
+
+    return resampled_img.__class__(resampled_data, resampled_img.affine, resampled_img.header)
+
+
+def resample_image_multi(
+    source: nb.Nifti1Image,
+    targets: list[nb.Nifti1Image],
+    transforms: list[nt.TransformChain],
+    fieldmaps: list[nb.Nifti1Image | None] | None,
+    pe_info: list[tuple[int, float]] | None,
+    out_files: list[str | os.PathLike],
+    jacobian: bool = True,
+    nthreads: int = 1,
+    output_dtype: np.dtype | str | None = 'f4',
+    order: int = 3,
+    mode: str = 'constant',
+    cval: float = 0.0,
+    prefilter: bool = True,
+    backend: str = 'threads',
+    slab_mem_gb: float | None = None,
+    coords_cache_dirs: list[str | os.PathLike | None] | None = None,
+    target_masks: list[nb.Nifti1Image | None] | None = None,
+    mask_dilation: int = 0,
+    max_volumes: int | None = None,
+    compresslevel: int | None = None,
+) -> list[nb.Nifti1Image]:
+    """Resample a 3- or 4D image into several target spaces in a single pass
+
+    Each block of volumes is read from ``source`` once and resampled into every
+    target before the next block is read, so the cost of reading and decompressing
+    the series is shared by all targets.
+    The resampled series are written to ``out_files`` as they are produced.
+
+    Parameters
+    ----------
+    source
+        The 3D bold image or 4D bold series to resample.
+    targets
+        Images sampled in each of the target spaces.
+    transforms
+        A nitransforms TransformChain for each target, mapping images from
+        the individual BOLD volume space into that target space.
+    fieldmaps
+        The fieldmap, in Hz, sampled in each of the target spaces.
+        If :obj:`None`, no susceptibility distortion correction is applied.
+    pe_info
+        A list of readout vectors in the form of (axis, signed-readout-time),
+        shared by all targets. See :func:`resample_image`.
+    out_files
+        The paths to write each resampled series to.
+    coords_cache_dirs
+        If provided, a cache directory specific to the nonlinear transforms of each
+        target. See :func:`resample_image`.
+    target_masks
+        If provided, only the voxels inside the mask of each target are resampled.
+
+    The remaining parameters are shared by all targets and have the same
+    meaning as in :func:`resample_image`.
+
+    Returns
+    -------
+    resampled_bold
+        The BOLD series resampled into each target space, loaded from ``out_files``.
+    """
+    if not (len(targets) == len(transforms) == len(out_files)):
+        raise ValueError('Mismatched number of targets, transforms and output files')
+    if fieldmaps is None:
+        fieldmaps = [None] * len(targets)
+    elif len(fieldmaps) != len(targets):
+        raise ValueError('Mismatched number of targets and fieldmaps')
+    if target_masks is None:
+        target_masks = [None] * len(targets)
+    elif len(target_masks) != len(targets):
+        raise ValueError('Mismatched number of targets and masks')
+    if coords_cache_dirs is None:
+        coords_cache_dirs = [None] * len(targets)
+    elif len(coords_cache_dirs) != len(targets):
+        raise ValueError('Mismatched number of targets and cache directories')
+    resamplers = [
+        _series_resampler(
+            source,
+            target,
+            xfm,
+            fieldmap,
+            pe_info,
+            target_mask=target_mask,
+            mask_dilation=mask_dilation,
+            jacobian=jacobian,
+            output_dtype=output_dtype,
+            nthreads=nthreads,
+            order=order,
+            mode=mode,
+            cval=cval,
+            prefilter=prefilter,
+            backend=backend,
+            slab_mem_gb=slab_mem_gb,
+            coords_cache_dir=coords_cache_dir,
+        )
+        for target, xfm, fieldmap, target_mask, coords_cache_dir in zip(
+            targets, transforms, fieldmaps, target_masks, coords_cache_dirs, strict=True
+        )
+    ]
+
+    with ExitStack() as stack:
+        writers = [
+            stack.enter_context(
+                open_series(
+                    _resampled_template(source, target, output_dtype),
+                    fname,
+                    nthreads=nthreads,
+                    compresslevel=compresslevel,
+                )
+            )
+            for target, fname in zip(targets, out_files, strict=True)
+        ]
+        for volumes, data in iter_volumes(source, max_volumes):
+            for write, resample in zip(writers, resamplers, strict=True):
+                write(resample(data, volumes))
+
+    return [nb.load(fname) for fname in out_files]
+
+
+def _series_resampler(
+    source: nb.Nifti1Image,
+    target: nb.Nifti1Image,
+    transforms: nt.TransformChain,
+    fieldmap: nb.Nifti1Image | None,
+    pe_info: list[tuple[int, float]] | None,
+    target_mask: nb.Nifti1Image | None = None,
+    mask_dilation: int = 0,
+    slab_mem_gb: float | None = None,
+    coords_cache_dir: str | os.PathLike | None = None,
+    **kwargs,
+) -> ty.Callable[[np.ndarray, slice], np.ndarray]:
+    """Prepare a function that resamples blocks of volumes of ``source`` into ``target``
+
+    The returned function takes a data block and the slice of the series it
+    contains, as yielded by :func:`iter_volumes`.
+    Remaining keyword arguments are passed to :func:`resample_series` or
+    :func:`resample_series_affine`.
+    """
+    if slab_mem_gb:
+        nplanes = _slab_planes(target.shape[:3], slab_mem_gb, kwargs.get('nthreads', 1))
+        if nplanes < target.shape[2]:
+            return _slab_resampler(
+                source,
+                target,
+                transforms,
+                fieldmap,
+                pe_info,
+                target_mask,
+                mask_dilation,
+                nplanes,
+                coords_cache_dir=coords_cache_dir,
+                **kwargs,
+            )
+
+    if fieldmap is None and target_mask is None:
+        # Without distortions, linear chains collapse into one VOX2VOX matrix per volume
+        vox2vox, hmc_xfms = map_target_affine(source, target, transforms)
+        if vox2vox is not None:
+            kwargs.pop('jacobian', None)
+            kwargs.pop('backend', None)
+            resample = partial(
+                resample_series_affine,
+                vox2vox=vox2vox,
+                output_shape=target.shape[:3],
+                **kwargs,
+            )
+            return lambda data, volumes: resample(data=data, hmc_xfms=hmc_xfms[volumes])
+
+    coordinates, hmc_xfms = map_target_coordinates(
+        source, target, transforms, cache_dir=coords_cache_dir
+    )
+    mask = None if target_mask is None else load_target_mask(target_mask, target, mask_dilation)
+
+    # Some identities to reduce special casing downstream
+    if fieldmap is None:
+        fieldmap = nb.Nifti1Image(np.zeros(target.shape[:3], dtype='f4'), target.affine)
+    if pe_info is None:
+        pe_info = [[0, 0] for _ in range(source.shape[-1])]
+
+    resample = partial(
+        resample_series,
+        coordinates=coordinates,
+        fmap_hz=fieldmap.get_fdata(dtype='f4'),
+        mask=mask,
+        # Shared by all blocks of volumes, so the maps are only computed once per run
+        distortions={},
+        **kwargs,
+    )
+    return lambda data, volumes: resample(
+        data=data,
+        pe_info=pe_info[volumes],
+        hmc_xfms=hmc_xfms[volumes],
+    )
+
+
+def _slab_resampler(
+    source: nb.Nifti1Image,
+    target: nb.Nifti1Image,
+    transforms: nt.TransformChain,
+    fieldmap: nb.Nifti1Image | None,
+    pe_info: list[tuple[int, float]] | None,
+    target_mask: nb.Nifti1Image | None,
+    mask_dilation: int,
+    nplanes: int,
+    coords_cache_dir: str | os.PathLike | None = None,
+    **kwargs,
+) -> ty.Callable[[np.ndarray, slice], np.ndarray]:
+    """Prepare a function that resamples blocks of volumes slab by slab
+
+    The target grid is split into slabs of ``nplanes`` along its third axis.
+    Coordinates are only mapped for one slab at a time, and discarded once the
+    slab is resampled. See :func:`_series_resampler`.
+    """
+    # Project and dilate the mask on the full grid, so slab edges do not matter
+    mask = None if target_mask is None else load_target_mask(target_mask, target, mask_dilation)
+    nz = target.shape[2]
+
+    def resample(data: np.ndarray, volumes: slice) -> np.ndarray:
+        out = np.zeros(
+            target.shape[:3] + data.shape[3:], dtype=kwargs.get('output_dtype'), order='F'
+        )
+        for start in range(0, nz, nplanes):
+            stop = min(start + nplanes, nz)
+            # One plane of margin on each side keeps the Jacobian (a gradient
+            # of the voxel shift map) identical to that of the full grid
+            lo, hi = max(start - 1, 0), min(stop + 1, nz)
+            slab = target.slicer[:, :, lo:hi]
+            slab_resample = _series_resampler(
+                source,
+                slab,
+                transforms,
+                None if fieldmap is None else fieldmap.slicer[:, :, lo:hi],
+                pe_info,
+                target_mask=(
+                    None
+                    if mask is None
+                    else nb.Nifti1Image(mask[:, :, lo:hi].astype('u1'), slab.affine)
+                ),
+                coords_cache_dir=coords_cache_dir,
+                **kwargs,
+            )
+            out[:, :, start:stop] = slab_resample(data, volumes)[:, :, start - lo : stop - lo]
+        return out
+
+    return resample
+
+
+def _slab_planes(shape: tuple[int, int, int], mem_gb: float, nthreads: int = 1) -> int:
+    """Number of planes along the third axis of a target grid that fit a memory budget"""
+    # Per voxel: mapped coordinates, a head-motion corrected copy for each
+    # concurrent volume, and the fieldmap, voxel shift and Jacobian maps
+    voxel_bytes = 3 * 8 * (1 + nthreads) + 3 * 4
+    plane_gb = voxel_bytes * shape[0] * shape[1] / 1024**3
+    return max(int(mem_gb // plane_gb), 1)
+
+
+def map_target_affine(
+    source: nb.Nifti1Image,
+    target: nb.Nifti1Image,
+    transforms: nt.TransformChain,
+) -> tuple[np.ndarray | None, list[np.ndarray]]:
+    """Collapse the mapping from target voxels to source voxels into an affine
+
+    Parameters
+    ----------
+    source
+        The 3D bold image or 4D bold series to resample.
+    target
+        An image sampled in the target space.
+    transforms
+        A nitransforms TransformChain that maps images from the individual
+        BOLD volume space into the target space. Head-motion transforms,
+        if any, must come last.
+
+    Returns
+    -------
+    vox2vox
+        The affine mapping voxel coordinates in ``target`` to voxel coordinates
+        in ``source``, before head-motion correction, or :obj:`None` if
+        ``transforms`` include nonlinear components.
+    hmc_xfms
+        The head-motion transforms of each volume, in VOX2VOX form.
+    """
+    transform_list, hmc_xfms = _split_hmc(source, transforms)
+
+    ras2vox = np.linalg.inv(source.affine)
+    ref2vox = as_affine(nt.TransformChain(transform_list + [nt.Affine(ras2vox)]))
+    if ref2vox is None:
+        return None, hmc_xfms
+
+    return ref2vox.matrix @ target.affine, hmc_xfms
+
+
+def map_target_coordinates(
+    source: nb.Nifti1Image,
+    target: nb.Nifti1Image,
+    transforms: nt.TransformChain,
+    cache_dir: str | os.PathLike | None = None,
+) -> tuple[np.ndarray, list[np.ndarray]]:
+    """Map the voxels of a target image into the voxel space of a source series
+
+    Parameters
+    ----------
+    source
+        The 3D bold image or 4D bold series to resample.
+    target
+        An image sampled in the target space.
+    transforms
+        A nitransforms TransformChain that maps images from the individual
+        BOLD volume space into the target space. Head-motion transforms,
+        if any, must come last.
+    cache_dir
+        A directory specific to the nonlinear transforms in ``transforms``.
+        The coordinates of ``target`` mapped through the chain up to its last
+        nonlinear transform are stored there as a memory-mapped array on the first
+        call, so further calls with the same target grid (for instance, other runs
+        of the same subject) only apply the remaining affine transforms.
+
+    Returns
+    -------
+    coordinates
+        The voxel coordinates in ``source`` of each voxel of ``target``,
+        before head-motion correction, with shape ``(3, *target.shape[:3])``.
+    hmc_xfms
+        The head-motion transforms of each volume, in VOX2VOX form.
+    """
+    transform_list, hmc_xfms = _split_hmc(source, transforms)
+
+    # Retrieve the RAS coordinates of the target space
+    coordinates = nt.base.SpatialReference.factory(target).ndcoords.astype('f4')
+
+    # We will operate in voxel space, so get the source affine
+    ras2vox = np.linalg.inv(source.affine)
+
+    nonlinear = [idx for idx, xfm in enumerate(transform_list) if as_affine(xfm) is None]
+    if cache_dir is not None and nonlinear:
+        # The target grid mapped through the nonlinear part of the chain does not depend
+        # on the source, so it is computed once and only the linear remainder is applied
+        split = nonlinear[-1] + 1
+        coordinates = _cached_coordinates(
+            cache_dir, target, nt.TransformChain(transform_list[:split]), coordinates
+        )
+        transform_list = transform_list[split:]
+
+    # After removing the head-motion transforms, add a mapping from boldref
+    # world space to voxels. This new transform maps from world coordinates
+    # in the target space to voxel coordinates in the source space.
+    ref2vox = nt.TransformChain(transform_list + [nt.Affine(ras2vox)])
+    mapped_coordinates = ref2vox.map(coordinates)
+
+    return mapped_coordinates.T.reshape((3, *target.shape[:3])), hmc_xfms
+
+
+def _cached_coordinates(
+    cache_dir: str | os.PathLike,
+    target: nb.Nifti1Image,
+    transform: nt.base.TransformBase,
+    coordinates: np.ndarray,
+) -> np.ndarray:
+    """Map ``coordinates`` of ``target`` through ``transform``, caching the result
+
+    The cache entry is keyed by the grid of ``target``, and ``cache_dir`` must
+    be specific to ``transform``. Entries are written atomically, so concurrent
+    processes may share the cache.
+    """
+    cache_file = Path(cache_dir) / f'coords_{hashlib.sha256(_grid_bytes(target)).hexdigest()}.npy'
+    if not cache_file.exists():
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f'.{os.getpid()}.npy')
+        np.save(tmp_file, np.asarray(transform.map(coordinates), dtype='f4'))
+        os.replace(tmp_file, cache_file)
+    return np.load(cache_file, mmap_mode='r')
+
+
+def _grid_bytes(img: nb.spatialimages.SpatialImage) -> bytes:
+    """Serialize the grid (shape and affine) of an image, regardless of its contents"""
+    return np.concatenate((img.shape[:3], img.affine.ravel())).astype('f8').tobytes()
+
+
+def _fieldmap_cache_key(
+    in_files: list[str],
+    target: nb.spatialimages.SpatialImage,
+    xfm_paths: list[str],
+    inverse: list[bool],
+) -> str:
+    """Identify a reconstructed fieldmap by its inputs
+
+    Files are hashed by content, rather than by path, so that copies of the same
+    coefficients or transforms (e.g., in the working and output directories)
+    share cache entries.
+    """
+    if len(inverse) == 1:
+        inverse = list(inverse) * len(xfm_paths)
+
+    digest = hashlib.sha256(_grid_bytes(target))
+    for fname in [*in_files, *xfm_paths]:
+        digest.update(_file_digest(fname))
+    digest.update(str([bool(inv) for inv in inverse]).encode())
+    return digest.hexdigest()
+
+
+def _ribbon_cache_key(
+    surface_files: list[str],
+    target: nb.spatialimages.SpatialImage,
+    subdiv: int,
+) -> str:
+    """Identify ribbon-constrained sampling weights by their inputs"""
+    digest = hashlib.sha256(_grid_bytes(target))
+    for fname in surface_files:
+        digest.update(_file_digest(fname))
+    digest.update(f'subdiv-{subdiv}'.encode())
+    return digest.hexdigest()
+
+
+def _metric_resample_cache_key(input_files: list[str]) -> str:
+    """Identify ADAP_BARY_AREA resampling weights by their input surfaces and ROI"""
+    digest = hashlib.sha256(b'ADAP_BARY_AREA')
+    for fname in input_files:
+        digest.update(_file_digest(fname))
+    return digest.hexdigest()
+
+
+def _file_digest(fname: str | os.PathLike) -> bytes:
+    """SHA-256 digest of the contents of a file"""
+    file_digest = hashlib.sha256()
+    with open(fname, 'rb') as fobj:
+        while chunk := fobj.read(1 << 20):
+            file_digest.update(chunk)
+    return file_digest.digest()
+
+
+def _coords_cache_dir(
+    cache_dir: str | os.PathLike | None,
+    xfm_paths: list[str],
+    inverse: list[bool],
+) -> Path | None:
+    """Subdirectory of ``cache_dir`` for the nonlinear transforms in ``xfm_paths``
+
+    :func:`~fmriprep.utils.transforms.load_transforms` composes ``xfm_paths``
+    in reverse, so the files from the first nonlinear (``.h5``) transform onwards
+    determine the nonlinear part of the chain.
+    Returns :obj:`None` if caching is disabled or all transforms are linear.
+    """
+    if not cache_dir:
+        return None
+    nonlinear = [idx for idx, path in enumerate(xfm_paths) if str(path).endswith('.h5')]
+    if not nonlinear:
+        return None
+    if len(inverse) == 1:
+        inverse = inverse * len(xfm_paths)
+    first = nonlinear[0]
+    return Path(cache_dir) / fingerprint_transforms(xfm_paths[first:], inverse[first:])
+
+
+def load_target_mask(
+    mask_img: nb.Nifti1Image,
+    target: nb.Nifti1Image,
+    dilation: int = 0,
+) -> np.ndarray:
+    """Sample a mask on the grid of a target image
+
+    Parameters
+    ----------
+    mask_img
+        A binary mask, in the space of ``target``.
+        It is resampled with nearest-neighbor interpolation if it is not
+        defined on the same grid as ``target``.
+    target
+        An image sampled in the target space.
+    dilation
+        Number of voxels to dilate the mask by.
 
     Returns
     -------
-    resampled_bold
-        The BOLD series resampled into the target space
+    mask
+        A boolean array with the shape of ``target``.
+    """
+    if mask_img.shape[:3] != target.shape[:3] or not np.allclose(mask_img.affine, target.affine):
+        mask_img = nt.resampling.apply(nt.Affine(), mask_img, reference=target, order=0)
+    mask = np.asanyarray(mask_img.dataobj).reshape(target.shape[:3]) > 0
+    if dilation:
+        mask = ndi.binary_dilation(mask, iterations=dilation)
+    return mask
+
+
+def _split_hmc(
+    source: nb.Nifti1Image,
+    transforms: nt.TransformChain,
+) -> tuple[list[nt.base.TransformBase], list[np.ndarray]]:
+    """Separate head-motion transforms from a transform chain
+
+    Returns the remaining transforms and the head-motion transforms of
+    each volume of ``source``, in VOX2VOX form.
     """
     if not isinstance(transforms, nt.TransformChain):
         transforms = nt.TransformChain([transforms])
@@ -568,49 +2341,280 @@ def resample_image(
         transform_list: list = transforms.transforms
         hmc = []
 
-    # Retrieve the RAS coordinates of the target space
-    coordinates = nt.base.SpatialReference.factory(target).ndcoords.astype('f4')
-
-    # We will operate in voxel space, so get the source affine
+    # Transform RAS2RAS head motion transforms to VOX2VOX
     vox2ras = source.affine
     ras2vox = np.linalg.inv(vox2ras)
-    # Transform RAS2RAS head motion transforms to VOX2VOX
-    hmc_xfms = [ras2vox @ xfm.matrix @ vox2ras for xfm in hmc]
-
-    # After removing the head-motion transforms, add a mapping from boldref
-    # world space to voxels. This new transform maps from world coordinates
-    # in the target space to voxel coordinates in the source space.
-    ref2vox = nt.TransformChain(transform_list + [nt.Affine(ras2vox)])
-    mapped_coordinates = ref2vox.map(coordinates)
+    return transform_list, [ras2vox @ xfm.matrix @ vox2ras for xfm in hmc]
 
-    # Some identities to reduce special casing downstream
-    if fieldmap is None:
-        fieldmap = nb.Nifti1Image(np.zeros(target.shape[:3], dtype='f4'), target.affine)
-    if pe_info is None:
-        pe_info = [[0, 0] for _ in range(source.shape[-1])]
 
-    resampled_data = resample_series(
-        data=source.get_fdata(dtype='f4'),
-        coordinates=mapped_coordinates.T.reshape((3, *target.shape[:3])),
-        pe_info=pe_info,
-        jacobian=jacobian,
-        hmc_xfms=hmc_xfms,
-        fmap_hz=fieldmap.get_fdata(dtype='f4'),
-        output_dtype=output_dtype,
-        nthreads=nthreads,
-        order=order,
-        mode=mode,
-        cval=cval,
-        prefilter=prefilter,
+def _resampled_template(
+    source: nb.Nifti1Image,
+    target: nb.Nifti1Image,
+    output_dtype: np.dtype | str | None,
+) -> nb.Nifti1Image:
+    """Create a data-less image describing ``source`` resampled into ``target``"""
+    out_shape = target.shape[:3] + source.shape[3:4]
+    resampled_img = nb.Nifti1Image(
+        np.broadcast_to(np.zeros((), dtype=output_dtype), out_shape),
+        target.affine,
+        target.header,
     )
-    resampled_img = nb.Nifti1Image(resampled_data, target.affine, target.header)
     resampled_img.set_data_dtype('f4')
     # Preserve zooms of additional dimensions
     resampled_img.header.set_zooms(target.header.get_zooms()[:3] + source.header.get_zooms()[3:])
-
     return resampled_img
 
 
+def iter_volumes(
+    img: nb.spatialimages.SpatialImage,
+    max_volumes: int | None = None,
+) -> ty.Iterator[tuple[slice, np.ndarray]]:
+    """Read a 3- or 4D image a bounded number of volumes at a time
+
+    Volumes are read through the image's ``dataobj``, so uncompressed and
+    indexed-gzip NIfTI files are never loaded in full.
+
+    Parameters
+    ----------
+    img
+        The image to read.
+    max_volumes
+        Maximum number of volumes to return in each block.
+        If :obj:`None`, the full series is returned as a single block.
+
+    Yields
+    ------
+    volumes
+        The slice of the series contained in ``data``.
+    data
+        A float32 array with the spatial shape of ``img``. For 4D images,
+        the last axis indexes the volumes selected by ``volumes``.
+    """
+    if img.ndim < 4:
+        yield slice(0, 1), img.get_fdata(dtype='f4')
+        return
+
+    nvols = img.shape[3]
+    step = max_volumes or nvols
+    for start in range(0, nvols, step):
+        volumes = slice(start, min(start + step, nvols))
+        yield volumes, np.asanyarray(img.dataobj[..., volumes]).astype('f4', copy=False)
+
+
+def write_series(
+    img: nb.Nifti1Image,
+    out_file: str | os.PathLike,
+    chunks: ty.Iterable[np.ndarray],
+    nthreads: int = 1,
+    compresslevel: int | None = None,
+) -> None:
+    """Write a NIfTI image whose data are produced progressively
+
+    The header and affine are taken from ``img``, which only needs to
+    describe the final shape and on-disk data type. The ``chunks`` are
+    written in order and must concatenate along the last axis to the
+    shape of ``img``. Uncompressed and gzipped files are supported,
+    the latter being compressed with ``nthreads`` threads at ``compresslevel``
+    (nibabel's default if :obj:`None`).
+    """
+    with open_series(img, out_file, nthreads=nthreads, compresslevel=compresslevel) as write:
+        for chunk in chunks:
+            write(chunk)
+
+
+@contextmanager
+def open_series(
+    img: nb.Nifti1Image,
+    out_file: str | os.PathLike,
+    nthreads: int = 1,
+    compresslevel: int | None = None,
+) -> ty.Iterator[ty.Callable[[np.ndarray], None]]:
+    """Open a NIfTI file for progressive writing
+
+    Writes the header of ``img`` and yields a function that appends a chunk of
+    data to the file. See :func:`write_series`.
+    """
+    img.update_header()
+    hdr = img.header
+    # Resampled data are floating point, so scaling must be dropped
+    hdr.set_slope_inter(None, None)
+    with open_nifti(out_file, nthreads, compresslevel) as fobj:
+        hdr.write_to(fobj)
+        seek_tell(fobj, hdr.get_data_offset(), write0=True)
+        yield partial(
+            array_to_file, out_dtype=hdr.get_data_dtype(), fileobj=fobj, offset=None, order='F'
+        )
+
+
+def spline_filter_series(
+    source: nb.Nifti1Image,
+    order: int = 3,
+    mode: str = 'grid-constant',
+    cval: float = 0.0,
+    max_volumes: int | None = None,
+    out_file: str | os.PathLike | None = None,
+) -> nb.Nifti1Image:
+    """Prefilter each volume of a 3- or 4D image for spline interpolation
+
+    Resampling the result with ``prefilter=False`` is equivalent to resampling
+    ``source`` with ``prefilter=True``, using the same ``order``, ``mode`` and
+    ``cval``. Each volume is filtered independently; the last axis of 4D images
+    is not filtered.
+
+    For modes whose boundary conditions :func:`scipy.ndimage.map_coordinates`
+    emulates by padding the input before filtering (``'nearest'`` and
+    ``'grid-constant'``), the coefficients are computed on the same padded grid,
+    and the affine is adjusted so that the coefficients remain aligned with
+    ``source`` in world coordinates.
+
+    Parameters
+    ----------
+    source
+        The 3D image or 4D series to prefilter.
+    order
+        Order of the spline (default: 3 = cubic).
+    mode
+        How ``source`` is extended beyond its boundaries. See
+        :func:`scipy.ndimage.map_coordinates` for more details.
+    cval
+        Value to fill past edges of ``source`` if ``mode`` is ``'grid-constant'``.
+    max_volumes
+        Maximum number of volumes to read from ``source`` and filter at a time.
+        If :obj:`None`, the full series is loaded at once.
+    out_file
+        If provided, the coefficients are written to this path as they are
+        produced, and the returned image is loaded from it.
+
+    Returns
+    -------
+    coefficients
+        The spline coefficients, as a float32 image aligned with ``source``.
+    """
+    npad = 12 if order > 1 and mode in ('nearest', 'grid-constant') else 0
+    pad_width = [(npad, npad)] * 3 + [(0, 0)] * (source.ndim - 3)
+    pad_kwargs = {'mode': 'edge'} if mode == 'nearest' else {'constant_values': cval}
+
+    def _filter(data: np.ndarray) -> np.ndarray:
+        if order < 2:
+            return data
+        # Filter the padded float32 window in place, so no float64 copy is held
+        coeffs = np.pad(data, pad_width, **pad_kwargs)
+        for axis in range(3):
+            ndi.spline_filter1d(coeffs, order, axis=axis, output=coeffs, mode=mode)
+        return coeffs
+
+    filtered_chunks = (_filter(data) for _, data in iter_volumes(source, max_volumes))
+
+    shift = np.eye(4)
+    shift[:3, 3] = -npad
+    coeffs_img = nb.Nifti1Image(
+        np.broadcast_to(
+            np.zeros((), dtype='f4'),
+            tuple(dim + 2 * npad for dim in source.shape[:3]) + source.shape[3:],
+        ),
+        source.affine @ shift,
+        source.header,
+    )
+    coeffs_img.set_data_dtype('f4')
+
+    if out_file is not None:
+        write_series(coeffs_img, out_file, filtered_chunks)
+        return nb.load(out_file)
+
+    coeffs = np.concatenate(list(filtered_chunks), axis=-1)
+    return coeffs_img.__class__(coeffs, coeffs_img.affine, coeffs_img.header)
+
+
+def _load_source(
+    in_file: str | os.PathLike,
+    pe_dir: str | None,
+    ro_time: float | None,
+) -> tuple[nb.Nifti1Image, list[tuple[int, float]] | None]:
+    """Load a BOLD series and derive the readout vectors of its volumes
+
+    If a phase-encoding direction and readout time are available, the image
+    is reoriented to have positive direction cosines, as nitransforms
+    displacements are positive.
+    """
+    source = nb.load(in_file)
+    if not (pe_dir and ro_time):
+        return source, None
+
+    nvols = source.shape[3] if source.ndim > 3 else 1
+    pe_axis = 'ijk'.index(pe_dir[0])
+    pe_flip = pe_dir.endswith('-')
+
+    # Nitransforms displacements are positive
+    source, axcodes = _ensure_positive_cosines(source)
+    axis_flip = axcodes[pe_axis] in 'LPI'
+
+    return source, [(pe_axis, -ro_time if (axis_flip ^ pe_flip) else ro_time)] * nvols
+
+
+class _FlippedArrayProxy:
+    """Array-like that flips the spatial axes of another array on access
+
+    Slicing is only supported along the fourth (volume) axis, which allows
+    reading a reoriented series one window of volumes at a time.
+    """
+
+    def __init__(self, dataobj, ornt: np.ndarray):
+        self._dataobj = dataobj
+        self._ornt = ornt
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        return self._dataobj.shape
+
+    @property
+    def ndim(self) -> int:
+        return len(self.shape)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dataobj.dtype
+
+    def __getitem__(self, slicer):
+        return nb.apply_orientation(np.asanyarray(self._dataobj[slicer]), self._ornt)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asanyarray(self[...], dtype=dtype)
+
+
+def _ensure_positive_cosines(
+    img: nb.Nifti1Image,
+) -> tuple[nb.Nifti1Image, tuple[str, str, str]]:
+    """Reorient axes polarity to have all positive direction cosines
+
+    Equivalent to :func:`sdcflows.utils.tools.ensure_positive_cosines`, except
+    that the data array is flipped lazily, preserving the ability to read a
+    subset of volumes without loading the full series.
+    """
+    in_ornt = nb.io_orientation(img.affine)
+    img_axcodes = nb.orientations.ornt2axcodes(in_ornt)
+    out_ornt = in_ornt.copy()
+    out_ornt[:, 1] = 1
+    ornt_xfm = nb.orientations.ornt_transform(in_ornt, out_ornt)
+
+    if np.all(ornt_xfm[:, 1] == 1):
+        return img, img_axcodes
+
+    new_aff = img.affine @ nb.orientations.inv_ornt_aff(ornt_xfm, img.shape)
+    reoriented = img.__class__(_FlippedArrayProxy(img.dataobj, ornt_xfm), new_aff, img.header)
+    return reoriented, img_axcodes
+
+
+def _reorient(
+    img: nb.spatialimages.SpatialImage,
+    axcodes: tuple[str, str, str],
+) -> nb.spatialimages.SpatialImage:
+    """Reorient the axes of an image to match ``axcodes``"""
+    ornt_xfm = nb.orientations.ornt_transform(
+        nb.io_orientation(img.affine), nb.orientations.axcodes2ornt(axcodes)
+    )
+    return img.as_reoriented(ornt_xfm)
+
+
 def aligned(aff1: np.ndarray, aff2: np.ndarray) -> bool:
     """Determine if two affines have aligned grids"""
     return np.allclose(
@@ -700,19 +2704,19 @@ def reconstruct_fieldmap(
             raise ValueError('Reference passed is not aligned with spline grids')
         reference, _ = ensure_positive_cosines(fmap_reference)
 
-    # Generate tensor-product B-Spline weights
-    colmat = sparse_hstack(
-        [grid_bspline_weights(reference, level) for level in coefficients]
-    ).tocsr()
-    coefficients = np.hstack(
-        [level.get_fdata(dtype='float32').reshape(-1) for level in coefficients]
-    )
-
-    # Reconstruct the fieldmap (in Hz) from coefficients
-    fmap_img = nb.Nifti1Image(
-        np.reshape(colmat @ coefficients, reference.shape[:3]),
-        reference.affine,
-    )
+    # Reconstruct the fieldmap (in Hz) from coefficients.
+    # The reference is aligned with the spline grids, so the tensor-product B-Spline
+    # weights are separable, and the field is evaluated by contracting the coefficients
+    # with the 1D weights along each axis in turn.
+    fmap_data = np.zeros(reference.shape[:3], dtype='float32')
+    for level in coefficients:
+        fmap_data += np.einsum(
+            'ai,bj,ck,ijk->abc',
+            *bspline_axis_weights(reference, level),
+            level.get_fdata(dtype='float32'),
+            optimize=True,
+        )
+    fmap_img = nb.Nifti1Image(fmap_data, reference.affine)
 
     if not direct:
         fmap_img = nt.resampling.apply(transforms, fmap_img, reference=target)
@@ -723,3 +2727,647 @@ def reconstruct_fieldmap(
     fmap_img.header['cal_min'] = -fmap_img.header['cal_max']
 
     return fmap_img
+
+
+def bspline_axis_weights(
+    target: nb.Nifti1Image,
+    ctrl: nb.Nifti1Image,
+    dtype: str = 'float32',
+) -> list[np.ndarray]:
+    """Evaluate cubic B-Spline weights along each axis of a grid
+
+    The grid of ``target`` must be aligned with the control points of ``ctrl``.
+    The tensor product of the returned matrices equals the weights calculated by
+    :func:`sdcflows.transform.grid_bspline_weights`, without building the
+    (voxels x knots) sparse matrix.
+
+    Parameters
+    ----------
+    target
+        An image whose voxels locate the samples.
+    ctrl
+        An image whose voxels locate the control points (knots) of the B-Spline grid.
+
+    Returns
+    -------
+    weights
+        One dense matrix per axis, of shape ``(target.shape[axis], ctrl.shape[axis])``.
+    """
+    target_to_grid = np.linalg.inv(ctrl.affine) @ target.affine
+    weights = []
+    for axis in range(3):
+        # Index of samples with respect to the knots, along the current axis
+        coords = np.zeros((3, target.shape[axis]), dtype=dtype)
+        coords[axis] = np.arange(target.shape[axis], dtype=dtype)
+        locs = nb.affines.apply_affine(target_to_grid, coords.T)[:, axis]
+
+        # Pad knots by 3 on each side so that all locations are fully covered by basis
+        knots = np.arange(-3, ctrl.shape[axis] + 3, dtype=dtype)
+        bspl = BSpline(knots, np.eye(len(knots) - 3 - 1), 3)
+
+        axis_weights = bspl(locs)[:, 1:-1].astype(dtype)
+        axis_weights[np.abs(locs[:, np.newaxis] - knots[np.newaxis, 3:-3]) >= 2.0] = 0
+        weights.append(axis_weights)
+    return weights
+
+
+def ribbon_weights(
+    inner: np.ndarray,
+    outer: np.ndarray,
+    triangles: np.ndarray,
+    target: nb.spatialimages.SpatialImage,
+    subdiv: int = 3,
+    max_points: int = 1 << 20,
+) -> 'scipy.sparse.csr_matrix':
+    """Voxel weights of each vertex for ribbon-constrained volume-to-surface mapping
+
+    Follows ``wb_command -volume-to-surface-mapping -ribbon-constrained``: each vertex
+    defines a polyhedron joining its triangles on the inner and outer surfaces, and
+    the weight of a voxel is the fraction of its ``subdiv**3`` subvoxel centers that
+    fall inside the polyhedron. Points are classified by ray casting against the
+    surface of the polyhedron, so polyhedra need not be convex.
+    As in Workbench, the quadrilateral sides of a polyhedron, which need not be
+    planar, are split into triangles along either diagonal, and points inside
+    only one of the two resulting polyhedra count as half inside.
+
+    Parameters
+    ----------
+    inner, outer
+        Vertex coordinates (in mm) of the inner and outer surfaces, which must share
+        the same topology.
+    triangles
+        Triangles of the surfaces.
+    target
+        An image whose grid (shape and affine) defines the voxels.
+    subdiv
+        Number of subdivisions of each voxel along each axis.
+    max_points
+        Maximum number of subvoxel points tested at a time, which bounds memory use.
+
+    Returns
+    -------
+    weights
+        A ``(vertices x voxels)`` sparse matrix of unnormalized weights. Voxels are
+        indexed by :func:`numpy.ravel_multi_index` on the spatial shape of ``target``.
+
+    """
+    import scipy.sparse as sp
+
+    shape = np.array(target.shape[:3])
+    ras2vox = np.linalg.inv(target.affine)
+    inner = nb.affines.apply_affine(ras2vox, np.asarray(inner, dtype='f8'))
+    outer = nb.affines.apply_affine(ras2vox, np.asarray(outer, dtype='f8'))
+    triangles = np.asarray(triangles, dtype=int)
+    nverts = inner.shape[0]
+
+    # Triangles incident to each vertex, rotated to start with that vertex
+    incident = np.concatenate([np.roll(triangles, -shift, axis=1) for shift in range(3)])
+    incident = incident[np.argsort(incident[:, 0], kind='stable')]
+    valence = np.bincount(incident[:, 0], minlength=nverts)
+    first = np.concatenate(([0], np.cumsum(valence)[:-1]))
+
+    offsets = (np.arange(subdiv) + 0.5) / subdiv - 0.5
+    offsets = np.stack(np.meshgrid(offsets, offsets, offsets, indexing='ij'), -1).reshape(-1, 3)
+
+    rows, cols, values = [], [], []
+    for nfaces in np.unique(valence[valence > 0]):
+        vertices = np.flatnonzero(valence == nfaces)
+        fans = incident[first[vertices, np.newaxis] + np.arange(nfaces)]
+        center, left, right = fans[..., 0], fans[..., 1], fans[..., 2]
+        # Surface of each polyhedron: the outer and inner fans, and the sides
+        # split along either diagonal (vertices, faces, 3 corners, 3 coordinates)
+        caps = np.concatenate(
+            [
+                np.stack((outer[center], outer[left], outer[right]), axis=-2),
+                np.stack((inner[center], inner[right], inner[left]), axis=-2),
+            ],
+            axis=1,
+        )
+        sides = [
+            np.concatenate(
+                [
+                    np.stack((outer[left], inner[left], inner[right]), axis=-2),
+                    np.stack((outer[left], inner[right], outer[right]), axis=-2),
+                ],
+                axis=1,
+            ),
+            np.concatenate(
+                [
+                    np.stack((outer[left], inner[left], outer[right]), axis=-2),
+                    np.stack((inner[left], inner[right], outer[right]), axis=-2),
+                ],
+                axis=1,
+            ),
+        ]
+
+        corners = caps.reshape(len(vertices), -1, 3)
+        lower, upper = corners.min(axis=1), corners.max(axis=1)
+        # Single precision, laid out for fast gathering by _crossings_parity
+        caps, *sides = (
+            np.ascontiguousarray(faces.transpose(1, 2, 3, 0), dtype='f4')
+            for faces in (caps, *sides)
+        )
+        vox_lo = np.clip(np.ceil(lower - 0.5), 0, shape - 1).astype(int)
+        vox_hi = np.clip(np.floor(upper + 0.5), 0, shape - 1).astype(int)
+        extent = np.clip(vox_hi - vox_lo + 1, 0, None)
+        extent[(upper < -0.5).any(axis=1) | (lower > shape - 0.5).any(axis=1)] = 0
+        nvoxels = extent.prod(axis=1)
+
+        # Split vertices into chunks with a bounded number of points
+        chunk_ids = np.cumsum(nvoxels * len(offsets)) // max_points
+        for chunk in np.unique(chunk_ids):
+            selected = np.flatnonzero((chunk_ids == chunk) & (nvoxels > 0))
+            if not len(selected):
+                continue
+
+            # Voxels in the bounding box of each polyhedron
+            owner = np.repeat(selected, nvoxels[selected])
+            local = np.arange(len(owner)) - np.repeat(
+                np.cumsum(nvoxels[selected]) - nvoxels[selected], nvoxels[selected]
+            )
+            ijk = vox_lo[owner] + np.stack(_unravel(local, extent[owner]), axis=-1)
+
+            # Subvoxel centers within the bounding box
+            points = (ijk[:, np.newaxis] + offsets).reshape(-1, 3).astype('f4')
+            point_owner = np.repeat(owner, len(offsets))
+            in_box = np.flatnonzero(
+                np.all((points >= lower[point_owner]) & (points <= upper[point_owner]), axis=1)
+            )
+            points, point_owner = points[in_box], point_owner[in_box]
+            # Inside both (2), one (1) or neither (0) of the polyhedra split either way
+            parity = _crossings_parity(points, caps, point_owner)
+            inside = np.zeros(len(owner) * len(offsets), dtype=int)
+            for side_faces in sides:
+                inside[in_box] += parity ^ _crossings_parity(points, side_faces, point_owner)
+            counts = inside.reshape(-1, len(offsets)).sum(axis=1)
+
+            hit = counts > 0
+            rows.append(vertices[owner[hit]])
+            cols.append(np.ravel_multi_index(tuple(ijk[hit].T), tuple(shape)))
+            values.append(counts[hit] / (2 * len(offsets)))
+
+    if rows:
+        rows, cols, values = (np.concatenate(arr) for arr in (rows, cols, values))
+    return sp.csr_matrix((values, (rows, cols)), shape=(nverts, int(shape.prod())))
+
+
+def _unravel(indices: np.ndarray, extents: np.ndarray) -> tuple[np.ndarray, ...]:
+    """Unravel flat (C-ordered) indices into boxes of varying ``extents``"""
+    k = indices % extents[:, 2]
+    j = (indices // extents[:, 2]) % extents[:, 1]
+    i = indices // (extents[:, 2] * extents[:, 1])
+    return i, j, k
+
+
+def _crossings_parity(points: np.ndarray, faces: np.ndarray, owner: np.ndarray) -> np.ndarray:
+    """Whether a ray cast along +z from each point crosses an odd number of faces
+
+    ``faces`` are triangles of the polyhedra, indexed as ``(face, corner, axis, polyhedron)``,
+    and only those of polyhedron ``owner`` are tested against each point.
+    If the faces close a polyhedron, the points with an odd parity are inside it.
+    """
+    px, py, pz = np.ascontiguousarray(points.T)
+    parity = np.zeros(len(points), dtype=bool)
+    for face in faces:
+        ax, ay, bx, by, cx, cy = (
+            face[corner, axis][owner] for corner in range(3) for axis in (0, 1)
+        )
+        ax -= px
+        bx -= px
+        cx -= px
+        ay -= py
+        by -= py
+        cy -= py
+        # Barycentric coordinates (scaled by the area) of the ray in the xy projection
+        w_a = bx * cy - by * cx
+        w_b = cx * ay - cy * ax
+        w_c = ax * by - ay * bx
+        area = w_a + w_b + w_c
+        sign = np.sign(area)
+        hits = np.flatnonzero(
+            (w_a * sign >= 0) & (w_b * sign >= 0) & (w_c * sign >= 0) & (area != 0)
+        )
+        hit_owner = owner[hits]
+        z_cross = (
+            w_a[hits] * face[0, 2][hit_owner]
+            + w_b[hits] * face[1, 2][hit_owner]
+            + w_c[hits] * face[2, 2][hit_owner]
+        ) / area[hits]
+        parity[hits[z_cross > pz[hits]]] ^= True
+    return parity
+
+
+def sample_ribbon(
+    weights: 'scipy.sparse.spmatrix',
+    img: nb.spatialimages.SpatialImage,
+    roi: np.ndarray | None = None,
+    max_volumes: int | None = None,
+) -> np.ndarray:
+    """Sample a volume or series with the weights calculated by :func:`ribbon_weights`
+
+    Voxels outside ``roi`` (if given) are ignored, and the weights of each vertex
+    are normalized to add up to one. Vertices without weights are set to zero.
+    Only the voxels with weights are read, ``max_volumes`` volumes at a time.
+
+    Returns
+    -------
+    sampled
+        Array of shape ``(vertices, volumes)``.
+    """
+    weights, voxels = _ribbon_operator(weights, roi)
+
+    nvols = img.shape[3] if img.ndim > 3 else 1
+    sampled = np.zeros((weights.shape[0], nvols))
+    for volumes, data in iter_volumes(img, max_volumes):
+        data = data.reshape(-1, volumes.stop - volumes.start)
+        sampled[:, volumes] = weights @ data[voxels]
+    return sampled
+
+
+def sample_ribbon_series(
+    weights: 'scipy.sparse.spmatrix',
+    source: nb.Nifti1Image,
+    target: nb.Nifti1Image,
+    transforms: nt.TransformChain,
+    fieldmap: nb.Nifti1Image | None,
+    pe_info: list[tuple[int, float]] | None,
+    roi: np.ndarray | None = None,
+    max_volumes: int | None = None,
+    **kwargs,
+) -> np.ndarray:
+    """Sample a BOLD series with ribbon weights calculated on the grid of another image
+
+    This is equivalent to resampling ``source`` into ``target`` with
+    :func:`resample_image` and sampling the result with :func:`sample_ribbon`,
+    but only the voxels of ``target`` with weights are resampled
+    (see :func:`resample_voxels`), so the resampled series is never held in full.
+
+    Parameters
+    ----------
+    weights
+        Weights calculated by :func:`ribbon_weights` on the grid of ``target``.
+    roi
+        A boolean array with the shape of ``target``. See :func:`sample_ribbon`.
+    source, target, transforms, fieldmap, pe_info, max_volumes
+        See :func:`resample_voxels`.
+
+    Remaining keyword arguments are passed to :func:`resample_voxels`.
+
+    Returns
+    -------
+    sampled
+        Array of shape ``(vertices, volumes)``.
+    """
+    weights, voxels = _ribbon_operator(weights, roi)
+
+    nvols = source.shape[3] if source.ndim > 3 else 1
+    sampled = np.zeros((weights.shape[0], nvols))
+    for volumes, resampled in resample_voxels(
+        source, target, voxels, transforms, fieldmap, pe_info, max_volumes=max_volumes, **kwargs
+    ):
+        sampled[:, volumes] = weights @ resampled
+    return sampled
+
+
+def resample_voxels(
+    source: nb.Nifti1Image,
+    target: nb.Nifti1Image,
+    voxels: np.ndarray,
+    transforms: nt.TransformChain,
+    fieldmap: nb.Nifti1Image | None,
+    pe_info: list[tuple[int, float]] | None,
+    jacobian: bool = True,
+    order: int = 3,
+    mode: str = 'grid-constant',
+    cval: float = 0.0,
+    prefilter: bool = True,
+    max_volumes: int | None = None,
+    nthreads: int = 1,
+) -> ty.Iterator[tuple[slice, np.ndarray]]:
+    """Resample a 3- or 4D image at a subset of the voxels of a target image
+
+    The values are those :func:`resample_image` would produce at ``voxels``,
+    but only the centers of those voxels are mapped through ``transforms``
+    into ``source``, and the rest of the target grid is never allocated.
+
+    Parameters
+    ----------
+    source
+        The 3D bold image or 4D bold series to resample.
+    target
+        An image sampled in the target space.
+    voxels
+        Flat (C-ordered) indices of the voxels of ``target`` to resample.
+    transforms, fieldmap, pe_info, jacobian, order, mode, cval, prefilter, nthreads
+        See :func:`resample_image`.
+    max_volumes
+        Maximum number of volumes to read from ``source`` and resample at a time.
+        If :obj:`None`, the full series is loaded at once.
+
+    Yields
+    ------
+    volumes
+        The slice of the series contained in ``resampled``.
+    resampled
+        A float32 array of shape ``(len(voxels), volumes)``.
+    """
+    # Map the voxel centers as map_target_coordinates maps the full grid
+    transform_list, hmc_xfms = _split_hmc(source, transforms)
+    ijk = np.stack(np.unravel_index(voxels, target.shape[:3]), axis=-1)
+    ras = nb.affines.apply_affine(target.affine, ijk).astype('f4')
+    ref2vox = nt.TransformChain(transform_list + [nt.Affine(np.linalg.inv(source.affine))])
+    coordinates = np.asarray(ref2vox.map(ras)).T
+
+    nvols = source.shape[3] if source.ndim > 3 else 1
+    if pe_info is None:
+        pe_info = [(0, 0.0)] * nvols
+    fmap_hz = (
+        np.zeros(target.shape[:3], dtype='f4')
+        if fieldmap is None
+        else fieldmap.get_fdata(dtype='f4')
+    )
+    # The Jacobian is a gradient on the full grid, so maps are calculated before subsetting
+    distortions = {}
+    for readout in {tuple(pe) for pe in pe_info}:
+        vsm, jacobian_map = distortion_maps(fmap_hz, readout, jacobian)
+        distortions[readout] = (
+            vsm.reshape(-1)[voxels],
+            None if jacobian_map is None else jacobian_map.reshape(-1)[voxels],
+        )
+
+    for volumes, data in iter_volumes(source, max_volumes):
+        resampled = resample_series(
+            data=data,
+            coordinates=coordinates,
+            pe_info=pe_info[volumes],
+            jacobian=jacobian,
+            hmc_xfms=hmc_xfms[volumes],
+            fmap_hz=fmap_hz.reshape(-1)[voxels],
+            output_dtype='f4',
+            order=order,
+            mode=mode,
+            cval=cval,
+            prefilter=prefilter,
+            distortions=distortions,
+            nthreads=nthreads,
+        )
+        yield volumes, resampled.reshape(len(voxels), -1)
+
+
+def _ribbon_operator(
+    weights: 'scipy.sparse.spmatrix',
+    roi: np.ndarray | None = None,
+) -> tuple['scipy.sparse.csc_matrix', np.ndarray]:
+    """Normalize ribbon weights within ``roi`` and restrict them to the weighted voxels
+
+    Returns the normalized weights, with one column per weighted voxel,
+    and the flat indices of those voxels.
+    """
+    import scipy.sparse as sp
+
+    if roi is not None:
+        weights = sp.csr_matrix(weights) @ sp.diags(np.asarray(roi, dtype='f8').ravel())
+    weights = _normalize_rows(weights).tocsc()
+
+    # Restrict to the voxels actually sampled
+    voxels = np.flatnonzero(np.diff(weights.indptr))
+    return weights[:, voxels], voxels
+
+
+def barycentric_weights(
+    coords: np.ndarray,
+    triangles: np.ndarray,
+    points: np.ndarray,
+    chunk_size: int = 10000,
+) -> 'scipy.sparse.csr_matrix':
+    """Barycentric weights of the vertices of a spherical mesh at arbitrary points
+
+    As in the ``BARYCENTRIC`` method of ``wb_command -metric-resample``, the vertices
+    of the mesh and the points are first projected onto the unit sphere, and each point
+    is weighted by the barycentric coordinates of the closest point of the mesh,
+    within its triangle. Points closest to an edge or a vertex of the mesh are
+    only weighted by the vertices of that edge, or by that vertex alone.
+
+    The closest point is found exactly: the distance to the closest vertex bounds the
+    distance to the mesh, so only triangles whose centroid lies within that distance
+    plus the largest centroid-to-corner distance of the mesh can contain it.
+
+    Parameters
+    ----------
+    coords
+        Vertex coordinates of a sphere centered at the origin.
+    triangles
+        Triangles of the sphere.
+    points
+        Coordinates of the points to interpolate at, in register with the sphere.
+        Their distance to the origin is irrelevant.
+    chunk_size
+        Number of points searched at a time, which bounds memory use.
+
+    Returns
+    -------
+    weights
+        A ``(points x vertices)`` sparse matrix whose rows add up to one.
+
+    """
+    import scipy.sparse as sp
+    from scipy.spatial import cKDTree
+
+    coords = np.asarray(coords, dtype='f8')
+    coords = coords / np.linalg.norm(coords, axis=1, keepdims=True)
+    triangles = np.asarray(triangles, dtype=int)
+    points = np.asarray(points, dtype='f8')
+    points = points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    corners = coords[triangles]
+    centroids = corners.mean(axis=1)
+    reach = np.linalg.norm(corners - centroids[:, np.newaxis], axis=-1).max()
+    bound, _ = cKDTree(coords).query(points)
+    centroid_tree = cKDTree(centroids)
+
+    best = np.zeros(len(points), dtype=int)
+    bary = np.zeros((len(points), 3))
+    for start in range(0, len(points), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        candidates = centroid_tree.query_ball_point(points[chunk], bound[chunk] + reach)
+        nfound = np.array([len(found) for found in candidates])
+        owner = np.repeat(np.arange(len(nfound)), nfound)
+        candidates = np.concatenate(candidates).astype(int)
+
+        p = points[chunk][owner]
+        cand_bary = _closest_point_barycentric(p, *corners[candidates].transpose(1, 0, 2))
+        distance = np.linalg.norm(
+            np.einsum('nk,nkj->nj', cand_bary, corners[candidates]) - p, axis=1
+        )
+
+        # Closest triangle to each point (candidates are grouped by point)
+        order = np.lexsort((distance, owner))
+        closest = order[np.searchsorted(owner[order], np.arange(len(nfound)))]
+        best[chunk] = candidates[closest]
+        bary[chunk] = cand_bary[closest]
+
+    weights = sp.csr_matrix(
+        (bary.ravel(), (np.repeat(np.arange(len(points)), 3), triangles[best].ravel())),
+        shape=(len(points), len(coords)),
+    )
+    weights.eliminate_zeros()
+    return weights
+
+
+def _closest_point_barycentric(
+    p: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray
+) -> np.ndarray:
+    """Barycentric coordinates of the point of each triangle ``abc`` closest to ``p``
+
+    Follows the case analysis of Ericson (2004), *Real-Time Collision Detection*,
+    section 5.1.5, so that coordinates are exactly zero when the closest point
+    lies on an edge or a vertex.
+    """
+
+    def dot(u, v):
+        return np.einsum('ij,ij->i', u, v)
+
+    ab, ac = b - a, c - a
+    d1, d2 = dot(ab, p - a), dot(ac, p - a)
+    d3, d4 = dot(ab, p - b), dot(ac, p - b)
+    d5, d6 = dot(ab, p - c), dot(ac, p - c)
+    va, vb, vc = d3 * d6 - d5 * d4, d5 * d2 - d1 * d6, d1 * d4 - d3 * d2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        on_ab = d1 / (d1 - d3)
+        on_ac = d2 / (d2 - d6)
+        on_bc = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        v, w = vb / (va + vb + vc), vc / (va + vb + vc)
+
+    zero, one = np.zeros_like(d1), np.ones_like(d1)
+    # Regions are tested in order: vertices, then edges, then the face
+    regions = [
+        (d1 <= 0) & (d2 <= 0),
+        (d3 >= 0) & (d4 <= d3),
+        (vc <= 0) & (d1 >= 0) & (d3 <= 0),
+        (d6 >= 0) & (d5 <= d6),
+        (vb <= 0) & (d2 >= 0) & (d6 <= 0),
+        (va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0),
+    ]
+    coordinates = [
+        (one, zero, zero),
+        (zero, one, zero),
+        (1 - on_ab, on_ab, zero),
+        (zero, zero, one),
+        (1 - on_ac, zero, on_ac),
+        (zero, 1 - on_bc, on_bc),
+    ]
+    return np.stack(
+        [
+            np.select(regions, [coord[k] for coord in coordinates], default=face)
+            for k, face in enumerate((1 - v - w, v, w))
+        ],
+        axis=-1,
+    )
+
+
+def vertex_areas(coords: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """Area of each vertex of a mesh, as a third of the area of its triangles"""
+    corners = np.asarray(coords, dtype='f8')[triangles]
+    tri_areas = 0.5 * np.linalg.norm(
+        np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1
+    )
+    return np.bincount(
+        np.asarray(triangles).ravel(), weights=np.repeat(tri_areas / 3, 3), minlength=len(coords)
+    )
+
+
+def adap_bary_area_weights(
+    current_sphere: np.ndarray,
+    current_triangles: np.ndarray,
+    new_sphere: np.ndarray,
+    new_triangles: np.ndarray,
+    current_area: np.ndarray,
+    new_area: np.ndarray,
+    current_roi: np.ndarray | None = None,
+) -> 'scipy.sparse.csr_matrix':
+    """Weights of the ``ADAP_BARY_AREA`` method of ``wb_command -metric-resample``
+
+    Barycentric weights are calculated in both directions: the *forward* weights
+    interpolate the current mesh at each new vertex, and the *reverse* weights
+    interpolate the new mesh at each current vertex.
+    Current vertices outside ``current_roi`` (if given) are dropped from both,
+    as ``-current-roi`` does.
+    Each new vertex gathers its data with the forward weights, unless the (transposed)
+    reverse weights involve more current vertices, which happens where the new mesh
+    is coarser, so that no data is skipped when downsampling.
+    Weights are then multiplied by the vertex areas of ``current_area``, divided by
+    those of ``new_area``, and normalized to add up to one.
+
+    Parameters
+    ----------
+    current_sphere, current_triangles
+        Vertex coordinates and triangles of the registered sphere of the current mesh.
+    new_sphere, new_triangles
+        Vertex coordinates and triangles of the sphere of the new mesh.
+    current_area, new_area
+        Vertex coordinates of an anatomical surface (e.g., midthickness)
+        with the current and the new mesh, respectively.
+    current_roi
+        A boolean array over the current vertices.
+
+    Returns
+    -------
+    weights
+        A ``(new vertices x current vertices)`` sparse matrix.
+
+    """
+    import scipy.sparse as sp
+
+    forward = barycentric_weights(current_sphere, current_triangles, new_sphere)
+    gather = barycentric_weights(new_sphere, new_triangles, current_sphere).T.tocsr()
+    if current_roi is not None:
+        roi = sp.diags(np.asarray(current_roi, dtype='f8').ravel())
+        forward = sp.csr_matrix(forward @ roi)
+        gather = sp.csr_matrix(gather @ roi)
+    forward.eliminate_zeros()
+    gather.eliminate_zeros()
+
+    use_gather = (np.diff(gather.indptr) > np.diff(forward.indptr)).astype('f8')
+    weights = sp.diags(use_gather) @ gather + sp.diags(1 - use_gather) @ forward
+    new_areas = vertex_areas(new_area, new_triangles)
+    weights = (
+        sp.diags(np.divide(1.0, new_areas, out=np.zeros_like(new_areas), where=new_areas != 0))
+        @ weights
+        @ sp.diags(vertex_areas(current_area, current_triangles))
+    )
+    return _normalize_rows(weights)
+
+
+def _normalize_rows(weights: 'scipy.sparse.spmatrix') -> 'scipy.sparse.csr_matrix':
+    """Scale the rows of a sparse matrix to add up to one, leaving empty rows empty"""
+    import scipy.sparse as sp
+
+    weights = sp.csr_matrix(weights)
+    weights.eliminate_zeros()
+    norm = np.asarray(weights.sum(axis=1)).ravel()
+    scale = np.divide(1.0, norm, out=np.zeros_like(norm), where=norm != 0)
+    return sp.diags(scale) @ weights
+
+
+def resample_metric(
+    weights: 'scipy.sparse.spmatrix',
+    data: np.ndarray,
+    new_roi: np.ndarray | None = None,
+) -> np.ndarray:
+    """Resample metric data with the weights calculated by :func:`adap_bary_area_weights`
+
+    New vertices without weights, or outside ``new_roi`` (if given), are set to zero,
+    as ``wb_command -metric-mask`` does.
+    All columns of ``data`` are resampled at once.
+
+    Returns
+    -------
+    resampled
+        Array of shape ``(new vertices,) + data.shape[1:]``.
+    """
+    import scipy.sparse as sp
+
+    if new_roi is not None:
+        weights = sp.diags(np.asarray(new_roi, dtype='f8').ravel()) @ weights
+    return sp.csr_matrix(weights) @ np.asarray(data, dtype='f8')
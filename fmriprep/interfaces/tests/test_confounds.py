@@ -1,7 +1,9 @@
 from pathlib import Path
 
+import nibabel as nb
 import numpy as np
 import pandas as pd
+import pytest
 from nipype.pipeline import engine as pe
 
 from fmriprep.interfaces import confounds
@@ -101,3 +103,210 @@ def test_FramewiseDisplacement(tmp_path, data_dir):
     derived = pd.read_csv(res.outputs.out_file, sep='\t')['FramewiseDisplacement']
 
     assert np.allclose(orig.values, derived.values, equal_nan=True)
+
+
+def test_MotionMetrics(tmp_path, data_dir):
+    base = 'sub-01_task-mixedgamblestask_run-01'
+    xfms = data_dir / f'{base}_from-orig_to-boldref_mode-image_desc-hmc_xfm.txt'
+    boldref = data_dir / f'{base}_desc-hmc_boldref.nii.gz'
+
+    fused = pe.Node(
+        confounds.MotionMetrics(xfm_file=str(xfms), boldref_file=str(boldref)),
+        name='motion_metrics',
+        base_dir=str(tmp_path),
+    ).run()
+
+    motion = pe.Node(
+        confounds.FSLMotionParams(xfm_file=str(xfms), boldref_file=str(boldref)),
+        name='fsl_motion',
+        base_dir=str(tmp_path),
+    ).run()
+    rmsd = pe.Node(
+        confounds.FSLRMSDeviation(xfm_file=str(xfms), boldref_file=str(boldref)),
+        name='rmsd',
+        base_dir=str(tmp_path),
+    ).run()
+    fd = pe.Node(
+        confounds.FramewiseDisplacement(in_file=motion.outputs.out_file),
+        name='framewise_displacement',
+        base_dir=str(tmp_path),
+    ).run()
+
+    for fused_file, orig_file in (
+        (fused.outputs.motion_file, motion.outputs.out_file),
+        (fused.outputs.rmsd_file, rmsd.outputs.out_file),
+        (fused.outputs.fd_file, fd.outputs.out_file),
+    ):
+        pd.testing.assert_frame_equal(
+            pd.read_csv(fused_file, sep='\t'), pd.read_csv(orig_file, sep='\t')
+        )
+
+
+@pytest.mark.parametrize('skip_vols', [0, 2])
+@pytest.mark.parametrize('dtype', ['f4', 'i2'])
+@pytest.mark.parametrize('work_compression', ['default', 'none'])
+def test_ComputeConfounds(tmp_path, skip_vols, dtype, work_compression):
+    from nipype.algorithms import confounds as nac
+    from niworkflows.interfaces.images import SignalExtraction
+    from niworkflows.interfaces.utility import AddTSVHeader
+
+    rng = np.random.default_rng(2425)
+    affine = np.diag([3.0, 3.0, 3.0, 1.0])
+    bold = rng.normal(1000, 20, size=(12, 13, 11, 40)).astype('f4')
+    bold += np.linspace(0, 30, 40, dtype='f4')  # Drift, removed by the cosine basis
+    bold[..., :skip_vols] += 200  # Non-steady-state volumes
+    nb.Nifti1Image(bold.astype(dtype), affine).to_filename(tmp_path / 'bold.nii.gz')
+
+    ijk = np.indices(bold.shape[:3])
+    radius = np.sqrt(np.sum((ijk - np.array([6, 6, 5])[:, None, None, None]) ** 2, axis=0))
+    masks = {
+        'mask': radius < 5,
+        'csf': radius < 2,
+        'wm': (radius >= 2) & (radius < 3.5),
+        'combined': radius < 3.5,
+        'crown': (radius >= 5) & (radius < 6),
+    }
+    for name, data in masks.items():
+        nb.Nifti1Image(data.astype('u1'), affine).to_filename(tmp_path / f'{name}.nii.gz')
+    acc_masks = [str(tmp_path / f'{name}.nii.gz') for name in ('csf', 'wm', 'combined')]
+
+    fused = (
+        pe.Node(
+            confounds.ComputeConfounds(
+                in_file=str(tmp_path / 'bold.nii.gz'),
+                in_mask=str(tmp_path / 'mask.nii.gz'),
+                acompcor_masks=acc_masks,
+                crown_mask=str(tmp_path / 'crown.nii.gz'),
+                skip_vols=skip_vols,
+                repetition_time=2.0,
+                work_compression=work_compression,
+            ),
+            name='fused',
+            base_dir=str(tmp_path),
+        )
+        .run()
+        .outputs
+    )
+
+    common = {
+        'realigned_file': str(tmp_path / 'bold.nii.gz'),
+        'ignore_initial_volumes': skip_vols,
+        'repetition_time': 2.0,
+        'pre_filter': 'cosine',
+        'save_pre_filter': True,
+        'save_metadata': True,
+        'failure_mode': 'NaN',
+    }
+    acompcor = nac.ACompCor(
+        mask_files=acc_masks,
+        header_prefix='a_comp_cor_',
+        mask_names=['CSF', 'WM', 'combined'],
+        merge_method='none',
+        variance_threshold=0.5,
+        **common,
+    )
+    crowncompcor = nac.ACompCor(
+        mask_files=[str(tmp_path / 'crown.nii.gz')],
+        header_prefix='edge_comp_',
+        mask_names=['Edge'],
+        merge_method='none',
+        num_components=24,
+        **common,
+    )
+    tcompcor = nac.TCompCor(
+        mask_files=[str(tmp_path / 'mask.nii.gz')],
+        header_prefix='t_comp_cor_',
+        percentile_threshold=0.02,
+        variance_threshold=0.5,
+        **common,
+    )
+    dvars = nac.ComputeDVARS(
+        in_file=str(tmp_path / 'bold.nii.gz'),
+        in_mask=str(tmp_path / 'mask.nii.gz'),
+        save_nstd=True,
+        save_std=True,
+        remove_zerovariance=True,
+    )
+
+    expected = {}
+    for name, interface in (
+        ('acompcor', acompcor),
+        ('crowncompcor', crowncompcor),
+        ('tcompcor', tcompcor),
+        ('dvars', dvars),
+    ):
+        workdir = tmp_path / name
+        workdir.mkdir()
+        expected[name] = pe.Node(interface, name=name, base_dir=str(workdir)).run().outputs
+
+    # Components are calculated from the Gram matrix, so they match up to sign and precision
+    for name in ('acompcor', 'crowncompcor', 'tcompcor'):
+        components = pd.read_csv(getattr(fused, name), sep='\t')
+        expected_components = pd.read_csv(expected[name].components_file, sep='\t')
+        assert list(components.columns) == list(expected_components.columns)
+        signs = np.sign(np.sum(components.values * expected_components.values, axis=0))
+        assert np.allclose(components.values, expected_components.values * signs, atol=1e-4)
+
+        metadata = pd.read_csv(getattr(fused, f'{name}_metadata'), sep='\t')
+        expected_metadata = pd.read_csv(expected[name].metadata_file, sep='\t')
+        pd.testing.assert_frame_equal(metadata, expected_metadata, rtol=1e-4, atol=1e-6)
+    assert (
+        Path(fused.cos_basis).read_text() == Path(expected['tcompcor'].pre_filter_file).read_text()
+    )
+
+    suffix = '.nii' if work_compression == 'none' else '.nii.gz'
+    assert fused.tcompcor_mask.endswith(suffix)
+    assert fused.ref_file.endswith(suffix)
+    assert np.allclose(nb.load(fused.ref_file).get_fdata(), bold.astype(dtype)[..., 0], atol=0.01)
+
+    tcc_mask = expected['tcompcor'].high_variance_masks
+    assert np.array_equal(nb.load(fused.tcompcor_mask).get_fdata(), nb.load(tcc_mask).get_fdata())
+
+    for name, out_file in (('dvars', 'out_nstd'), ('std_dvars', 'out_std')):
+        header = AddTSVHeader(in_file=getattr(expected['dvars'], out_file), columns=[name])
+        header_res = pe.Node(header, name=f'{name}_header', base_dir=str(tmp_path)).run()
+        assert (
+            Path(getattr(fused, name)).read_text() == Path(header_res.outputs.out_file).read_text()
+        )
+
+    signals = pe.Node(
+        SignalExtraction(
+            in_file=str(tmp_path / 'bold.nii.gz'),
+            label_files=[str(tmp_path / 'mask.nii.gz'), *acc_masks, tcc_mask],
+            class_labels=['global_signal', 'csf', 'white_matter', 'csf_wm', 'tcompcor'],
+        ),
+        name='signals',
+        base_dir=str(tmp_path),
+    ).run()
+    assert Path(fused.signals).read_text() == Path(signals.outputs.out_file).read_text()
+
+
+def test_aCompCorMasks_cache(tmp_path):
+    rng = np.random.default_rng(3233)
+    tpms = rng.dirichlet([1, 1, 1], size=(20, 21, 22)).astype('f4')
+    in_vfs = []
+    for name, data in zip(('gm', 'wm', 'csf'), np.moveaxis(tpms, -1, 0), strict=True):
+        in_vfs.append(str(tmp_path / f'{name}.nii.gz'))
+        nb.Nifti1Image(data, np.eye(4)).to_filename(in_vfs[-1])
+
+    outputs = []
+    for run in ('run-1', 'run-2'):
+        node = pe.Node(
+            confounds.aCompCorMasks(
+                in_vfs=in_vfs,
+                bold_zooms=(2.0, 2.0, 2.0),
+                work_compression='none',
+                cache_dir=str(tmp_path / 'cache'),
+            ),
+            name='acc_masks',
+            base_dir=str(tmp_path / run),
+        )
+        outputs.append(node.run().outputs.out_masks)
+
+    # Masks were generated once, and are found in each node's directory
+    assert len(list((tmp_path / 'cache').iterdir())) == 1
+    assert outputs[0][0] == outputs[1][0] == in_vfs[2]
+    for first, second in zip(outputs[0][1:], outputs[1][1:], strict=True):
+        assert first != second
+        assert first.endswith('.nii')
+        assert np.array_equal(nb.load(first).get_fdata(), nb.load(second).get_fdata())
@@ -1,8 +1,13 @@
+import os
+import shutil
+import subprocess as sp
+
 import nibabel as nb
 import numpy as np
+import pytest
 from nipype.pipeline import engine as pe
 
-from fmriprep.interfaces.maths import Clip
+from fmriprep.interfaces.maths import Clip, GoodVoxelsMask
 
 
 def test_Clip(tmp_path):
@@ -41,3 +46,118 @@ def test_Clip(tmp_path):
     assert ret.outputs.out_file == str(tmp_path / 'nonpositive/input_clipped.nii')
     out_img = nb.load(ret.outputs.out_file)
     assert np.allclose(out_img.get_fdata(), [[[-1.0, 0.0], [-2.0, 0.0]]])
+
+
+def test_GoodVoxelsMask(tmp_path):
+    rng = np.random.default_rng(3435)
+    affine = np.diag([2.0, 2.0, 2.0, 1.0])
+    bold = rng.normal(1000, 10, size=(16, 16, 16, 30)).astype('f4')
+    bold[8, 8, 8] = rng.normal(1000, 30, size=30)  # Noisy voxel within the ribbon
+    bold[0] = 0  # Outside the field of view
+    nb.Nifti1Image(bold, affine).to_filename(tmp_path / 'bold.nii.gz')
+
+    # The ribbon is given at a higher resolution
+    ribbon = np.zeros((32, 32, 32), dtype='u1')
+    ribbon[8:24, 8:24, 8:24] = 1
+    nb.Nifti1Image(ribbon, np.eye(4)).to_filename(tmp_path / 'ribbon.nii.gz')
+
+    results = []
+    for max_volumes in (0, 7):
+        node = pe.Node(
+            GoodVoxelsMask(
+                in_file=str(tmp_path / 'bold.nii.gz'),
+                ribbon_file=str(tmp_path / 'ribbon.nii.gz'),
+                max_volumes=max_volumes,
+            ),
+            name=f'goodvoxels_{max_volumes}',
+            base_dir=tmp_path,
+        )
+        results.append(node.run().outputs)
+
+    mask = np.asanyarray(nb.load(results[0].goodvoxels_mask).dataobj)
+    ribbon_mask = np.asanyarray(nb.load(results[0].goodvoxels_ribbon).dataobj)
+    assert mask.shape == ribbon_mask.shape == bold.shape[:3]
+    assert mask[8, 8, 8] == ribbon_mask[8, 8, 8] == 0
+    assert not mask[0].any()
+    # Voxels over half a standard deviation above the mean are excluded (~30%)
+    assert 0.5 < ribbon_mask[4:12, 4:12, 4:12].mean() < 0.9
+    assert not ribbon_mask[:4].any()
+    assert np.all(ribbon_mask <= mask)
+
+    # Windowed reading yields the same masks
+    assert np.array_equal(mask, nb.load(results[1].goodvoxels_mask).dataobj)
+
+
+@pytest.mark.skipif(
+    shutil.which('fslmaths') is None or shutil.which('antsApplyTransforms') is None,
+    reason='FSL and ANTs required',
+)
+def test_GoodVoxelsMask_fsl(tmp_path):
+    """Compare with the FSL and ANTs commands of HCP's RibbonVolumeToSurfaceMapping.sh."""
+    rng = np.random.default_rng(1234)
+    affine = np.diag([2.4, 2.4, 2.6, 1.0])
+    affine[:3, 3] = [-19.3, -18.7, -20.1]
+    bold = rng.normal(1000, 10, size=(17, 16, 15, 30)).astype('f4')
+    bold *= rng.uniform(0.5, 3, size=(17, 16, 15, 1)).astype('f4')
+    bold[:2] = 0
+    nb.Nifti1Image(bold, affine).to_filename(tmp_path / 'bold.nii.gz')
+
+    # A noisy spherical shell, at a higher resolution and on a shifted grid
+    ijk = np.indices((40, 40, 40)) - 19.5
+    radius = np.sqrt((ijk**2).sum(0)) + rng.normal(0, 1, size=(40, 40, 40))
+    ribbon = ((radius > 11) & (radius < 16)).astype('u1')
+    ribbon_affine = np.eye(4)
+    ribbon_affine[:3, 3] = -20
+    nb.Nifti1Image(ribbon, ribbon_affine).to_filename(tmp_path / 'ribbon.nii.gz')
+
+    env = dict(os.environ, FSLOUTPUTTYPE='NIFTI_GZ')
+
+    def run(*cmd):
+        return sp.run(cmd, cwd=tmp_path, env=env, check=True, capture_output=True, text=True)
+
+    run('fslmaths', 'bold', '-Tmean', 'mean')
+    run('fslmaths', 'bold', '-Tstd', 'std')
+    run('fslmaths', 'std', '-div', 'mean', 'cov')
+    run(
+        'antsApplyTransforms', '-d', '3', '-i', 'ribbon.nii.gz', '-r', 'mean.nii.gz',
+        '-o', 'ribbon_bold.nii.gz', '-n', 'MultiLabel', '-t', 'identity',
+    )  # fmt:skip
+    run('fslmaths', 'cov', '-mas', 'ribbon_bold', 'cov_ribbon')
+    cov_mean = run('fslstats', 'cov_ribbon', '-M').stdout.strip()
+    run('fslmaths', 'cov_ribbon', '-div', cov_mean, 'cov_ribbon_norm')
+    run('fslmaths', 'cov_ribbon_norm', '-bin', '-s', '5', 'smooth_norm')
+    run('fslmaths', 'cov_ribbon_norm', '-s', '5', '-div', 'smooth_norm', '-dilD', 'local_cov')
+    run('fslmaths', 'cov', '-div', cov_mean, '-div', 'local_cov', 'cov_modulated')
+    run('fslmaths', 'cov_modulated', '-mas', 'ribbon_bold', 'cov_modulated_ribbon')
+    mod_mean, mod_std = map(
+        float, run('fslstats', 'cov_modulated_ribbon', '-M', '-S').stdout.split()
+    )
+    upper_thresh = mod_mean + 0.5 * mod_std
+    run('fslmaths', 'mean', '-bin', 'mean_bin')
+    run(
+        'fslmaths', 'cov_modulated', '-thr', str(upper_thresh), '-bin',
+        '-sub', 'mean_bin', '-mul', '-1', 'goodvoxels',
+    )  # fmt:skip
+
+    node = pe.Node(
+        GoodVoxelsMask(
+            in_file=str(tmp_path / 'bold.nii.gz'),
+            ribbon_file=str(tmp_path / 'ribbon.nii.gz'),
+        ),
+        name='goodvoxels',
+        base_dir=tmp_path,
+    )
+    results = node.run().outputs
+
+    expected_ribbon = nb.load(tmp_path / 'ribbon_bold.nii.gz').get_fdata() > 0
+    expected = nb.load(tmp_path / 'goodvoxels.nii.gz').get_fdata() > 0
+    mask = np.asanyarray(nb.load(results.goodvoxels_mask).dataobj) > 0
+    ribbon_mask = np.asanyarray(nb.load(results.goodvoxels_ribbon).dataobj) > 0
+
+    # Single and double precision may only disagree on voxels at the threshold
+    cov_modulated = nb.load(tmp_path / 'cov_modulated.nii.gz').get_fdata()
+    at_threshold = np.isclose(cov_modulated, upper_thresh, rtol=1e-4)
+    assert np.all(at_threshold[mask != expected])
+    assert np.all(at_threshold[ribbon_mask != (expected & expected_ribbon)])
+    assert expected_ribbon.any()
+    assert not expected.all()
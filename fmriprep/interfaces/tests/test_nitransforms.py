@@ -60,3 +60,22 @@ def test_ConvertAffine(tmp_path, data_dir):
         nitransforms_itk_inv = nt.linear.load(fsl_to_itk.outputs.out_inv)
         assert np.allclose(nitransforms_itk_inv.matrix, lta_convert_itk_inv.matrix, atol=1e-4)
         assert np.allclose(nitransforms_itk_inv.matrix, c3d_itk_inv.matrix, atol=1e-4)
+
+
+def test_AffinesToArray(tmp_path, data_dir):
+    from fmriprep.utils.transforms import load_transforms
+
+    xfms = (
+        data_dir
+        / 'sub-01_task-mixedgamblestask_run-01_from-orig_to-boldref_mode-image_desc-hmc_xfm.txt'
+    )
+    hmc = nt.linear.load(xfms)
+
+    with InGivenDirectory(tmp_path):
+        result = fin.AffinesToArray(in_file=xfms).run()
+
+    array = np.load(result.outputs.out_file)
+    assert result.outputs.out_file.endswith('_xfm.npy')
+    assert array.shape == (len(hmc), 4, 4)
+    assert np.allclose(array, hmc.matrix)
+    assert np.allclose(load_transforms([result.outputs.out_file], [False]).matrix, hmc.matrix)
@@ -0,0 +1,952 @@
+import shutil
+import subprocess
+
+import nibabel as nb
+import nitransforms as nt
+import numpy as np
+import pytest
+from nipype.pipeline import engine as pe
+from scipy import ndimage as ndi
+
+from fmriprep.interfaces.resampling import (
+    MetricResampleSparse,
+    ReconstructFieldmap,
+    ResampleSeries,
+    ResampleSeriesCifti,
+    ResampleSeriesMulti,
+    ResampleSeriesRibbon,
+    SplineFilterSeries,
+    VolumeToSurfaceRibbon,
+    _closest_point_barycentric,
+    adap_bary_area_weights,
+    barycentric_weights,
+    reconstruct_fieldmap,
+    resample_image,
+    resample_voxels,
+    ribbon_weights,
+)
+
+
+@pytest.fixture
+def bold_series(tmp_path):
+    """A small, LAS-oriented BOLD series with motion and a fieldmap"""
+    rng = np.random.default_rng(1234)
+
+    affine = np.diag([-3.0, 3.0, 3.5, 1.0])
+    affine[:3, 3] = [30, -30, -20]
+    data = rng.normal(1000, 50, size=(20, 22, 16, 7)).astype('f4')
+    bold = nb.Nifti1Image(data, affine)
+    bold.header.set_zooms((3.0, 3.0, 3.5, 2.0))
+    bold.to_filename(tmp_path / 'bold.nii.gz')
+
+    boldref = nb.Nifti1Image(data[..., 0], affine)
+    boldref.to_filename(tmp_path / 'boldref.nii.gz')
+
+    xfms = np.tile(np.eye(4), (data.shape[-1], 1, 1))
+    xfms[:, :3, 3] = rng.normal(0, 0.5, size=(data.shape[-1], 3))
+    nt.linear.LinearTransformsMapping(xfms, reference=boldref).to_filename(
+        tmp_path / 'hmc.txt', fmt='itk'
+    )
+
+    fmap = nb.Nifti1Image(rng.normal(0, 20, size=data.shape[:3]).astype('f4'), affine)
+    fmap.to_filename(tmp_path / 'fmap.nii.gz')
+
+    return tmp_path
+
+
+@pytest.mark.parametrize('max_volumes', [1, 3, 7])
+def test_ResampleSeries_streaming(tmp_path, bold_series, max_volumes):
+    inputs = {
+        'in_file': str(bold_series / 'bold.nii.gz'),
+        'ref_file': str(bold_series / 'boldref.nii.gz'),
+        'transforms': [str(bold_series / 'hmc.txt')],
+        'fieldmap': str(bold_series / 'fmap.nii.gz'),
+        'pe_dir': 'i',
+        'ro_time': 0.03,
+        'jacobian': True,
+    }
+
+    inmem = pe.Node(ResampleSeries(**inputs), name='inmem', base_dir=str(tmp_path))
+    streamed = pe.Node(
+        ResampleSeries(max_volumes=max_volumes, **inputs),
+        name='streamed',
+        base_dir=str(tmp_path),
+    )
+
+    inmem_img = nb.load(inmem.run().outputs.out_file)
+    streamed_img = nb.load(streamed.run().outputs.out_file)
+
+    assert streamed_img.shape == inmem_img.shape
+    assert streamed_img.get_data_dtype() == inmem_img.get_data_dtype()
+    assert streamed_img.header.get_zooms() == inmem_img.header.get_zooms()
+    assert np.allclose(streamed_img.affine, inmem_img.affine)
+    assert np.allclose(streamed_img.get_fdata(), inmem_img.get_fdata())
+
+
+@pytest.mark.parametrize(
+    ('work_compression', 'extension'),
+    [('default', '.nii.gz'), ('fast', '.nii.gz'), ('none', '.nii')],
+)
+@pytest.mark.parametrize('max_volumes', [0, 3])
+def test_ResampleSeries_work_compression(
+    tmp_path, bold_series, work_compression, extension, max_volumes
+):
+    resample = pe.Node(
+        ResampleSeries(
+            in_file=str(bold_series / 'bold.nii.gz'),
+            ref_file=str(bold_series / 'boldref.nii.gz'),
+            transforms=[str(bold_series / 'hmc.txt')],
+            jacobian=False,
+            max_volumes=max_volumes,
+            work_compression=work_compression,
+        ),
+        name=f'resample_{work_compression}_{max_volumes}',
+        base_dir=str(tmp_path),
+    )
+    out_file = resample.run().outputs.out_file
+
+    assert out_file.endswith(f'boldresampled{extension}')
+    assert nb.load(out_file).shape == nb.load(bold_series / 'bold.nii.gz').shape
+
+
+def test_SplineFilterSeries(tmp_path, bold_series):
+    inputs = {
+        'ref_file': str(bold_series / 'boldref.nii.gz'),
+        'transforms': [str(bold_series / 'hmc.txt')],
+        'fieldmap': str(bold_series / 'fmap.nii.gz'),
+        'pe_dir': 'j-',
+        'ro_time': 0.03,
+        'jacobian': True,
+    }
+
+    coeffs = pe.Node(
+        SplineFilterSeries(in_file=str(bold_series / 'bold.nii.gz'), max_volumes=3),
+        name='coeffs',
+        base_dir=str(tmp_path),
+    )
+    coeffs_file = coeffs.run().outputs.out_file
+    assert coeffs_file.endswith('.nii')
+
+    prefiltered = pe.Node(
+        ResampleSeries(in_file=str(bold_series / 'bold.nii.gz'), **inputs),
+        name='prefiltered',
+        base_dir=str(tmp_path),
+    )
+    shared = pe.Node(
+        ResampleSeries(in_file=coeffs_file, prefilter=False, **inputs),
+        name='shared',
+        base_dir=str(tmp_path),
+    )
+
+    prefiltered_img = nb.load(prefiltered.run().outputs.out_file)
+    shared_img = nb.load(shared.run().outputs.out_file)
+
+    assert shared_img.shape == prefiltered_img.shape
+    assert np.allclose(shared_img.get_fdata(), prefiltered_img.get_fdata(), rtol=1e-4, atol=1e-2)
+
+
+def test_ResampleSeriesMulti(tmp_path, bold_series):
+    rng = np.random.default_rng(5678)
+    boldref = nb.load(bold_series / 'boldref.nii.gz')
+
+    # A second, coarser target, shifted from the BOLD reference
+    target_affine = boldref.affine.copy()
+    target_affine[:3, :3] *= 1.5
+    target = nb.Nifti1Image(np.zeros((14, 15, 11), dtype='f4'), target_affine)
+    target.to_filename(bold_series / 'target.nii.gz')
+    xfm = np.eye(4)
+    xfm[:3, 3] = rng.normal(0, 2, size=3)
+    nt.linear.Affine(xfm).to_filename(bold_series / 'boldref2target.txt', fmt='itk')
+
+    common = {
+        'in_file': str(bold_series / 'bold.nii.gz'),
+        'pe_dir': 'j',
+        'ro_time': 0.03,
+        'jacobian': True,
+    }
+    refs = [str(bold_series / 'boldref.nii.gz'), str(bold_series / 'target.nii.gz')]
+    xfms = [[], [str(bold_series / 'boldref2target.txt')]]
+
+    multi = pe.Node(
+        ResampleSeriesMulti(
+            ref_files=refs,
+            transforms=xfms,
+            motion_xfm=str(bold_series / 'hmc.txt'),
+            max_volumes=3,
+            **common,
+        ),
+        name='multi',
+        base_dir=str(tmp_path),
+    )
+    out_files = multi.run().outputs.out_files
+    assert len(out_files) == 2
+
+    for idx, (ref, ref_xfms, out_file) in enumerate(zip(refs, xfms, out_files, strict=True)):
+        single = pe.Node(
+            ResampleSeries(
+                ref_file=ref,
+                transforms=[str(bold_series / 'hmc.txt')] + ref_xfms,
+                **common,
+            ),
+            name=f'single{idx}',
+            base_dir=str(tmp_path),
+        )
+        single_img = nb.load(single.run().outputs.out_file)
+        multi_img = nb.load(out_file)
+
+        assert multi_img.shape == single_img.shape
+        assert multi_img.header.get_zooms() == single_img.header.get_zooms()
+        assert np.allclose(multi_img.affine, single_img.affine)
+        assert np.allclose(multi_img.get_fdata(), single_img.get_fdata())
+
+
+@pytest.mark.parametrize('mask_dilation', [0, 2])
+def test_ResampleSeries_masked(tmp_path, bold_series, mask_dilation):
+    boldref = nb.load(bold_series / 'boldref.nii.gz')
+    mask = np.zeros(boldref.shape, dtype='u1')
+    mask[5:15, 6:16, 4:12] = 1
+    nb.Nifti1Image(mask, boldref.affine).to_filename(bold_series / 'mask.nii.gz')
+
+    inputs = {
+        'in_file': str(bold_series / 'bold.nii.gz'),
+        'ref_file': str(bold_series / 'boldref.nii.gz'),
+        'transforms': [str(bold_series / 'hmc.txt')],
+        'fieldmap': str(bold_series / 'fmap.nii.gz'),
+        'pe_dir': 'k-',
+        'ro_time': 0.03,
+        'jacobian': True,
+    }
+
+    full = pe.Node(ResampleSeries(**inputs), name='full', base_dir=str(tmp_path))
+    masked = pe.Node(
+        ResampleSeries(
+            ref_mask=str(bold_series / 'mask.nii.gz'),
+            mask_dilation=mask_dilation,
+            **inputs,
+        ),
+        name='masked',
+        base_dir=str(tmp_path),
+    )
+
+    full_data = nb.load(full.run().outputs.out_file).get_fdata()
+    masked_data = nb.load(masked.run().outputs.out_file).get_fdata()
+
+    roi = mask > 0
+    if mask_dilation:
+        roi = ndi.binary_dilation(roi, iterations=mask_dilation)
+    assert np.allclose(masked_data[roi], full_data[roi])
+    assert np.all(masked_data[~roi] == 0)
+
+
+def test_resample_image_affine(bold_series):
+    source = nb.load(bold_series / 'bold.nii.gz')
+    boldref = nb.load(bold_series / 'boldref.nii.gz')
+    target = nb.Nifti1Image(
+        np.zeros((14, 15, 11), dtype='f4'), boldref.affine @ np.diag([1.5, 1.5, 1.5, 1])
+    )
+    zero_fmap = nb.Nifti1Image(np.zeros(target.shape, dtype='f4'), target.affine)
+
+    xfm = np.eye(4)
+    xfm[:3, :3] = nb.eulerangles.euler2mat(0.1, -0.05, 0.02)
+    xfm[:3, 3] = [2, -1, 3]
+    hmc = nt.linear.load(bold_series / 'hmc.txt')
+    transforms = nt.TransformChain([nt.linear.Affine(xfm), hmc])
+
+    # Without a fieldmap, the linear chain is collapsed into one affine per volume
+    affine_img = resample_image(source, target, transforms, fieldmap=None, pe_info=None)
+    coords_img = resample_image(source, target, transforms, fieldmap=zero_fmap, pe_info=None)
+
+    assert affine_img.shape == coords_img.shape
+    assert np.allclose(affine_img.get_fdata(), coords_img.get_fdata(), atol=1e-2)
+
+
+@pytest.mark.parametrize('with_mask', [False, True])
+def test_ResampleSeries_processes(tmp_path, bold_series, with_mask):
+    boldref = nb.load(bold_series / 'boldref.nii.gz')
+    mask = np.zeros(boldref.shape, dtype='u1')
+    mask[5:15, 6:16, 4:12] = 1
+    nb.Nifti1Image(mask, boldref.affine).to_filename(bold_series / 'mask.nii.gz')
+
+    inputs = {
+        'in_file': str(bold_series / 'bold.nii.gz'),
+        'ref_file': str(bold_series / 'boldref.nii.gz'),
+        'transforms': [str(bold_series / 'hmc.txt')],
+        'fieldmap': str(bold_series / 'fmap.nii.gz'),
+        'pe_dir': 'j',
+        'ro_time': 0.03,
+        'jacobian': True,
+        'num_threads': 2,
+    }
+    if with_mask:
+        inputs['ref_mask'] = str(bold_series / 'mask.nii.gz')
+
+    threads = pe.Node(ResampleSeries(**inputs), name='threads', base_dir=str(tmp_path))
+    processes = pe.Node(
+        ResampleSeries(backend='processes', **inputs),
+        name='processes',
+        base_dir=str(tmp_path),
+    )
+
+    threads_img = nb.load(threads.run().outputs.out_file)
+    processes_img = nb.load(processes.run().outputs.out_file)
+
+    assert processes_img.shape == threads_img.shape
+    assert np.array_equal(processes_img.get_fdata(), threads_img.get_fdata())
+
+
+@pytest.mark.parametrize('with_fieldmap', [False, True])
+def test_ResampleSeries_slabs(tmp_path, bold_series, with_fieldmap):
+    inputs = {
+        'in_file': str(bold_series / 'bold.nii.gz'),
+        'ref_file': str(bold_series / 'boldref.nii.gz'),
+        'transforms': [str(bold_series / 'hmc.txt')],
+        'pe_dir': 'k',
+        'ro_time': 0.03,
+        'jacobian': True,
+    }
+    if with_fieldmap:
+        inputs['fieldmap'] = str(bold_series / 'fmap.nii.gz')
+
+    full = pe.Node(ResampleSeries(**inputs), name='full', base_dir=str(tmp_path))
+    # A tiny budget resamples one plane at a time
+    slabs = pe.Node(
+        ResampleSeries(slab_mem_gb=1e-9, max_volumes=4, **inputs),
+        name='slabs',
+        base_dir=str(tmp_path),
+    )
+
+    full_img = nb.load(full.run().outputs.out_file)
+    slabs_img = nb.load(slabs.run().outputs.out_file)
+
+    assert slabs_img.shape == full_img.shape
+    assert np.allclose(slabs_img.affine, full_img.affine)
+    assert np.allclose(slabs_img.get_fdata(), full_img.get_fdata(), atol=1e-4)
+
+
+def test_resample_image_coords_cache(tmp_path, bold_series):
+    rng = np.random.default_rng(91011)
+    source = nb.load(bold_series / 'bold.nii.gz')
+    boldref = nb.load(bold_series / 'boldref.nii.gz')
+    fieldmap = nb.load(bold_series / 'fmap.nii.gz')
+
+    # A smooth nonlinear warp, followed by a rigid transform and head motion
+    field = ndi.gaussian_filter(rng.normal(0, 20, size=(*boldref.shape, 3)), (3, 3, 3, 0))
+    warp = nt.nonlinear.DenseFieldTransform(nb.Nifti1Image(field.astype('f4'), boldref.affine))
+    xfm = np.eye(4)
+    xfm[:3, 3] = [1, -2, 0.5]
+    hmc = nt.linear.load(bold_series / 'hmc.txt')
+    transforms = nt.TransformChain([warp, nt.linear.Affine(xfm), hmc])
+
+    kwargs = {'fieldmap': fieldmap, 'pe_info': [(1, 0.03)] * source.shape[-1]}
+    direct = resample_image(source, boldref, transforms, **kwargs)
+    cache_dir = tmp_path / 'cache'
+    computed = resample_image(source, boldref, transforms, coords_cache_dir=cache_dir, **kwargs)
+    assert len(list(cache_dir.glob('coords_*.npy'))) == 1
+    reused = resample_image(source, boldref, transforms, coords_cache_dir=cache_dir, **kwargs)
+
+    assert np.allclose(computed.get_fdata(), direct.get_fdata(), atol=1e-2)
+    assert np.array_equal(reused.get_fdata(), computed.get_fdata())
+
+
+def test_reconstruct_fieldmap_separable():
+    from sdcflows.transform import grid_bspline_weights
+
+    rng = np.random.default_rng(1213)
+    levels = []
+    for spacing, shape in ((40.0, (6, 7, 5)), (20.0, (10, 12, 9))):
+        coeff_affine = np.diag([spacing, spacing, spacing, 1.0])
+        coeff_affine[:3, 3] = -0.5 * spacing * (np.array(shape) - 1)
+        levels.append(nb.Nifti1Image(rng.normal(0, 10, size=shape).astype('f4'), coeff_affine))
+
+    # An aligned target, in LAS orientation and at a different resolution
+    target_affine = np.diag([-2.5, 2.5, 3.0, 1.0])
+    target_affine[:3, 3] = [40, -60, -45]
+    target = nb.Nifti1Image(np.zeros((33, 48, 30), dtype='f4'), target_affine)
+
+    fmap = reconstruct_fieldmap(levels, target, target, nt.Affine())
+
+    expected = np.zeros(fmap.shape, dtype='f4')
+    for level in levels:
+        colmat = grid_bspline_weights(fmap, level)
+        expected += (colmat @ level.get_fdata(dtype='f4').reshape(-1)).reshape(fmap.shape)
+
+    assert np.abs(expected).max() > 1
+    assert np.allclose(fmap.get_fdata(), expected, atol=1e-4)
+
+
+def test_ReconstructFieldmap_cache(tmp_path, bold_series):
+    rng = np.random.default_rng(1415)
+    coeff_affine = np.diag([20.0, 20.0, 20.0, 1.0])
+    coeff_affine[:3, 3] = -50
+    coeffs = nb.Nifti1Image(rng.normal(0, 10, size=(6, 6, 5)).astype('f4'), coeff_affine)
+    coeffs.to_filename(tmp_path / 'coeffs.nii.gz')
+
+    xfm = np.eye(4)
+    xfm[:3, 3] = [1.0, -2.0, 0.5]
+    (tmp_path / 'copy').mkdir()
+    for xfm_dir in (tmp_path, tmp_path / 'copy'):
+        nt.linear.Affine(xfm).to_filename(xfm_dir / 'boldref2fmap.txt', fmt='itk')
+
+    inputs = {
+        'in_coeffs': [str(tmp_path / 'coeffs.nii.gz')],
+        'target_ref_file': str(bold_series / 'boldref.nii.gz'),
+        'fmap_ref_file': str(bold_series / 'boldref.nii.gz'),
+        'inverse': [True],
+    }
+    cache_dir = tmp_path / 'fmap_cache'
+
+    def run(name, xfm_dir, **kwargs):
+        node = pe.Node(
+            ReconstructFieldmap(transforms=[str(xfm_dir / 'boldref2fmap.txt')], **inputs),
+            name=name,
+            base_dir=str(tmp_path),
+        )
+        node.inputs.trait_set(**kwargs)
+        return nb.load(node.run().outputs.out_file)
+
+    expected = run('uncached', tmp_path)
+    first = run('first', tmp_path, fmap_cache_dir=str(cache_dir))
+    assert len(list(cache_dir.glob('fmap_*.nii'))) == 1
+
+    # Copies of the same transform share the cache entry
+    second = run('second', tmp_path / 'copy', fmap_cache_dir=str(cache_dir))
+    assert len(list(cache_dir.glob('fmap_*.nii'))) == 1
+    for fmap in (first, second):
+        assert np.allclose(fmap.affine, expected.affine)
+        assert np.array_equal(fmap.get_fdata(), expected.get_fdata())
+
+    # A different transform is a different fieldmap
+    xfm[:3, 3] = 0
+    nt.linear.Affine(xfm).to_filename(tmp_path / 'copy' / 'boldref2fmap.txt', fmt='itk')
+    run('third', tmp_path / 'copy', fmap_cache_dir=str(cache_dir))
+    assert len(list(cache_dir.glob('fmap_*.nii'))) == 2
+
+
+def _sphere(nverts=400):
+    """Vertices (Fibonacci lattice) and triangles of a unit sphere"""
+    from scipy.spatial import ConvexHull
+
+    idx = np.arange(nverts) + 0.5
+    phi = np.arccos(1 - 2 * idx / nverts)
+    theta = np.pi * (1 + 5**0.5) * idx
+    coords = np.stack(
+        (np.cos(theta) * np.sin(phi), np.sin(theta) * np.sin(phi), np.cos(phi)), axis=-1
+    )
+    triangles = ConvexHull(coords).simplices
+    # Orient all triangles outwards, as in surface files
+    corners = coords[triangles]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    inward = np.einsum('ij,ij->i', normals, corners.mean(axis=1)) < 0
+    triangles[inward] = triangles[inward][:, ::-1]
+    return coords, triangles
+
+
+def test_ribbon_weights():
+    coords, triangles = _sphere()
+    inner, outer = coords * 20, coords * 24
+    affine = np.diag([2.0, 2.0, 2.0, 1.0])
+    affine[:3, 3] = -31
+    target = nb.Nifti1Image(np.zeros((32, 32, 32), dtype='u1'), affine)
+
+    weights = ribbon_weights(inner, outer, triangles, target)
+    assert weights.shape == (len(coords), 32**3)
+
+    # Each triangle belongs to three polyhedra, which cover the shell thrice
+    shell = 4 / 3 * np.pi * (24**3 - 20**3)
+    total = weights.sum() * np.prod(np.diag(affine)[:3])
+    assert np.isclose(total, 3 * shell, rtol=0.02)
+
+    # Only voxels overlapping the ribbon are weighted
+    ijk = np.unravel_index(weights.indices, target.shape)
+    radius = np.linalg.norm(nb.affines.apply_affine(affine, np.stack(ijk, axis=-1)), axis=-1)
+    assert radius.min() > 20 - np.sqrt(3)
+    assert radius.max() < 24 + np.sqrt(3)
+
+
+def test_VolumeToSurfaceRibbon(tmp_path):
+    coords, triangles = _sphere()
+    for name, radius in (('white', 20), ('pial', 24), ('midthickness', 22)):
+        nb.GiftiImage(
+            darrays=[
+                nb.gifti.GiftiDataArray(
+                    (coords * radius).astype('f4'),
+                    intent='NIFTI_INTENT_POINTSET',
+                    meta={'AnatomicalStructurePrimary': 'CortexLeft'},
+                ),
+                nb.gifti.GiftiDataArray(triangles.astype('i4'), intent='NIFTI_INTENT_TRIANGLE'),
+            ]
+        ).to_filename(tmp_path / f'lh.{name}.surf.gii')
+
+    affine = np.diag([2.0, 2.0, 2.0, 1.0])
+    affine[:3, 3] = -31
+    ijk = np.stack(np.indices((32, 32, 32)), axis=-1)
+    xyz = nb.affines.apply_affine(affine, ijk)
+    radius = np.linalg.norm(xyz, axis=-1)
+    bold = np.stack((radius, np.ones_like(radius), xyz[..., 0]), axis=-1).astype('f4')
+    nb.Nifti1Image(bold, affine).to_filename(tmp_path / 'bold.nii.gz')
+    nb.Nifti1Image((radius < 22).astype('u1'), affine).to_filename(tmp_path / 'roi.nii.gz')
+
+    inputs = {
+        'volume_file': str(tmp_path / 'bold.nii.gz'),
+        'surface_file': str(tmp_path / 'lh.midthickness.surf.gii'),
+        'inner_surface': str(tmp_path / 'lh.white.surf.gii'),
+        'outer_surface': str(tmp_path / 'lh.pial.surf.gii'),
+        'weights_cache_dir': str(tmp_path / 'cache'),
+    }
+    results = []
+    for name, extra in (
+        ('first', {}),
+        ('cached', {'max_volumes': 2}),
+        ('roi', {'volume_roi': str(tmp_path / 'roi.nii.gz')}),
+    ):
+        node = pe.Node(VolumeToSurfaceRibbon(**inputs, **extra), name=name, base_dir=tmp_path)
+        results.append(nb.load(node.run().outputs.out_file))
+
+    # Weights were calculated once
+    assert len(list((tmp_path / 'cache').iterdir())) == 1
+
+    first, cached, roi = results
+    assert first.meta['AnatomicalStructurePrimary'] == 'CortexLeft'
+    assert len(first.darrays) == 3
+    sampled = np.stack(first.agg_data(), axis=-1)
+    assert np.allclose(sampled, np.stack(cached.agg_data(), axis=-1))
+    assert np.all((sampled[:, 0] > 20) & (sampled[:, 0] < 24))
+    assert np.allclose(sampled[:, 1], 1)
+    assert np.corrcoef(sampled[:, 2], coords[:, 0])[0, 1] > 0.99
+
+    # Voxels outside the ROI are ignored
+    assert np.all(roi.darrays[0].data < 22)
+
+
+@pytest.mark.skipif(shutil.which('wb_command') is None, reason='wb_command required')
+def test_VolumeToSurfaceRibbon_workbench(tmp_path):
+    """Compare with wb_command -volume-to-surface-mapping -ribbon-constrained."""
+    coords, triangles = _sphere(1000)
+    # An uneven ribbon, so that the sides of the polyhedra are not planar
+    thickness = 3 + np.sin(3 * coords[:, 0]) + np.cos(2 * coords[:, 2])
+    for name, surf in (
+        ('white', coords * 20),
+        ('pial', coords * (20 + thickness[:, np.newaxis])),
+        ('midthickness', coords * (20 + thickness[:, np.newaxis] / 2)),
+    ):
+        nb.GiftiImage(
+            darrays=[
+                nb.gifti.GiftiDataArray(
+                    surf.astype('f4'),
+                    intent='NIFTI_INTENT_POINTSET',
+                    meta={'AnatomicalStructurePrimary': 'CortexLeft'},
+                ),
+                nb.gifti.GiftiDataArray(triangles.astype('i4'), intent='NIFTI_INTENT_TRIANGLE'),
+            ]
+        ).to_filename(tmp_path / f'lh.{name}.surf.gii')
+
+    # An oblique grid
+    rng = np.random.default_rng(2718)
+    affine = nb.affines.from_matvec(
+        nb.eulerangles.euler2mat(0.3, -0.2, 0.1) @ np.diag([2.5, 2.5, 2.7]), [-38, -35, -40]
+    )
+    xyz = nb.affines.apply_affine(affine, np.stack(np.indices((32, 32, 32)), axis=-1))
+    bold = np.concatenate((xyz, rng.normal(size=(32, 32, 32, 2))), axis=-1, dtype='f4')
+    nb.Nifti1Image(bold, affine).to_filename(tmp_path / 'bold.nii.gz')
+    roi = (xyz[..., 0] > -10).astype('u1')
+    nb.Nifti1Image(roi, affine).to_filename(tmp_path / 'roi.nii.gz')
+
+    for roi_args, roi_inputs in (
+        ([], {}),
+        (['-volume-roi', 'roi.nii.gz'], {'volume_roi': str(tmp_path / 'roi.nii.gz')}),
+    ):
+        subprocess.run(
+            [
+                shutil.which('wb_command'), '-volume-to-surface-mapping', 'bold.nii.gz',
+                'lh.midthickness.surf.gii', 'expected.func.gii', '-ribbon-constrained',
+                'lh.white.surf.gii', 'lh.pial.surf.gii', *roi_args,
+            ],
+            cwd=tmp_path,
+            check=True,
+        )  # fmt:skip
+        node = pe.Node(
+            VolumeToSurfaceRibbon(
+                volume_file=str(tmp_path / 'bold.nii.gz'),
+                surface_file=str(tmp_path / 'lh.midthickness.surf.gii'),
+                inner_surface=str(tmp_path / 'lh.white.surf.gii'),
+                outer_surface=str(tmp_path / 'lh.pial.surf.gii'),
+                **roi_inputs,
+            ),
+            name=f'ribbon_{len(roi_args)}',
+            base_dir=tmp_path,
+        )
+        sampled = np.stack(nb.load(node.run().outputs.out_file).agg_data(), axis=-1)
+        expected = np.stack(nb.load(tmp_path / 'expected.func.gii').agg_data(), axis=-1)
+
+        assert sampled.shape == expected.shape == (1000, 5)
+        assert np.allclose(sampled, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_ResampleSeriesRibbon(tmp_path, bold_series):
+    coords, triangles = _sphere()
+    surfaces = {}
+    for name, radius in (('white', 10), ('pial', 14), ('midthickness', 12)):
+        surfaces[name] = str(tmp_path / f'lh.{name}.surf.gii')
+        nb.GiftiImage(
+            darrays=[
+                nb.gifti.GiftiDataArray(
+                    (coords * radius + [0, 2, 6]).astype('f4'), intent='NIFTI_INTENT_POINTSET'
+                ),
+                nb.gifti.GiftiDataArray(triangles.astype('i4'), intent='NIFTI_INTENT_TRIANGLE'),
+            ]
+        ).to_filename(surfaces[name])
+
+    inputs = {
+        'ref_file': str(bold_series / 'boldref.nii.gz'),
+        'transforms': [str(bold_series / 'hmc.txt')],
+        'fieldmap': str(bold_series / 'fmap.nii.gz'),
+        'pe_dir': 'i',
+        'ro_time': 0.03,
+        'jacobian': True,
+    }
+    surface_inputs = {
+        'surface_file': surfaces['midthickness'],
+        'inner_surface': surfaces['white'],
+        'outer_surface': surfaces['pial'],
+        'weights_cache_dir': str(tmp_path / 'cache'),
+    }
+
+    resample = pe.Node(
+        ResampleSeries(in_file=str(bold_series / 'bold.nii.gz'), **inputs),
+        name='resample',
+        base_dir=tmp_path,
+    )
+    mapped = pe.Node(
+        VolumeToSurfaceRibbon(volume_file=resample.run().outputs.out_file, **surface_inputs),
+        name='mapped',
+        base_dir=tmp_path,
+    )
+    direct = pe.Node(
+        ResampleSeriesRibbon(
+            volume_file=str(bold_series / 'bold.nii.gz'),
+            max_volumes=3,
+            **inputs,
+            **surface_inputs,
+        ),
+        name='direct',
+        base_dir=tmp_path,
+    )
+
+    expected = np.stack(nb.load(mapped.run().outputs.out_file).agg_data(), axis=-1)
+    sampled = np.stack(nb.load(direct.run().outputs.out_file).agg_data(), axis=-1)
+
+    # Both share the ribbon weights on the reference grid
+    assert len(list((tmp_path / 'cache').iterdir())) == 1
+    assert sampled.shape == expected.shape == (400, 7)
+    assert np.allclose(sampled, expected, rtol=1e-5)
+
+
+@pytest.mark.parametrize('max_volumes', [None, 3])
+def test_resample_voxels(bold_series, max_volumes):
+    source = nb.load(bold_series / 'bold.nii.gz')
+    boldref = nb.load(bold_series / 'boldref.nii.gz')
+    fieldmap = nb.load(bold_series / 'fmap.nii.gz')
+    transforms = nt.TransformChain([nt.linear.load(bold_series / 'hmc.txt')])
+    kwargs = {
+        'fieldmap': fieldmap,
+        'pe_info': [(0, 0.03)] * source.shape[-1],
+        'mode': 'grid-constant',
+    }
+
+    expected = resample_image(source, boldref, transforms, **kwargs).get_fdata(dtype='f4')
+
+    # A scattered subset of voxels, in no particular order
+    voxels = np.random.default_rng(1617).permutation(np.prod(boldref.shape))[:300]
+    sampled = np.zeros((len(voxels), source.shape[-1]), dtype='f4')
+    for volumes, data in resample_voxels(
+        source, boldref, voxels, transforms, max_volumes=max_volumes, **kwargs
+    ):
+        sampled[:, volumes] = data
+
+    assert np.allclose(sampled, expected.reshape(-1, source.shape[-1])[voxels], atol=1e-3)
+
+
+def test_ResampleSeriesCifti(tmp_path, bold_series, monkeypatch):
+    from niworkflows.interfaces import cifti
+    from niworkflows.interfaces.cifti import CIFTI_STRUCT_WITH_LABELS, GenerateCifti
+
+    rng = np.random.default_rng(2024)
+    boldref = nb.load(bold_series / 'boldref.nii.gz')
+
+    # A RAS-oriented label volume on the BOLD grid, reoriented to LAS by both interfaces
+    affine = boldref.affine.copy()
+    affine[0, 0] *= -1
+    affine[0, 3] -= affine[0, 0] * (boldref.shape[0] - 1)
+    volume_labels = [
+        label for labels in CIFTI_STRUCT_WITH_LABELS.values() for label in labels or ()
+    ]
+    label_data = rng.choice([0, *volume_labels], size=boldref.shape).astype('int16')
+    nb.Nifti1Image(label_data, affine).to_filename(tmp_path / 'label.nii.gz')
+    # The fieldmap is given on the target grid
+    fmap = nb.load(bold_series / 'fmap.nii.gz').get_fdata(dtype='f4')
+    nb.Nifti1Image(fmap[::-1], affine).to_filename(tmp_path / 'label_fmap.nii.gz')
+
+    nvols = nb.load(bold_series / 'bold.nii.gz').shape[-1]
+    surface_labels, surface_bolds = [], []
+    for hemi in 'LR':
+        surface_labels.append(str(tmp_path / f'hemi-{hemi}_dparc.label.gii'))
+        nb.GiftiImage(
+            darrays=[nb.gifti.GiftiDataArray(rng.integers(0, 2, size=50).astype('i4'))]
+        ).to_filename(surface_labels[-1])
+        surface_bolds.append(str(tmp_path / f'hemi-{hemi}_bold.func.gii'))
+        nb.GiftiImage(
+            darrays=[
+                nb.gifti.GiftiDataArray(rng.normal(1000, 50, size=50).astype('f4'))
+                for _ in range(nvols)
+            ]
+        ).to_filename(surface_bolds[-1])
+
+    monkeypatch.setattr(
+        cifti,
+        '_prepare_cifti',
+        lambda grayordinates: (surface_labels, str(tmp_path / 'label.nii.gz'), {'Density': '91k'}),
+    )
+
+    inputs = {
+        'transforms': [str(bold_series / 'hmc.txt')],
+        'fieldmap': str(tmp_path / 'label_fmap.nii.gz'),
+        'pe_dir': 'i',
+        'ro_time': 0.03,
+        'jacobian': True,
+    }
+    resample = pe.Node(
+        ResampleSeries(
+            in_file=str(bold_series / 'bold.nii.gz'),
+            ref_file=str(tmp_path / 'label.nii.gz'),
+            **inputs,
+        ),
+        name='resample',
+        base_dir=tmp_path,
+    )
+    generate = pe.Node(
+        GenerateCifti(
+            bold_file=resample.run().outputs.out_file,
+            surface_bolds=surface_bolds,
+            TR=2.0,
+            grayordinates='91k',
+        ),
+        name='generate',
+        base_dir=tmp_path,
+    )
+    direct = pe.Node(
+        ResampleSeriesCifti(
+            in_file=str(bold_series / 'bold.nii.gz'),
+            surface_bolds=surface_bolds,
+            TR=2.0,
+            grayordinates='91k',
+            max_volumes=3,
+            **inputs,
+        ),
+        name='direct',
+        base_dir=tmp_path,
+    )
+
+    expected = nb.load(generate.run().outputs.out_file)
+    sampled = nb.load(direct.run().outputs.out_file)
+
+    expected_models = list(expected.header.get_index_map(1).brain_models)
+    sampled_models = list(sampled.header.get_index_map(1).brain_models)
+    assert [model.brain_structure for model in sampled_models] == list(CIFTI_STRUCT_WITH_LABELS)
+    for model, ref in zip(sampled_models, expected_models, strict=True):
+        assert model.brain_structure == ref.brain_structure
+        assert model.model_type == ref.model_type
+        assert (model.index_offset, model.index_count) == (ref.index_offset, ref.index_count)
+        if model.model_type == 'CIFTI_MODEL_TYPE_SURFACE':
+            assert np.array_equal(model.vertex_indices, ref.vertex_indices)
+        else:
+            assert np.array_equal(model.voxel_indices_ijk, ref.voxel_indices_ijk)
+    assert np.allclose(
+        sampled.header.get_index_map(
+            1
+        ).volume.transformation_matrix_voxel_indices_ijk_to_xyz.matrix,
+        expected.header.get_index_map(
+            1
+        ).volume.transformation_matrix_voxel_indices_ijk_to_xyz.matrix,
+    )
+
+    assert sampled.shape == expected.shape
+    assert np.allclose(sampled.get_fdata(), expected.get_fdata(), atol=1e-3)
+
+
+def test_barycentric_weights():
+    coords, triangles = _sphere(2000)
+    points, _ = _sphere(500)
+    weights = barycentric_weights(coords * 100, triangles, points)
+
+    assert weights.shape == (500, 2000)
+    assert np.allclose(weights.sum(axis=1), 1)
+    # Weighted vertices are the closest point of the mesh, as found by exhaustive search
+    distance = np.linalg.norm(weights @ coords - points, axis=1)
+    corners = coords[triangles]
+    for point, dist in zip(points, distance, strict=True):
+        p = np.broadcast_to(point, (len(triangles), 3))
+        bary = _closest_point_barycentric(p, *corners.transpose(1, 0, 2))
+        exhaustive = np.linalg.norm(np.einsum('nk,nkj->nj', bary, corners) - p, axis=1)
+        assert np.isclose(dist, exhaustive.min(), rtol=0, atol=1e-12)
+    # Vertices map onto themselves
+    identity = barycentric_weights(coords, triangles, coords)
+    assert np.array_equal(identity.toarray(), np.eye(2000))
+
+
+def test_adap_bary_area_weights():
+    fine, fine_tri = _sphere(2000)
+    coarse, coarse_tri = _sphere(500)
+
+    # Downsampling gathers from every current vertex
+    down = adap_bary_area_weights(fine, fine_tri, coarse, coarse_tri, fine * 50, coarse * 50)
+    assert down.shape == (500, 2000)
+    assert np.allclose(down.sum(axis=1), 1)
+    assert np.all(np.diff(down.tocsc().indptr) > 0)
+
+    # Upsampling interpolates within the closest triangle
+    up = adap_bary_area_weights(coarse, coarse_tri, fine, fine_tri, coarse * 50, fine * 50)
+    bary = barycentric_weights(coarse, coarse_tri, fine)
+    assert np.allclose(up.sum(axis=1), 1)
+    assert np.all((up.toarray() > 0) <= (bary.toarray() > 0))
+
+    # Vertices outside the current ROI are not used, and rows are renormalized
+    roi = fine[:, 2] > 0
+    masked = adap_bary_area_weights(
+        fine, fine_tri, coarse, coarse_tri, fine * 50, coarse * 50, current_roi=roi
+    )
+    assert not masked[:, ~roi].count_nonzero()
+    has_weights = np.diff(masked.indptr) > 0
+    assert np.allclose(masked.sum(axis=1)[has_weights], 1)
+    assert np.all(has_weights[coarse[:, 2] > 0.2])
+
+
+def test_MetricResampleSparse(tmp_path):
+    fine, fine_tri = _sphere(2000)
+    coarse, coarse_tri = _sphere(500)
+    for name, coords, triangles in (
+        ('lh.sphere.reg', fine, fine_tri),
+        ('lh.midthickness', fine * 50, fine_tri),
+        ('tpl-sphere', coarse * 100, coarse_tri),
+        ('tpl-midthickness', coarse * 50, coarse_tri),
+    ):
+        nb.GiftiImage(
+            darrays=[
+                nb.gifti.GiftiDataArray(coords.astype('f4'), intent='NIFTI_INTENT_POINTSET'),
+                nb.gifti.GiftiDataArray(triangles.astype('i4'), intent='NIFTI_INTENT_TRIANGLE'),
+            ]
+        ).to_filename(tmp_path / f'{name}.surf.gii')
+
+    def metric(data, fname, **meta):
+        nb.GiftiImage(
+            meta=nb.gifti.GiftiMetaData(meta),
+            darrays=[
+                nb.gifti.GiftiDataArray(column.astype('f4'), intent='NIFTI_INTENT_NONE')
+                for column in np.atleast_2d(data.T)
+            ],
+        ).to_filename(tmp_path / fname)
+        return str(tmp_path / fname)
+
+    bold = np.stack((fine[:, 0], np.ones(2000), np.where(fine[:, 2] > 0, 1.0, 100.0)), axis=-1)
+    inputs = {
+        'in_file': metric(bold, 'bold.func.gii', AnatomicalStructurePrimary='CortexLeft'),
+        'current_sphere': str(tmp_path / 'lh.sphere.reg.surf.gii'),
+        'new_sphere': str(tmp_path / 'tpl-sphere.surf.gii'),
+        'current_area': str(tmp_path / 'lh.midthickness.surf.gii'),
+        'new_area': str(tmp_path / 'tpl-midthickness.surf.gii'),
+        'weights_cache_dir': str(tmp_path / 'cache'),
+    }
+    rois = {
+        'current_roi': metric(fine[:, 2] > 0, 'cortex.shape.gii'),
+        'new_roi': metric(coarse[:, 2] > 0.2, 'atlasroi.shape.gii'),
+    }
+    results = []
+    for name, extra in (('first', {}), ('cached', {}), ('masked', rois)):
+        node = pe.Node(MetricResampleSparse(**inputs, **extra), name=name, base_dir=tmp_path)
+        results.append(nb.load(node.run().outputs.out_file))
+
+    # Weights were calculated once for each current ROI
+    assert len(list((tmp_path / 'cache').iterdir())) == 2
+
+    first, cached, masked = results
+    assert np.array_equal(first.agg_data(), cached.agg_data())
+    assert first.meta['AnatomicalStructurePrimary'] == 'CortexLeft'
+    assert len(first.darrays) == 3
+    resampled = np.stack(first.agg_data(), axis=-1)
+    assert np.corrcoef(resampled[:, 0], coarse[:, 0])[0, 1] > 0.99
+    assert np.allclose(resampled[:, 1], 1)
+
+    # Sources outside the current ROI are ignored, targets outside the new ROI are zeroed
+    resampled = np.stack(masked.agg_data(), axis=-1)
+    inside = coarse[:, 2] > 0.2
+    assert np.allclose(resampled[inside, 1:], 1)
+    assert np.all(resampled[~inside] == 0)
+
+
+@pytest.mark.skipif(shutil.which('wb_command') is None, reason='wb_command required')
+def test_MetricResampleSparse_workbench(tmp_path):
+    """Compare with wb_command -metric-resample ADAP_BARY_AREA -area-surfs."""
+    rng = np.random.default_rng(1414)
+    fine, fine_tri = _sphere(3000)
+    coarse, coarse_tri = _sphere(800)
+    # A registration that is not a rotation, and uneven vertex areas
+    reg = fine + rng.normal(0, 0.01, size=fine.shape)
+    reg /= np.linalg.norm(reg, axis=1, keepdims=True)
+    scale = np.array([60, 45, 50])
+    for name, coords, triangles in (
+        ('lh.sphere.reg', reg * 100, fine_tri),
+        ('lh.midthickness', fine * scale, fine_tri),
+        ('tpl-sphere', coarse * 100, coarse_tri),
+        ('tpl-midthickness', coarse * scale, coarse_tri),
+    ):
+        nb.GiftiImage(
+            darrays=[
+                nb.gifti.GiftiDataArray(coords.astype('f4'), intent='NIFTI_INTENT_POINTSET'),
+                nb.gifti.GiftiDataArray(triangles.astype('i4'), intent='NIFTI_INTENT_TRIANGLE'),
+            ]
+        ).to_filename(tmp_path / f'{name}.surf.gii')
+
+    for fname, data in (
+        ('bold.func.gii', np.stack((fine[:, 0], rng.normal(size=3000)), axis=-1)),
+        ('cortex.shape.gii', (fine[:, 2] > -0.3)[:, np.newaxis]),
+    ):
+        nb.GiftiImage(
+            darrays=[
+                nb.gifti.GiftiDataArray(column.astype('f4'), intent='NIFTI_INTENT_NONE')
+                for column in data.T
+            ]
+        ).to_filename(tmp_path / fname)
+
+    for roi_args, roi_inputs in (
+        ([], {}),
+        (
+            ['-current-roi', 'cortex.shape.gii'],
+            {'current_roi': str(tmp_path / 'cortex.shape.gii')},
+        ),
+    ):
+        subprocess.run(
+            [
+                shutil.which('wb_command'), '-metric-resample', 'bold.func.gii',
+                'lh.sphere.reg.surf.gii', 'tpl-sphere.surf.gii', 'ADAP_BARY_AREA',
+                'expected.func.gii', '-area-surfs', 'lh.midthickness.surf.gii',
+                'tpl-midthickness.surf.gii', *roi_args,
+            ],
+            cwd=tmp_path,
+            check=True,
+        )  # fmt:skip
+        node = pe.Node(
+            MetricResampleSparse(
+                in_file=str(tmp_path / 'bold.func.gii'),
+                current_sphere=str(tmp_path / 'lh.sphere.reg.surf.gii'),
+                new_sphere=str(tmp_path / 'tpl-sphere.surf.gii'),
+                current_area=str(tmp_path / 'lh.midthickness.surf.gii'),
+                new_area=str(tmp_path / 'tpl-midthickness.surf.gii'),
+                **roi_inputs,
+            ),
+            name=f'resample_{len(roi_args)}',
+            base_dir=tmp_path,
+        )
+        resampled = np.stack(nb.load(node.run().outputs.out_file).agg_data(), axis=-1)
+        expected = np.stack(nb.load(tmp_path / 'expected.func.gii').agg_data(), axis=-1)
+
+        assert resampled.shape == expected.shape == (800, 2)
+        assert np.allclose(resampled, expected, rtol=1e-4, atol=1e-5)
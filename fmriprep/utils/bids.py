@@ -91,6 +91,13 @@ def collect_derivatives(
         item = layout.get(return_type='filename', **query)
         if not item:
             continue
+        if isinstance(q.get('extension'), list) and len(item) > 1:
+            # Extensions are listed by preference (e.g., binary arrays over text files)
+            for ext in q['extension']:
+                preferred = [fname for fname in item if fname.endswith(ext)]
+                if preferred:
+                    item = preferred
+                    break
         transforms_cache[xfm] = item[0] if len(item) == 1 else item
     derivs_cache['transforms'] = transforms_cache
     return derivs_cache
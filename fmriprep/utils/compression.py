@@ -0,0 +1,391 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Compression of NIfTI files.
+
+Multi-threaded gzip
+-------------------
+Files are split in blocks that are compressed independently, each block using
+the end of the previous one as a dictionary, and concatenated into a single
+deflate stream, as done by `pigz <https://zlib.net/pigz/>`__.
+The output is a standard gzip file, readable by any gzip decoder.
+zlib releases the GIL while compressing, so blocks are compressed in threads.
+
+Derivatives
+-----------
+Files that are copied without changes to the output directory are hard linked
+or cloned when possible (see :func:`clone_file`).
+
+Working directory
+-----------------
+Intermediate files follow the ``--work-compression`` policy
+(see :func:`work_filename` and :func:`work_compresslevel`).
+"""
+
+import gzip
+import io
+import os
+import shutil
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
+from shutil import copyfileobj
+
+import nibabel as nb
+import numpy as np
+
+BLOCK_SIZE = 1 << 20
+# Maximum distance of deflate back-references
+_WINDOW_SIZE = 1 << 15
+# No file name, no modification time and unknown OS, for deterministic outputs
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+_GZIP_FNAME = 0x08
+# ioctl request cloning a file on Linux (see ioctl_ficlone(2))
+_FICLONE = 0x40049409
+
+
+class ParallelGzipFile(io.RawIOBase):
+    """A write-only gzip file, compressed in blocks by a pool of threads
+
+    Parameters
+    ----------
+    filename
+        Path of the file to write.
+    nthreads
+        Number of threads compressing blocks.
+    compresslevel
+        zlib compression level.
+    blocksize
+        Number of uncompressed bytes per block.
+
+    Examples
+    --------
+    >>> with ParallelGzipFile(testdir / 'data.gz', nthreads=4) as fobj:
+    ...     fobj.write(b'0123456789' * 1000000)
+    10000000
+    >>> len(gzip.decompress((testdir / 'data.gz').read_bytes()))
+    10000000
+
+    """
+
+    def __init__(
+        self,
+        filename: str | os.PathLike,
+        nthreads: int,
+        compresslevel: int = 1,
+        blocksize: int = BLOCK_SIZE,
+    ):
+        super().__init__()
+        self._fobj = open(filename, 'wb')  # noqa: SIM115
+        self._fobj.write(_GZIP_HEADER)
+        self._executor = ThreadPoolExecutor(max(nthreads, 1))
+        self._max_pending = 2 * max(nthreads, 1)
+        self._pending: deque[Future] = deque()
+        self._compresslevel = compresslevel
+        self._blocksize = blocksize
+        self._buffer = bytearray()
+        self._dictionary = b''
+        self._crc = 0
+        self._size = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = memoryview(data).cast('B')
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        self._buffer += data
+
+        nbytes = len(self._buffer) - len(self._buffer) % self._blocksize
+        if nbytes:
+            with memoryview(self._buffer) as view:
+                for start in range(0, nbytes, self._blocksize):
+                    self._submit(bytes(view[start : start + self._blocksize]))
+            del self._buffer[:nbytes]
+        return len(data)
+
+    def tell(self) -> int:
+        """Position in the uncompressed stream"""
+        return self._size
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        # Only no-op seeks are possible, as required by nibabel's writers
+        if (whence, offset) not in ((os.SEEK_SET, self._size), (os.SEEK_CUR, 0)):
+            raise io.UnsupportedOperation('Cannot seek in a compressed stream')
+        return self._size
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            self._submit(bytes(self._buffer), last=True)
+            self._buffer.clear()
+            self._drain(0)
+            self._fobj.write(struct.pack('<II', self._crc, self._size & 0xFFFFFFFF))
+        finally:
+            self._executor.shutdown(cancel_futures=True)
+            self._fobj.close()
+            super().close()
+
+    def _submit(self, block: bytes, last: bool = False) -> None:
+        self._pending.append(
+            self._executor.submit(
+                _deflate_block, block, self._dictionary, self._compresslevel, last
+            )
+        )
+        self._dictionary = block[-_WINDOW_SIZE:]
+        self._drain(self._max_pending)
+
+    def _drain(self, max_pending: int) -> None:
+        # Blocks are written in order, bounding the memory held by pending blocks
+        while len(self._pending) > max_pending:
+            self._fobj.write(self._pending.popleft().result())
+
+
+def _deflate_block(block: bytes, dictionary: bytes, compresslevel: int, last: bool) -> bytes:
+    kwargs = {'zdict': dictionary} if dictionary else {}
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS, **kwargs)
+    # A sync flush ends a block on a byte boundary without terminating the stream
+    return compressor.compress(block) + compressor.flush(
+        zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+    )
+
+
+def to_filename(
+    img: nb.spatialimages.SpatialImage,
+    filename: str | os.PathLike,
+    nthreads: int = 1,
+    compresslevel: int | None = None,
+) -> None:
+    """Save an image, compressing gzipped NIfTI files with ``nthreads`` threads
+
+    Equivalent to ``img.to_filename(filename)``, which is used for other files,
+    or if a single thread and the default compression level are requested.
+    """
+    if not _is_gzip(filename) or not isinstance(img, nb.Nifti1Image):
+        img.to_filename(filename)
+        return
+    if nthreads < 2 and compresslevel is None:
+        img.to_filename(filename)
+        return
+
+    with open_nifti(filename, nthreads, compresslevel) as fobj:
+        img.to_file_map(img.make_file_map({'image': fobj}))
+
+
+def open_nifti(
+    filename: str | os.PathLike,
+    nthreads: int = 1,
+    compresslevel: int | None = None,
+) -> io.IOBase:
+    """Open a file for writing, compressing it with ``nthreads`` threads if gzipped
+
+    If :obj:`None`, ``compresslevel`` defaults to that of nibabel.
+    """
+    if not _is_gzip(filename):
+        return nb.openers.ImageOpener(filename, 'wb')
+    if compresslevel is None:
+        compresslevel = nb.openers.Opener.default_compresslevel
+    if nthreads > 1:
+        return ParallelGzipFile(filename, nthreads, compresslevel)
+    return nb.openers.ImageOpener(filename, 'wb', compresslevel=compresslevel)
+
+
+def work_filename(filename: str | os.PathLike, policy: str = 'default') -> str:
+    """Adapt the extension of a NIfTI file in the working directory to a compression policy
+
+    ``policy`` is one of the choices of ``--work-compression``: ``none`` writes
+    uncompressed (memory-mappable) files, ``fast`` writes gzipped files at the
+    level given by :func:`work_compresslevel`, and ``default`` leaves the
+    extension unchanged.
+
+    >>> work_filename('/work/mask_union.nii.gz', 'none')
+    '/work/mask_union.nii'
+    >>> work_filename('/work/bold_resampled.nii', 'fast')
+    '/work/bold_resampled.nii.gz'
+    >>> work_filename('/work/bold_resampled.nii', 'default')
+    '/work/bold_resampled.nii'
+    >>> work_filename('/work/confounds.tsv', 'none')
+    '/work/confounds.tsv'
+
+    """
+    filename = os.fspath(filename)
+    stem = filename.removesuffix('.gz')
+    if policy == 'default' or not stem.endswith('.nii'):
+        return filename
+    return stem if policy == 'none' else f'{stem}.gz'
+
+
+def work_compresslevel(policy: str = 'default') -> int | None:
+    """gzip compression level of NIfTI files in the working directory under ``policy``
+
+    :obj:`None` stands for the default level of the writer.
+    """
+    return 1 if policy == 'fast' else None
+
+
+def copy_file(
+    src: str | os.PathLike,
+    dst: str | os.PathLike,
+    nthreads: int = 1,
+    compresslevel: int = 9,
+) -> bool:
+    """Copy a file, (de)compressing it according to the extensions of ``src`` and ``dst``
+
+    Files that need no conversion (both uncompressed, or both gzipped with
+    deterministic gzip headers) are linked or cloned with :func:`clone_file`,
+    without reading their contents.
+    Otherwise, this is a parallel implementation of
+    :func:`niworkflows.utils.misc._copy_any`, with the same return value:
+    whether ``dst`` is a new file (and not a hard link).
+    """
+    from niworkflows.utils.misc import _copy_any
+
+    if os.path.lexists(dst):
+        os.unlink(dst)
+
+    if _is_gzip(src) == _is_gzip(dst) and (not _is_gzip(src) or _is_deterministic_gzip(src)):
+        return clone_file(src, dst) != 'hardlink'
+
+    if nthreads < 2 or not _is_gzip(dst):
+        return _copy_any(src, dst)
+
+    src_open = gzip.open if _is_gzip(src) else open
+    with src_open(src, 'rb') as f_in, ParallelGzipFile(dst, nthreads, compresslevel) as f_out:
+        copyfileobj(f_in, f_out, BLOCK_SIZE)
+    return True
+
+
+def clone_file(src: str | os.PathLike, dst: str | os.PathLike, hardlink: bool = True) -> str:
+    """Link or copy ``src`` to a new file ``dst``, avoiding copies of the contents
+
+    Tries, in order, a hard link (if ``hardlink`` is set, and both files are in the
+    same filesystem), a reflink (a copy-on-write clone, on filesystems such as
+    Btrfs or XFS) and a regular copy, done in the kernel where possible.
+
+    Returns
+    -------
+    method
+        ``'hardlink'``, ``'reflink'`` or ``'copy'``.
+
+    """
+    if hardlink:
+        with suppress(OSError):
+            os.link(src, dst)
+            return 'hardlink'
+    if _reflink(src, dst):
+        return 'reflink'
+    shutil.copyfile(src, dst)
+    return 'copy'
+
+
+def write_nifti_header_and_data(
+    fname: str | os.PathLike,
+    header: nb.Nifti1Header,
+    data: np.ndarray,
+    nthreads: int = 1,
+    compresslevel: int = 9,
+) -> None:
+    """Write header and data as is, compressing with ``nthreads`` threads
+
+    A parallel implementation of
+    :func:`niworkflows.utils.images.unsafe_write_nifti_header_and_data`,
+    with the same caveats.
+    If ``data`` is a memory map of an uncompressed NIfTI file with the data
+    layout described by ``header``, and ``fname`` is also uncompressed, that
+    file is cloned (see :func:`clone_file`) and only its header is rewritten.
+    """
+    from niworkflows.utils.images import unsafe_write_nifti_header_and_data
+
+    if not _is_gzip(fname) and _patch_header(fname, header, data):
+        return
+
+    if nthreads < 2 or not _is_gzip(fname):
+        unsafe_write_nifti_header_and_data(fname, header, data)
+        return
+
+    with ParallelGzipFile(fname, nthreads, compresslevel) as fobj:
+        header.write_to(fobj)
+        nb.volumeutils.array_to_file(
+            data, fobj, header.get_data_dtype(), offset=header.get_data_offset()
+        )
+
+
+def _patch_header(fname: str | os.PathLike, header: nb.Nifti1Header, data: np.ndarray) -> bool:
+    """Clone the file mapped by ``data`` to ``fname``, and replace its header
+
+    Returns whether ``fname`` was written.
+    """
+    if not isinstance(data, np.memmap) or data.filename is None or not data.flags.f_contiguous:
+        return False
+    layout = (data.offset, data.dtype, data.shape)
+    if layout != (header.get_data_offset(), header.get_data_dtype(), header.get_data_shape()):
+        return False
+
+    # The header and its extensions must fit before the data
+    header_block = io.BytesIO()
+    header.write_to(header_block)
+    if header_block.tell() > header.get_data_offset():
+        return False
+
+    if os.path.lexists(fname):
+        os.unlink(fname)
+    # Never hard link, the source would be modified as well
+    clone_file(data.filename, fname, hardlink=False)
+    with open(fname, 'r+b') as fobj:
+        fobj.write(header_block.getvalue())
+    return True
+
+
+def _reflink(src: str | os.PathLike, dst: str | os.PathLike) -> bool:
+    try:
+        import fcntl
+    except ImportError:  # Not a POSIX system
+        return False
+
+    # FICLONE is only exported by Python 3.12+
+    ficlone = getattr(fcntl, 'FICLONE', _FICLONE)
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), ficlone, fsrc.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def _is_deterministic_gzip(filename: str | os.PathLike) -> bool:
+    """Whether the header of a gzip file has no file name and no modification time"""
+    with open(filename, 'rb') as fobj:
+        header = fobj.read(8)
+    return (
+        len(header) == 8
+        and header[:3] == b'\x1f\x8b\x08'
+        and not header[3] & _GZIP_FNAME
+        and header[4:8] == bytes(4)
+    )
+
+
+def _is_gzip(filename: str | os.PathLike) -> bool:
+    return os.fspath(filename).endswith('.gz')
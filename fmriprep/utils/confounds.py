@@ -23,7 +23,7 @@
 """Utilities for confounds manipulation."""
 
 
-def mask2vf(in_file, zooms=None, out_file=None):
+def mask2vf(in_file, zooms=None, out_file=None, compresslevel=None):
     """
     Convert a binary mask on a volume fraction map.
 
@@ -35,6 +35,8 @@ def mask2vf(in_file, zooms=None, out_file=None):
     import numpy as np
     from scipy.ndimage import gaussian_filter
 
+    from .compression import to_filename
+
     img = nb.load(in_file)
     imgzooms = np.array(img.header.get_zooms()[:3], dtype=float)
     if zooms is None:
@@ -53,11 +55,15 @@ def mask2vf(in_file, zooms=None, out_file=None):
 
     hdr = img.header.copy()
     hdr.set_data_dtype(np.float32)
-    nb.Nifti1Image(data.astype(np.float32), img.affine, hdr).to_filename(out_file)
+    to_filename(
+        nb.Nifti1Image(data.astype(np.float32), img.affine, hdr),
+        out_file,
+        compresslevel=compresslevel,
+    )
     return out_file
 
 
-def acompcor_masks(in_files, is_aseg=False, zooms=None):
+def acompcor_masks(in_files, is_aseg=False, zooms=None, work_compression='default', out_dir=None):
     """
     Generate aCompCor masks.
 
@@ -105,13 +111,24 @@ def acompcor_masks(in_files, is_aseg=False, zooms=None):
     by means of a Gaussian smoothing filter with sigma adjusted by the size of the
     BOLD data.
 
+    The GM mask is dilated by 3 voxels, as with a ball structuring element of radius 3,
+    by thresholding the Euclidean distance transform of its complement, which is much
+    faster on high-resolution anatomical grids.
+
+    The masks are written to ``out_dir`` (by default, the working directory) following
+    the ``work_compression`` policy (see :func:`~fmriprep.utils.compression.work_filename`).
+
     """
     from pathlib import Path
 
     import nibabel as nb
     import numpy as np
-    from scipy.ndimage import binary_dilation
-    from skimage.morphology import ball
+    from scipy.ndimage import distance_transform_edt
+
+    from .compression import to_filename, work_compresslevel, work_filename
+
+    compresslevel = work_compresslevel(work_compression)
+    out_dir = Path(out_dir or '.').absolute()
 
     csf_file = in_files[2]  # BIDS labeling (CSF=2; last of list)
     # Load PV maps (fast) or segments (recon-all)
@@ -133,7 +150,8 @@ def acompcor_masks(in_files, is_aseg=False, zooms=None):
         csf_file = mask2vf(
             csf_file,
             zooms=zooms,
-            out_file=str(Path('acompcor_csf.nii.gz').absolute()),
+            out_file=work_filename(out_dir / 'acompcor_csf.nii.gz', work_compression),
+            compresslevel=compresslevel,
         )
         csf_data = nb.load(csf_file).get_fdata()
         wm_data = mask2vf(in_files[1], zooms=zooms)
@@ -141,19 +159,307 @@ def acompcor_masks(in_files, is_aseg=False, zooms=None):
         # We do not have partial volume maps (recon-all route)
         gm_data = np.asanyarray(gm_vf.dataobj, np.uint8) > 0
 
-    # Dilate the GM mask
-    gm_data = binary_dilation(gm_data, structure=ball(3))
+    # Dilate the GM mask (voxels within 3 voxels of GM, i.e., a ball of radius 3)
+    if gm_data.any():
+        gm_data = distance_transform_edt(~gm_data) <= 3
 
     # Output filenames
-    wm_file = str(Path('acompcor_wm.nii.gz').absolute())
-    combined_file = str(Path('acompcor_wmcsf.nii.gz').absolute())
+    wm_file = work_filename(out_dir / 'acompcor_wm.nii.gz', work_compression)
+    combined_file = work_filename(out_dir / 'acompcor_wmcsf.nii.gz', work_compression)
 
     # Prepare WM mask
     wm_data[gm_data] = 0  # Make sure voxel does not contain GM
-    nb.Nifti1Image(wm_data, gm_vf.affine, gm_vf.header).to_filename(wm_file)
+    to_filename(
+        nb.Nifti1Image(wm_data, gm_vf.affine, gm_vf.header), wm_file, compresslevel=compresslevel
+    )
 
     # Prepare combined CSF+WM mask
     comb_data = csf_data + wm_data
     comb_data[gm_data] = 0  # Make sure voxel does not contain GM
-    nb.Nifti1Image(comb_data, gm_vf.affine, gm_vf.header).to_filename(combined_file)
+    to_filename(
+        nb.Nifti1Image(comb_data, gm_vf.affine, gm_vf.header),
+        combined_file,
+        compresslevel=compresslevel,
+    )
     return [csf_file, wm_file, combined_file]
+
+
+def dvars(func, mask, remove_zerovariance=True, intensity_normalization=1000, block_size=4096):
+    """
+    Compute standardized and non-standardized DVARS from an in-memory series.
+
+    This is the array counterpart of :func:`nipype.algorithms.confounds.compute_dvars`,
+    and follows exactly the same steps, so that the result is identical
+    to that of :class:`~nipype.algorithms.confounds.ComputeDVARS` for the same data.
+    Copies of the voxels in ``mask`` are kept in single precision, and the
+    double-precision detrending of the autocorrelation estimate is calculated
+    ``block_size`` voxels at a time.
+
+    Parameters
+    ----------
+    func : :obj:`numpy.ndarray`
+        4D BOLD series, as single-precision floating point.
+    mask : :obj:`numpy.ndarray`
+        3D boolean brain mask.
+    block_size : :obj:`int`
+        Number of voxels detrended at a time.
+
+    Returns
+    -------
+    dvars_stdz : :obj:`numpy.ndarray`
+        Standardized DVARS (``T - 1`` values).
+    dvars_nstd : :obj:`numpy.ndarray`
+        Non-standardized DVARS (``T - 1`` values).
+
+    """
+    import numpy as np
+    from nipype.algorithms.confounds import _AR_est_YW, regress_poly
+
+    mfunc = func[mask]
+
+    if intensity_normalization != 0:
+        # In place, with the same operations as (mfunc / median) * intensity_normalization
+        mfunc /= np.median(mfunc)
+        mfunc *= intensity_normalization
+
+    # Robust standard deviation, with "lower" interpolation as FSL does
+    func_sd = (
+        np.percentile(mfunc, 75, axis=1, method='lower')
+        - np.percentile(mfunc, 25, axis=1, method='lower')
+    ) / 1.349
+
+    if remove_zerovariance:
+        zero_variance_voxels = func_sd > 0.0
+        if not zero_variance_voxels.all():
+            mfunc = mfunc[zero_variance_voxels, :]
+            func_sd = func_sd[zero_variance_voxels]
+
+    # Compute (non-robust) estimate of lag-1 autocorrelation
+    ar1 = np.concatenate(
+        [
+            np.apply_along_axis(
+                _AR_est_YW,
+                1,
+                regress_poly(0, mfunc[start : start + block_size], remove_mean=True)[0].astype(
+                    np.float32
+                ),
+                1,
+            )
+            for start in range(0, len(mfunc), block_size)
+        ]
+    )
+
+    # Compute (predicted) standard deviation of temporal difference time series
+    diff_sdhat = np.squeeze(np.sqrt(((1 - ar1) * 2).tolist())) * func_sd
+
+    diff = np.diff(mfunc, axis=1)
+    del mfunc
+    dvars_nstd = np.sqrt(np.square(diff, out=diff).mean(axis=0))
+    return dvars_nstd / diff_sdhat.mean(), dvars_nstd
+
+
+def high_variance_mask(series, mask, percentile_threshold=0.02):
+    """
+    Select the voxels of ``mask`` with the highest temporal standard deviation.
+
+    This reproduces the mask selection of
+    :class:`~nipype.algorithms.confounds.TCompCor` on an in-memory series:
+    quadratic trends are removed before calculating the temporal standard
+    deviation, and voxels above the ``1 - percentile_threshold`` percentile
+    are retained.
+
+    """
+    import numpy as np
+    from nipype.algorithms.confounds import _compute_tSTD, regress_poly
+
+    tstd = _compute_tSTD(regress_poly(2, np.asanyarray(series)[mask, :])[0], 0, axis=-1)
+    threshold_std = np.percentile(tstd, np.round(100.0 * (1.0 - percentile_threshold)).astype(int))
+    out_mask = np.zeros_like(mask)
+    out_mask[mask != 0] = tstd >= threshold_std
+    return out_mask
+
+
+def compute_noise_components(
+    imgseries,
+    mask_images,
+    components_criterion=0.5,
+    filter_type=False,
+    degree=0,
+    period_cut=128,
+    repetition_time=None,
+    failure_mode='error',
+    mask_names=None,
+):
+    """
+    Compute CompCor noise components from the image series for each mask.
+
+    This is a drop-in replacement of
+    :func:`nipype.algorithms.confounds.compute_noise_components`, with the same
+    arguments and return values.
+    Instead of the SVD of the (time points x voxels) matrix of each mask,
+    components are obtained from the eigen-decomposition of its Gram matrix
+    (see :func:`gram_svd`), which is much smaller and cheaper to decompose
+    when there are many more voxels than time points, and still yields the
+    full spectrum needed by the component metadata (and ``--return-all-components``).
+
+    Components are defined up to their sign. Here, the largest loading of
+    each component is made positive, so that results are reproducible.
+
+    """
+    from collections import OrderedDict
+    from itertools import chain
+
+    import nibabel as nb
+    import numpy as np
+    from nipype.algorithms.confounds import _compute_tSTD, cosine_filter, regress_poly
+
+    basis = np.array([])
+    if components_criterion == 'all':
+        components_criterion = -1
+    mask_names = mask_names or range(len(mask_images))
+
+    components = []
+    md_mask = []
+    md_sv = []
+    md_var = []
+    md_cumvar = []
+    md_retained = []
+
+    for name, img in zip(mask_names, mask_images, strict=False):
+        mask = np.asanyarray(nb.squeeze_image(img).dataobj).astype(bool)
+        if imgseries.shape[:3] != mask.shape:
+            raise ValueError(
+                'Inputs for CompCor, timeseries and mask, do not have matching '
+                f'spatial dimensions ({imgseries.shape[:3]} and {mask.shape}, respectively)'
+            )
+
+        voxel_timecourses = imgseries[mask, :]
+
+        # Zero-out any bad values
+        voxel_timecourses[np.isnan(np.sum(voxel_timecourses, axis=1)), :] = 0
+
+        # With no filter, the mean is nonetheless removed (poly w/ degree 0)
+        if filter_type == 'cosine':
+            if repetition_time is None:
+                raise ValueError('Repetition time must be provided for cosine filter')
+            voxel_timecourses, basis = cosine_filter(
+                voxel_timecourses, repetition_time, period_cut, failure_mode=failure_mode
+            )
+        elif filter_type in ('polynomial', False):
+            voxel_timecourses, basis = regress_poly(
+                degree, voxel_timecourses, failure_mode=failure_mode
+            )
+
+        # Time along rows, voxels along columns, with variance normalization
+        M = voxel_timecourses.T
+        M = M / _compute_tSTD(M, 1.0)
+
+        try:
+            u, s = gram_svd(M)
+        except (np.linalg.LinAlgError, ValueError):
+            if failure_mode == 'error':
+                raise
+            s = np.full(M.shape[0], np.nan, dtype=np.float32)
+            if components_criterion >= 1:
+                u = np.full((M.shape[0], components_criterion), np.nan, dtype=np.float32)
+            else:
+                u = np.full((M.shape[0], 1), np.nan, dtype=np.float32)
+
+        variance_explained = (s**2) / np.sum(s**2)
+        cumulative_variance_explained = np.cumsum(variance_explained)
+
+        num_components = int(components_criterion)
+        if 0 < components_criterion < 1:
+            num_components = (
+                np.searchsorted(cumulative_variance_explained, components_criterion) + 1
+            )
+        elif components_criterion == -1:
+            num_components = len(s)
+
+        num_components = int(num_components)
+        if num_components == 0:
+            break
+
+        components.append(u[:, :num_components])
+        md_mask.append([name] * len(s))
+        md_sv.append(s)
+        md_var.append(variance_explained)
+        md_cumvar.append(cumulative_variance_explained)
+        md_retained.append([i < num_components for i in range(len(s))])
+
+    if len(components) > 0:
+        components = np.hstack(components)
+    else:
+        if failure_mode == 'error':
+            raise ValueError('No components found')
+        components = np.full((M.shape[0], num_components), np.nan, dtype=np.float32)
+
+    metadata = OrderedDict(
+        [
+            ('mask', list(chain(*md_mask))),
+            ('singular_value', np.hstack(md_sv)),
+            ('variance_explained', np.hstack(md_var)),
+            ('cumulative_variance_explained', np.hstack(md_cumvar)),
+            ('retained', list(chain(*md_retained))),
+        ]
+    )
+
+    return components, basis, metadata
+
+
+def gram_svd(M):
+    """
+    Left singular vectors and singular values of a matrix, via its Gram matrix.
+
+    The eigen-decomposition of the smallest of :math:`M M^T` and :math:`M^T M`
+    is calculated in double precision, which only requires as many operations
+    as forming the product.
+    The result has the same shape as ``numpy.linalg.svd(M, full_matrices=False)[:2]``,
+    with the largest loading of each singular vector made positive.
+    Should the eigen-decomposition not converge, the SVD of ``M`` is calculated
+    with LAPACK's ``gesvd`` driver, which is slower but more robust than the
+    default ``gesdd``.
+
+    >>> import numpy as np
+    >>> M = np.random.default_rng(0).normal(size=(20, 500))
+    >>> u, s = gram_svd(M)
+    >>> u_ref, s_ref, _ = np.linalg.svd(M, full_matrices=False)
+    >>> np.allclose(s, s_ref)
+    True
+    >>> np.allclose(np.abs(u.T @ u_ref), np.eye(20), atol=1e-8)
+    True
+    >>> gram_svd(M[:, :5])[0].shape
+    (20, 5)
+
+    """
+    import numpy as np
+    from scipy import linalg
+
+    M = np.asarray(M, dtype=np.float64)
+    if not np.all(np.isfinite(M)):
+        raise ValueError('Input matrix contains non-finite values')
+
+    ntime, nvox = M.shape
+    try:
+        if nvox >= ntime:
+            eigvals, u = linalg.eigh(M @ M.T)
+        else:
+            eigvals, v = linalg.eigh(M.T @ M)
+        # eigh sorts eigenvalues in ascending order. Those below the rounding error
+        # of the Gram matrix (possibly negative) correspond to null singular values.
+        eigvals = eigvals[::-1]
+        nonzero = eigvals > eigvals[:1] * np.finfo(np.float64).eps * max(M.shape)
+        s = np.sqrt(np.where(nonzero, eigvals, 0))
+        if nvox >= ntime:
+            u = u[:, ::-1]
+        else:
+            u = M @ v[:, ::-1]
+            u[:, nonzero] /= s[nonzero]
+            u[:, ~nonzero] = 0
+    except linalg.LinAlgError:
+        u, s, _ = linalg.svd(M, full_matrices=False, lapack_driver='gesvd')
+
+    # Deterministic signs
+    signs = np.sign(u[np.abs(u).argmax(axis=0), np.arange(u.shape[1])])
+    signs[signs == 0] = 1
+    return u * signs, s
@@ -0,0 +1,169 @@
+import gzip
+
+import nibabel as nb
+import numpy as np
+import pytest
+
+from fmriprep import interfaces
+from fmriprep.interfaces import DerivativesDataSink
+from fmriprep.utils import compression
+
+
+@pytest.mark.parametrize('nbytes', [0, 1000, 4096, 10000])
+def test_ParallelGzipFile(tmp_path, nbytes):
+    data = np.random.default_rng(1617).integers(0, 16, size=nbytes, dtype='u1').tobytes()
+
+    with compression.ParallelGzipFile(tmp_path / 'data.gz', 3, blocksize=1024) as fobj:
+        # Writes straddling block boundaries
+        for start in range(0, nbytes, 700):
+            fobj.write(data[start : start + 700])
+        assert fobj.tell() == nbytes
+
+    assert gzip.decompress((tmp_path / 'data.gz').read_bytes()) == data
+
+
+def test_to_filename(tmp_path):
+    rng = np.random.default_rng(1819)
+    img = nb.Nifti1Image(rng.normal(1000, 50, size=(20, 22, 16, 5)).astype('f4'), np.eye(4))
+
+    compression.to_filename(img, tmp_path / 'parallel.nii.gz', nthreads=4)
+    img.to_filename(tmp_path / 'serial.nii.gz')
+
+    with gzip.open(tmp_path / 'parallel.nii.gz') as fobj:
+        parallel = fobj.read()
+    with gzip.open(tmp_path / 'serial.nii.gz') as fobj:
+        assert parallel == fobj.read()
+
+
+@pytest.mark.parametrize('check_hdr', [False, True])
+def test_DerivativesDataSink_threads(tmp_path, check_hdr):
+    rng = np.random.default_rng(2021)
+    in_file = tmp_path / 'bold.nii'
+    nb.Nifti1Image(rng.normal(1000, 50, size=(10, 11, 12, 5)).astype('f4'), np.eye(4)).to_filename(
+        in_file
+    )
+
+    outputs = []
+    for num_threads in (1, 4):
+        dds = DerivativesDataSink(
+            base_directory=str(tmp_path / f'threads-{num_threads}'),
+            source_file='sub-01/func/sub-01_task-rest_bold.nii.gz',
+            in_file=str(in_file),
+            desc='preproc',
+            compress=True,
+            check_hdr=check_hdr,
+            num_threads=num_threads,
+        )
+        out_file = dds.run().outputs.out_file
+        assert 'num_threads' not in dds._metadata
+        with gzip.open(out_file) as fobj:
+            outputs.append(fobj.read())
+
+    assert outputs[0] == outputs[1]
+
+
+def test_DerivativesDataSink_writers(tmp_path, monkeypatch):
+    from niworkflows.interfaces import bids as nwbids
+
+    # The writers replaced in niworkflows must still exist
+    assert all(callable(getattr(nwbids, name, None)) for name in interfaces._NWBIDS_WRITERS)
+
+    calls = []
+
+    def copy_file(src, dst, nthreads):
+        calls.append(nthreads)
+        return compression.copy_file(src, dst, nthreads=nthreads)
+
+    monkeypatch.setitem(interfaces._NWBIDS_WRITERS, '_copy_any', copy_file)
+
+    in_file = tmp_path / 'bold.nii.gz'
+    nb.Nifti1Image(np.zeros((5, 6, 7), dtype='f4'), np.eye(4)).to_filename(in_file)
+    for sink, kwargs in (
+        (DerivativesDataSink, {'num_threads': 3}),
+        (nwbids.DerivativesDataSink, {}),
+    ):
+        sink(
+            base_directory=str(tmp_path / sink.__module__),
+            source_file='sub-01/func/sub-01_task-rest_bold.nii.gz',
+            in_file=str(in_file),
+            desc='preproc',
+            check_hdr=False,
+            **kwargs,
+        ).run()
+
+    # Sinks other than fMRIPrep's keep the original writers
+    assert calls == [3]
+    assert interfaces._sink_threads.get() is None
+
+
+def test_DerivativesDataSink_missing_writers(tmp_path, monkeypatch):
+    from niworkflows.interfaces import bids as nwbids
+
+    # Writers missing from niworkflows are reported, and nothing is replaced
+    original = nwbids._copy_any
+    monkeypatch.setitem(interfaces._NWBIDS_WRITERS, '_renamed_writer', compression.copy_file)
+    assert interfaces._install_writers.__wrapped__() is False
+    assert nwbids._copy_any is original
+
+    # Sinks then fall back to niworkflows' writers
+    def copy_file(*args, **kwargs):
+        raise AssertionError('fMRIPrep writers should not be used')
+
+    monkeypatch.setattr(interfaces, '_install_writers', lambda: False)
+    monkeypatch.setitem(interfaces._NWBIDS_WRITERS, '_copy_any', copy_file)
+    in_file = tmp_path / 'bold.nii.gz'
+    nb.Nifti1Image(np.zeros((5, 6, 7), dtype='f4'), np.eye(4)).to_filename(in_file)
+    result = DerivativesDataSink(
+        base_directory=str(tmp_path),
+        source_file='sub-01/func/sub-01_task-rest_bold.nii.gz',
+        in_file=str(in_file),
+        desc='preproc',
+        check_hdr=False,
+        num_threads=3,
+    ).run()
+    assert nb.load(result.outputs.out_file).shape == (5, 6, 7)
+
+
+def test_copy_file_links(tmp_path):
+    img = nb.Nifti1Image(np.arange(60, dtype='f4').reshape(3, 4, 5), np.eye(4))
+    img.to_filename(tmp_path / 'deterministic.nii.gz')
+    # gzip.open stores the file name and modification time in the header
+    with gzip.open(tmp_path / 'named.nii.gz', 'wb') as fobj:
+        fobj.write(img.to_bytes())
+
+    compression.copy_file(tmp_path / 'deterministic.nii.gz', tmp_path / 'linked.nii.gz')
+    assert (tmp_path / 'linked.nii.gz').samefile(tmp_path / 'deterministic.nii.gz')
+
+    compression.copy_file(tmp_path / 'named.nii.gz', tmp_path / 'copied.nii.gz')
+    assert not (tmp_path / 'copied.nii.gz').samefile(tmp_path / 'named.nii.gz')
+    assert compression._is_deterministic_gzip(tmp_path / 'copied.nii.gz')
+    assert np.array_equal(nb.load(tmp_path / 'copied.nii.gz').get_fdata(), img.get_fdata())
+
+
+def test_DerivativesDataSink_patch_header(tmp_path, monkeypatch):
+    in_file = tmp_path / 'bold.nii'
+    data = np.random.default_rng(2223).normal(size=(10, 11, 12, 5)).astype('f4')
+    nb.Nifti1Image(data, np.eye(4)).to_filename(in_file)
+    orig_bytes = in_file.read_bytes()
+
+    def rewrite(*args, **kwargs):
+        raise AssertionError('Data should not be rewritten')
+
+    monkeypatch.setattr('niworkflows.utils.images.unsafe_write_nifti_header_and_data', rewrite)
+
+    dds = DerivativesDataSink(
+        base_directory=str(tmp_path),
+        source_file='sub-01/func/sub-01_task-rest_bold.nii.gz',
+        in_file=str(in_file),
+        desc='preproc',
+        compress=False,
+    )
+    results = dds.run().outputs
+    assert results.fixed_hdr == [True]
+
+    out_img = nb.load(results.out_file)
+    assert out_img.header.get_xyzt_units() == ('mm', 'sec')
+    assert (int(out_img.header['qform_code']), int(out_img.header['sform_code'])) == (1, 1)
+    assert np.array_equal(out_img.get_fdata(dtype='f4'), data)
+    # The input is left untouched
+    assert in_file.read_bytes() == orig_bytes
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from scipy import linalg
+
+from fmriprep.utils import confounds
+
+
+@pytest.mark.parametrize('shape', [(30, 400), (30, 10)])
+def test_gram_svd(shape):
+    M = np.random.default_rng(2627).normal(size=shape).astype('f4')
+    M -= M.mean(axis=0)  # Rank-deficient, as after CompCor's filtering
+
+    u, s = confounds.gram_svd(M)
+    u_ref, s_ref, _ = np.linalg.svd(M.astype('f8'), full_matrices=False)
+    assert u.shape == u_ref.shape
+    assert np.allclose(s, s_ref, atol=1e-5)
+
+    # Retained subspaces match, and signs are deterministic
+    rank = np.count_nonzero(s)
+    assert rank == min(shape) - (shape[1] >= shape[0])
+    assert np.allclose(np.abs(u[:, :rank].T @ u_ref[:, :rank]), np.eye(rank), atol=1e-6)
+    assert np.all(u[np.abs(u).argmax(axis=0), np.arange(u.shape[1])] >= 0)
+
+
+def test_gram_svd_fallback(monkeypatch):
+    M = np.random.default_rng(2829).normal(size=(20, 100))
+    expected = confounds.gram_svd(M)
+
+    def eigh(*args, **kwargs):
+        raise linalg.LinAlgError('Eigenvalues did not converge')
+
+    monkeypatch.setattr(linalg, 'eigh', eigh)
+    u, s = confounds.gram_svd(M)
+    assert np.allclose(s, expected[1])
+    assert np.allclose(u, expected[0])
+
+    with pytest.raises(ValueError, match='non-finite'):
+        confounds.gram_svd(np.full((20, 100), np.nan))
+
+
+def test_dvars_blocks():
+    rng = np.random.default_rng(3031)
+    func = rng.normal(1000, 20, size=(9, 10, 11, 30)).astype('f4')
+    func[2, 3, 4] = 1000  # Zero-variance voxel
+    mask = np.zeros(func.shape[:3], dtype=bool)
+    mask[1:-1, 1:-1, 1:-1] = True
+
+    expected = confounds.dvars(func, mask)
+    blocked = confounds.dvars(func, mask, block_size=7)
+    assert np.array_equal(blocked[0], expected[0])
+    assert np.array_equal(blocked[1], expected[1])
+    # The input series is not modified
+    assert np.all(func[2, 3, 4] == 1000)
+
+
+@pytest.mark.parametrize('is_aseg', [False, True])
+def test_acompcor_masks(tmp_path, is_aseg):
+    import nibabel as nb
+    from scipy.ndimage import binary_dilation
+    from skimage.morphology import ball
+
+    # A compact GM blob, with CSF on one side and WM everywhere else
+    ijk = np.indices((20, 21, 22))
+    radius = np.sqrt(np.sum((ijk - np.array([10, 10, 11])[:, None, None, None]) ** 2, axis=0))
+    labels = np.where(radius <= 3, 0, np.where(ijk[0] < 4, 2, 1))
+    gm, wm, csf = (labels == label for label in range(3))
+    if not is_aseg:
+        # Partial volumes, with some WM within the GM blob
+        gm, wm, csf = 0.8 * gm, wm + 0.2 * gm, csf.astype('f4')
+    in_files = []
+    for name, data in zip(('gm', 'wm', 'csf'), (gm, wm, csf), strict=True):
+        in_files.append(str(tmp_path / f'{name}.nii.gz'))
+        nb.Nifti1Image(data.astype('f4'), np.eye(4)).to_filename(in_files[-1])
+
+    csf_file, wm_file, combined_file = confounds.acompcor_masks(
+        in_files, is_aseg=is_aseg, zooms=(2.0, 2.0, 2.0), out_dir=tmp_path
+    )
+    assert (csf_file == in_files[2]) is not is_aseg
+
+    # GM is dilated exactly as with a ball of radius 3
+    gm_dilated = binary_dilation(labels == 0, structure=ball(3))
+    assert 0 < gm_dilated.sum() < gm_dilated.size
+    wm_mask = nb.load(wm_file).get_fdata()
+    assert np.all(wm_mask[gm_dilated] == 0)
+    assert np.any(wm_mask[~gm_dilated] > 0)
+    assert np.array_equal(nb.load(combined_file).get_fdata() > 0, ~gm_dilated)
@@ -56,3 +56,29 @@ def test_transforms_found_as_str(tmp_path: Path, xfm: str):
         fieldmap_id='auto_00000',
     )
     assert derivs == {'transforms': {xfm: str(to_find)}}
+
+
+@pytest.mark.parametrize('extensions', [['.txt'], ['.npy'], ['.txt', '.npy']])
+def test_hmc_array_preferred(tmp_path: Path, extensions: list[str]):
+    subject = '0'
+    task = 'rest'
+
+    func_dir = tmp_path.joinpath(f'sub-{subject}', 'func')
+    func_dir.mkdir(parents=True)
+    for ext in extensions:
+        func_dir.joinpath(
+            f'sub-{subject}_task-{task}_from-orig_to-boldref_mode-image_desc-hmc_xfm{ext}'
+        ).touch()
+
+    entities = {
+        'subject': subject,
+        'task': task,
+        'suffix': 'bold',
+        'extension': '.nii.gz',
+    }
+
+    derivs = bids.collect_derivatives(derivatives_dir=tmp_path, entities=entities)
+    expected = func_dir / (
+        f'sub-{subject}_task-{task}_from-orig_to-boldref_mode-image_desc-hmc_xfm{extensions[-1]}'
+    )
+    assert derivs == {'transforms': {'hmc': str(expected)}}
@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import nibabel as nb
+import nitransforms as nt
+import numpy as np
+import pytest
+
+from fmriprep.utils import transforms
+
+
+@pytest.fixture
+def xfm_files(tmp_path: Path):
+    rng = np.random.default_rng(1234)
+    affine = np.eye(4)
+    affine[:3, 3] = rng.normal(0, 2, size=3)
+    nt.linear.Affine(affine).to_filename(tmp_path / 'boldref2anat.txt', fmt='itk')
+
+    hmc = np.tile(np.eye(4), (5, 1, 1))
+    hmc[:, :3, 3] = rng.normal(0, 0.5, size=(5, 3))
+    nt.linear.LinearTransformsMapping(hmc).to_filename(tmp_path / 'hmc.txt', fmt='itk')
+    return tmp_path
+
+
+@pytest.mark.parametrize('inverse', [False, True])
+def test_load_transforms_cache(tmp_path: Path, xfm_files: Path, inverse: bool):
+    xfm_paths = [xfm_files / 'hmc.txt', xfm_files / 'boldref2anat.txt']
+    cache_dir = tmp_path / 'cache'
+
+    expected = transforms.load_transforms(xfm_paths, [False, inverse])
+    parsed = transforms.load_transforms(xfm_paths, [False, inverse], cache_dir=cache_dir)
+    assert len(list(cache_dir.glob('*.npz'))) == 2
+
+    # Parsed transforms are reused, and not extended by later compositions
+    assert transforms.load_transform(xfm_paths[0]) is transforms.load_transform(xfm_paths[0])
+    assert len(parsed.transforms) == len(expected.transforms) == 2
+
+    # A new process would load from the binary cache
+    transforms.clear_cache()
+    reloaded = transforms.load_transforms(xfm_paths, [False, inverse], cache_dir=cache_dir)
+
+    points = np.random.default_rng(5678).normal(0, 50, size=(10, 3))
+    for xfm in (parsed, reloaded):
+        for volume, expected_volume in zip(xfm.transforms, expected.transforms, strict=True):
+            assert np.allclose(volume.matrix, expected_volume.matrix)
+        assert np.allclose(xfm.map(points), expected.map(points))
+
+
+def test_cached_dense_field(tmp_path: Path):
+    rng = np.random.default_rng(91011)
+    deltas = nb.Nifti1Image(rng.normal(0, 2, size=(10, 11, 12, 3)), np.eye(4))
+    chain = nt.TransformChain(
+        [nt.linear.Affine(np.diag([1.0, 1.0, 1.0, 1.0])), nt.nonlinear.DenseFieldTransform(deltas)]
+    )
+
+    transforms._write_transform(tmp_path / 'chain.npz', chain)
+    reloaded = transforms._read_transform(tmp_path / 'chain.npz')
+
+    points = rng.uniform(2, 8, size=(20, 3))
+    assert isinstance(reloaded, nt.TransformChain)
+    # Fields are stored at full precision, so mapping does not depend on the cache
+    assert np.array_equal(reloaded.map(points), chain.map(points))
+
+
+def test_load_transform_cache_bytes(xfm_files: Path, monkeypatch):
+    transforms.clear_cache()
+    first = transforms.load_transform(xfm_files / 'boldref2anat.txt')
+    assert transforms.load_transform(xfm_files / 'boldref2anat.txt') is first
+
+    # Transforms larger than the bound are not kept
+    monkeypatch.setattr(transforms, 'CACHE_MAX_BYTES', 200)
+    transforms.clear_cache()
+    hmc = transforms.load_transform(xfm_files / 'hmc.txt')  # 5 x 4 x 4 float64
+    assert transforms.load_transform(xfm_files / 'hmc.txt') is not hmc
+
+    # The least recently used transform is dropped to make room
+    first = transforms.load_transform(xfm_files / 'boldref2anat.txt')
+    second = transforms.load_transform(xfm_files / 'boldref2anat.txt', inverse=True)
+    assert transforms.load_transform(xfm_files / 'boldref2anat.txt', inverse=True) is second
+    assert transforms.load_transform(xfm_files / 'boldref2anat.txt') is not first
+    transforms.clear_cache()
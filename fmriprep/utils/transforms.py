@@ -1,14 +1,29 @@
 """Utilities for loading transforms for resampling"""
 
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
+import nibabel as nb
 import nitransforms as nt
+import numpy as np
 
 
-def load_transforms(xfm_paths: list[Path], inverse: list[bool]) -> nt.base.TransformBase:
+def load_transforms(
+    xfm_paths: list[Path],
+    inverse: list[bool],
+    cache_dir: str | os.PathLike | None = None,
+) -> nt.base.TransformBase:
     """Load a series of transforms as a nitransforms TransformChain
 
-    An empty list will return an identity transform
+    An empty list will return an identity transform.
+    Series of affines stored as ``.npy`` arrays (see
+    :class:`~fmriprep.interfaces.nitransforms.AffinesToArray`) are
+    accepted in place of ITK text files.
+    Transform files are parsed through :func:`load_transform`, so files
+    loaded before by the same process (or stored in ``cache_dir``) are reused.
     """
     if len(inverse) == 1:
         inverse *= len(xfm_paths)
@@ -17,14 +32,10 @@ def load_transforms(xfm_paths: list[Path], inverse: list[bool]) -> nt.base.Trans
 
     chain = None
     for path, inv in zip(xfm_paths[::-1], inverse[::-1], strict=False):
-        path = Path(path)
-        if path.suffix == '.h5':
-            # Load as a TransformChain
-            xfm = nt.manip.load(path, fmt='h5')
-        else:
-            xfm = nt.linear.load(path)
-        if inv:
-            xfm = ~xfm
+        xfm = load_transform(path, inv, cache_dir=cache_dir)
+        if isinstance(xfm, nt.TransformChain):
+            # Chains are extended in place, so do not modify the cached one
+            xfm = nt.TransformChain(list(xfm.transforms))
         if chain is None:
             chain = xfm
         else:
@@ -32,3 +43,163 @@ def load_transforms(xfm_paths: list[Path], inverse: list[bool]) -> nt.base.Trans
     if chain is None:
         chain = nt.Affine()  # Identity
     return chain
+
+
+def load_transform(
+    path: str | os.PathLike,
+    inverse: bool = False,
+    cache_dir: str | os.PathLike | None = None,
+) -> nt.base.TransformBase:
+    """Load a single transform file
+
+    Parsed transforms are kept in a process-level LRU cache, keyed by path,
+    modification time and inversion, so that a file is parsed only once per
+    process unless it changes. The cache holds at most :data:`CACHE_MAX_BYTES`
+    of transform arrays, so long-lived workers do not accumulate dense fields.
+    If ``cache_dir`` is provided, parsed transforms are also stored there in a
+    binary format that is much faster to read than ITK text or HDF5 files,
+    and reused by other processes.
+    The returned transform is shared by later calls and must not be modified.
+    """
+    path = Path(path).absolute()
+    stat = path.stat()
+    key = (
+        str(path),
+        stat.st_mtime_ns,
+        stat.st_size,
+        bool(inverse),
+        None if cache_dir is None else str(cache_dir),
+    )
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key][0]
+
+    xfm = _load_transform(*key)
+    nbytes = _transform_nbytes(xfm)
+    if nbytes <= CACHE_MAX_BYTES:
+        with _cache_lock:
+            _cache[key] = (xfm, nbytes)
+            while sum(size for _, size in _cache.values()) > CACHE_MAX_BYTES:
+                _cache.popitem(last=False)
+    return xfm
+
+
+#: Maximum size (in bytes) of the arrays of the transforms kept by :func:`load_transform`
+CACHE_MAX_BYTES = 256 * 1024**2
+
+_cache: OrderedDict[tuple, tuple[nt.base.TransformBase, int]] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def clear_cache() -> None:
+    """Drop all the transforms kept in memory by :func:`load_transform`"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def _transform_nbytes(xfm: nt.base.TransformBase) -> int:
+    """Size of the arrays held by a transform or chain"""
+    xfms = xfm.transforms if isinstance(xfm, nt.TransformChain) else [xfm]
+    nbytes = 0
+    for component in xfms:
+        if isinstance(component, nt.nonlinear.DenseFieldTransform):
+            nbytes += np.asanyarray(component._field).nbytes
+        elif isinstance(component, nt.linear.Affine):
+            nbytes += np.asanyarray(component.matrix).nbytes
+    return nbytes
+
+
+def _load_transform(
+    path: str,
+    mtime_ns: int,
+    size: int,
+    inverse: bool,
+    cache_dir: str | None,
+) -> nt.base.TransformBase:
+    # ``mtime_ns`` and ``size`` are unused, but invalidate the entry if the file changes
+    if path.endswith('.npy'):
+        # N x 4 x 4 RAS-to-RAS affines, already in binary form
+        xfm = nt.linear.LinearTransformsMapping(np.load(path, mmap_mode='r'))
+        return ~xfm if inverse else xfm
+
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = Path(cache_dir) / f'{fingerprint_transforms([path], [False])}.npz'
+
+    if cache_file is not None and cache_file.exists():
+        xfm = _read_transform(cache_file)
+    else:
+        if path.endswith('.h5'):
+            # Load as a TransformChain
+            xfm = nt.manip.load(path, fmt='h5')
+        else:
+            xfm = nt.linear.load(path)
+        if cache_file is not None:
+            _write_transform(cache_file, xfm)
+
+    return ~xfm if inverse else xfm
+
+
+def _write_transform(cache_file: Path, xfm: nt.base.TransformBase) -> None:
+    """Store a parsed transform as a set of arrays
+
+    Affines, series of affines and dense fields are supported. Transforms that
+    cannot be stored faithfully (e.g., affines defined on a reference grid) are
+    not written, and will be parsed from the original file.
+    """
+    xfms = xfm.transforms if isinstance(xfm, nt.TransformChain) else [xfm]
+    arrays = {}
+    for idx, component in enumerate(xfms):
+        if isinstance(component, nt.nonlinear.DenseFieldTransform):
+            # Deformations (not deltas), so no coordinates need to be added on load.
+            # Precision is kept, so processes reading the file map as the parsing one
+            arrays[f'field{idx}'] = np.asanyarray(component._field)
+            arrays[f'affine{idx}'] = component.reference.affine
+        elif isinstance(component, nt.linear.Affine) and component.reference is None:
+            key = (
+                'mapping' if isinstance(component, nt.linear.LinearTransformsMapping) else 'matrix'
+            )
+            arrays[f'{key}{idx}'] = component.matrix
+        else:
+            return
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(f'.{os.getpid()}.npz')
+    np.savez(tmp_file, chain=isinstance(xfm, nt.TransformChain), length=len(xfms), **arrays)
+    os.replace(tmp_file, cache_file)
+
+
+def _read_transform(cache_file: Path) -> nt.base.TransformBase:
+    """Load a transform stored by :func:`_write_transform`"""
+    xfms = []
+    with np.load(cache_file) as arrays:
+        for idx in range(int(arrays['length'])):
+            if f'field{idx}' in arrays:
+                field = nb.Nifti1Image(arrays[f'field{idx}'], arrays[f'affine{idx}'])
+                xfms.append(nt.nonlinear.DenseFieldTransform(field, is_deltas=False))
+            elif f'mapping{idx}' in arrays:
+                xfms.append(nt.linear.LinearTransformsMapping(arrays[f'mapping{idx}']))
+            else:
+                xfms.append(nt.linear.Affine(arrays[f'matrix{idx}']))
+        chain = bool(arrays['chain'])
+    return nt.TransformChain(xfms) if chain else xfms[0]
+
+
+def fingerprint_transforms(xfm_paths: list[Path], inverse: list[bool]) -> str:
+    """Identify a series of transform files by path, modification time and inversion
+
+    Returns a hex digest that changes whenever any of the files is replaced or
+    modified, suitable to key caches of values derived from the transforms.
+    """
+    if len(inverse) == 1:
+        inverse = inverse * len(xfm_paths)
+    elif len(inverse) != len(xfm_paths):
+        raise ValueError('Mismatched number of transforms and inverses')
+
+    digest = hashlib.sha256()
+    for path, inv in zip(xfm_paths, inverse, strict=True):
+        path = Path(path).absolute()
+        stat = path.stat()
+        digest.update(f'{path}:{stat.st_mtime_ns}:{stat.st_size}:{bool(inv)}\n'.encode())
+    return digest.hexdigest()
@@ -19,6 +19,14 @@ def init_bold_volumetric_resample_wf(
     jacobian: bool,
     fallback_total_readout_time: str | float | None = None,
     fieldmap_id: str | None = None,
+    prefiltered: bool = False,
+    mask_dilation: int | None = None,
+    coords_cache_dir: str | None = None,
+    transforms_cache_dir: str | None = None,
+    fmap_cache_dir: str | None = None,
+    work_compression: str = 'default',
+    max_volumes: int = 50,
+    output_series: bool = True,
     omp_nthreads: int = 1,
     name: str = 'bold_volumetric_resample_wf',
 ) -> pe.Workflow:
@@ -48,6 +56,33 @@ def init_bold_volumetric_resample_wf(
         BIDS metadata for BOLD file.
     fieldmap_id
         Fieldmap identifier, if fieldmap correction is to be applied.
+    prefiltered
+        Whether to resample ``bold_coeffs``, the B-spline coefficients of
+        ``bold_file``, without spline prefiltering.
+    mask_dilation
+        If set, only the voxels within ``target_mask``, dilated by this number
+        of voxels, are resampled. Voxels outside the dilated mask are set to zero.
+    coords_cache_dir
+        Directory to cache the target grid mapped through ``anat2std_xfm``,
+        so that it is only computed once for all BOLD runs of a subject.
+    transforms_cache_dir
+        Directory to store parsed transforms, so that large warps are
+        only parsed once across processes.
+    fmap_cache_dir
+        Directory to cache reconstructed fieldmaps, so that a fieldmap is only
+        reconstructed once per target grid across output spaces and BOLD runs.
+    work_compression
+        Compression of the resampled series in the working directory
+        (``none``, ``fast`` or ``default``, see ``--work-compression``).
+    max_volumes
+        Maximum number of volumes to load and resample at a time, so that memory
+        use does not grow with the length of the series. If zero, the full series
+        is loaded into memory.
+    output_series
+        Whether to resample the BOLD series. If ``False``, only the resampling
+        reference, transforms and fieldmap are produced, for consumers that
+        sample the BOLD series directly (see
+        :class:`~fmriprep.interfaces.resampling.ResampleSeriesRibbon`).
     omp_nthreads
         Maximum number of threads an individual process may use.
     name
@@ -57,6 +92,10 @@ def init_bold_volumetric_resample_wf(
     ------
     bold_file
         BOLD series to resample.
+    bold_coeffs
+        B-spline coefficients of ``bold_file``, as produced by
+        :class:`~fmriprep.interfaces.resampling.SplineFilterSeries`.
+        Resampled in place of ``bold_file`` if ``prefiltered`` is set.
     bold_ref_file
         Reference image to which BOLD series is aligned.
     target_ref_file
@@ -88,6 +127,16 @@ def init_bold_volumetric_resample_wf(
     resampling_reference
         An empty reference image with the correct affine and header for resampling
         further images into the BOLD series' space.
+    transforms
+        Transforms from ``bold_file`` to ``resampling_reference``,
+        head-motion transforms first.
+    fieldmap
+        The fieldmap (in Hz) reconstructed on ``resampling_reference``,
+        if fieldmap correction is applied.
+    ro_time
+        The readout time of ``bold_file``, if fieldmap correction is applied.
+    pe_dir
+        The phase-encoding direction of ``bold_file``, if fieldmap correction is applied.
 
     """
     workflow = pe.Workflow(name=name)
@@ -96,6 +145,7 @@ def init_bold_volumetric_resample_wf(
         niu.IdentityInterface(
             fields=[
                 'bold_file',
+                'bold_coeffs',
                 'bold_ref_file',
                 'target_ref_file',
                 'target_mask',
@@ -118,7 +168,16 @@ def init_bold_volumetric_resample_wf(
     )
 
     outputnode = pe.Node(
-        niu.IdentityInterface(fields=['bold_file', 'resampling_reference']),
+        niu.IdentityInterface(
+            fields=[
+                'bold_file',
+                'resampling_reference',
+                'transforms',
+                'fieldmap',
+                'ro_time',
+                'pe_dir',
+            ],
+        ),
         name='outputnode',
     )
 
@@ -127,7 +186,12 @@ def init_bold_volumetric_resample_wf(
     boldref2target = pe.Node(niu.Merge(2), name='boldref2target', run_without_submitting=True)
     bold2target = pe.Node(niu.Merge(2), name='bold2target', run_without_submitting=True)
     resample = pe.Node(
-        ResampleSeries(jacobian=jacobian),
+        ResampleSeries(
+            jacobian=jacobian,
+            prefilter=not prefiltered,
+            work_compression=work_compression,
+            max_volumes=max_volumes,
+        ),
         name='resample',
         n_procs=omp_nthreads,
         mem_gb=mem_gb['resampled'],
@@ -145,14 +209,28 @@ def init_bold_volumetric_resample_wf(
             ('anat2std_xfm', 'in2'),
         ]),
         (inputnode, bold2target, [('motion_xfm', 'in1')]),
-        (inputnode, resample, [('bold_file', 'in_file')]),
-        (gen_ref, resample, [('out_file', 'ref_file')]),
         (boldref2target, bold2target, [('out', 'in2')]),
-        (bold2target, resample, [('out', 'transforms')]),
         (gen_ref, outputnode, [('out_file', 'resampling_reference')]),
-        (resample, outputnode, [('out_file', 'bold_file')]),
+        (bold2target, outputnode, [('out', 'transforms')]),
     ])  # fmt:skip
 
+    if output_series:
+        workflow.connect([
+            (inputnode, resample, [('bold_coeffs' if prefiltered else 'bold_file', 'in_file')]),
+            (gen_ref, resample, [('out_file', 'ref_file')]),
+            (bold2target, resample, [('out', 'transforms')]),
+            (resample, outputnode, [('out_file', 'bold_file')]),
+        ])  # fmt:skip
+
+    if coords_cache_dir:
+        resample.inputs.coords_cache_dir = coords_cache_dir
+    if transforms_cache_dir:
+        resample.inputs.transforms_cache_dir = transforms_cache_dir
+
+    if mask_dilation is not None and output_series:
+        resample.inputs.mask_dilation = mask_dilation
+        workflow.connect([(inputnode, resample, [('target_mask', 'ref_mask')])])
+
     if not fieldmap_id:
         return workflow
 
@@ -177,6 +255,10 @@ def init_bold_volumetric_resample_wf(
     )
 
     fmap_recon = pe.Node(ReconstructFieldmap(), name='fmap_recon', mem_gb=1)
+    if transforms_cache_dir:
+        fmap_recon.inputs.transforms_cache_dir = transforms_cache_dir
+    if fmap_cache_dir:
+        fmap_recon.inputs.fmap_cache_dir = fmap_cache_dir
 
     workflow.connect([
         (inputnode, fmap_select, [
@@ -195,14 +277,23 @@ def init_bold_volumetric_resample_wf(
         ]),
         (fmap2target, fmap_recon, [('out', 'transforms')]),
         (inverses, fmap_recon, [('out', 'inverse')]),
-        # Inject fieldmap correction into resample node
-        (distortion_params, resample, [
+        (distortion_params, outputnode, [
             ('readout_time', 'ro_time'),
             ('pe_direction', 'pe_dir'),
         ]),
-        (fmap_recon, resample, [('out_file', 'fieldmap')]),
+        (fmap_recon, outputnode, [('out_file', 'fieldmap')]),
     ])  # fmt:skip
 
+    if output_series:
+        # Inject fieldmap correction into resample node
+        workflow.connect([
+            (distortion_params, resample, [
+                ('readout_time', 'ro_time'),
+                ('pe_direction', 'pe_dir'),
+            ]),
+            (fmap_recon, resample, [('out_file', 'fieldmap')]),
+        ])  # fmt:skip
+
     return workflow
 
 
@@ -382,6 +382,23 @@ configured with cubic B-spline interpolation.
     )
     merge_bold_sources.inputs.in1 = bold_series
 
+    # The T1w-space series is only needed for T1w outputs, goodvoxels and FreeSurfer surfaces.
+    # Otherwise, surfaces sample the native series directly, through its transforms
+    anat_series = bool(
+        nonstd_spaces.intersection(('anat', 'T1w'))
+        or (config.workflow.project_goodvoxels and (config.workflow.cifti_output or surf_std))
+        or (config.workflow.run_reconall and freesurfer_spaces)
+    )
+    # Unless it is an output, the T1w-space series is only sampled within the cortical ribbon,
+    # so resampling can be restricted to a margin around the brain mask.
+    # The goodvoxels mask derivative is calculated from this series too, so it is only
+    # restricted if requested.
+    mask_dilation = config.workflow.resample_mask_dilation
+    goodvoxels = config.workflow.project_goodvoxels and (config.workflow.cifti_output or surf_std)
+    anat_mask_dilation = None
+    if not nonstd_spaces.intersection(('anat', 'T1w')):
+        anat_mask_dilation = 2 if mask_dilation is None and not goodvoxels else mask_dilation
+
     # Resample to anatomical space
     bold_anat_wf = init_bold_volumetric_resample_wf(
         metadata=all_metadata[0],
@@ -390,6 +407,12 @@ configured with cubic B-spline interpolation.
         omp_nthreads=omp_nthreads,
         mem_gb=mem_gb,
         jacobian=jacobian,
+        prefiltered=True,
+        transforms_cache_dir=str(config.execution.work_dir / 'transforms_cache'),
+        fmap_cache_dir=str(config.execution.work_dir / 'fmap_cache'),
+        work_compression=config.execution.work_compression,
+        mask_dilation=anat_mask_dilation,
+        output_series=anat_series,
         name='bold_anat_wf',
     )
     bold_anat_wf.inputs.inputnode.resolution = 'native'
@@ -409,11 +432,26 @@ configured with cubic B-spline interpolation.
         ]),
         (bold_native_wf, bold_anat_wf, [
             ('outputnode.bold_minimal', 'inputnode.bold_file'),
+            ('outputnode.bold_coeffs', 'inputnode.bold_coeffs'),
             ('outputnode.motion_xfm', 'inputnode.motion_xfm'),
         ]),
         (bold_fit_wf, merge_bold_sources, [('outputnode.coreg_boldref', 'in2')]),
     ])  # fmt:skip
 
+    if anat_series:
+        surface_sources = [(bold_anat_wf, [('outputnode.bold_file', 'inputnode.bold_file')])]
+    else:
+        surface_sources = [
+            (bold_native_wf, [('outputnode.bold_coeffs', 'inputnode.bold_file')]),
+            (bold_anat_wf, [
+                ('outputnode.resampling_reference', 'inputnode.resampling_reference'),
+                ('outputnode.transforms', 'inputnode.bold_transforms'),
+                ('outputnode.fieldmap', 'inputnode.fieldmap'),
+                ('outputnode.ro_time', 'inputnode.ro_time'),
+                ('outputnode.pe_dir', 'inputnode.pe_dir'),
+            ]),
+        ]  # fmt:skip
+
     # Full derivatives, including resampled BOLD series
     if nonstd_spaces.intersection(('anat', 'T1w')):
         ds_bold_t1_wf = init_ds_volumes_wf(
@@ -452,6 +490,12 @@ configured with cubic B-spline interpolation.
             omp_nthreads=omp_nthreads,
             mem_gb=mem_gb,
             jacobian=jacobian,
+            prefiltered=True,
+            coords_cache_dir=str(config.execution.work_dir / 'coords_cache'),
+            transforms_cache_dir=str(config.execution.work_dir / 'transforms_cache'),
+            fmap_cache_dir=str(config.execution.work_dir / 'fmap_cache'),
+            work_compression=config.execution.work_compression,
+            mask_dilation=mask_dilation,
             name='bold_std_wf',
         )
         ds_bold_std_wf = init_ds_volumes_wf(
@@ -480,6 +524,7 @@ configured with cubic B-spline interpolation.
             ]),
             (bold_native_wf, bold_std_wf, [
                 ('outputnode.bold_minimal', 'inputnode.bold_file'),
+                ('outputnode.bold_coeffs', 'inputnode.bold_coeffs'),
                 ('outputnode.motion_xfm', 'inputnode.motion_xfm'),
             ]),
             (inputnode, ds_bold_std_wf, [
@@ -592,6 +637,13 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
             omp_nthreads=omp_nthreads,
             mem_gb=mem_gb,
             jacobian=jacobian,
+            prefiltered=True,
+            coords_cache_dir=str(config.execution.work_dir / 'coords_cache'),
+            transforms_cache_dir=str(config.execution.work_dir / 'transforms_cache'),
+            fmap_cache_dir=str(config.execution.work_dir / 'fmap_cache'),
+            work_compression=config.execution.work_compression,
+            # Only the subcortical grayordinates are resampled, by bold_grayords_wf
+            output_series=False,
             name='bold_MNI6_wf',
         )
 
@@ -599,6 +651,8 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
             grayord_density=config.workflow.cifti_output,
             omp_nthreads=omp_nthreads,
             mem_gb=mem_gb['resampled'],
+            sample_native=not anat_series,
+            jacobian=jacobian,
         )
 
         if config.workflow.project_goodvoxels:
@@ -612,6 +666,8 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
             grayord_density=config.workflow.cifti_output,
             mem_gb=1,
             repetition_time=all_metadata[0]['RepetitionTime'],
+            jacobian=jacobian,
+            omp_nthreads=omp_nthreads,
         )
 
         ds_bold_cifti = pe.Node(
@@ -631,7 +687,7 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
         ds_bold_cifti.inputs.source_file = bold_file
 
         workflow.connect([
-            # Resample BOLD to MNI152NLin6Asym, may duplicate bold_std_wf above
+            # Collect MNI152NLin6Asym transforms; only grayordinates are resampled
             (inputnode, bold_MNI6_wf, [
                 ('mni6_mask', 'inputnode.target_ref_file'),
                 ('mni6_mask', 'inputnode.target_mask'),
@@ -647,6 +703,7 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
             ]),
             (bold_native_wf, bold_MNI6_wf, [
                 ('outputnode.bold_minimal', 'inputnode.bold_file'),
+                ('outputnode.bold_coeffs', 'inputnode.bold_coeffs'),
                 ('outputnode.motion_xfm', 'inputnode.motion_xfm'),
             ]),
             # Resample T1w-space BOLD to fsLR surfaces
@@ -658,11 +715,14 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
                 ('sphere_reg_fsLR', 'inputnode.sphere_reg_fsLR'),
                 ('cortex_mask', 'inputnode.cortex_mask'),
             ]),
-            (bold_anat_wf, bold_fsLR_resampling_wf, [
-                ('outputnode.bold_file', 'inputnode.bold_file'),
+            (bold_native_wf, bold_grayords_wf, [
+                ('outputnode.bold_coeffs', 'inputnode.bold_coeffs'),
             ]),
             (bold_MNI6_wf, bold_grayords_wf, [
-                ('outputnode.bold_file', 'inputnode.bold_std'),
+                ('outputnode.transforms', 'inputnode.bold_transforms'),
+                ('outputnode.fieldmap', 'inputnode.fieldmap'),
+                ('outputnode.ro_time', 'inputnode.ro_time'),
+                ('outputnode.pe_dir', 'inputnode.pe_dir'),
             ]),
             (bold_fsLR_resampling_wf, bold_grayords_wf, [
                 ('outputnode.bold_fsLR', 'inputnode.bold_fsLR'),
@@ -672,6 +732,10 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
                 (('outputnode.cifti_metadata', _read_json), 'meta_dict'),
             ]),
         ])  # fmt:skip
+        workflow.connect([
+            (source, bold_fsLR_resampling_wf, connections)
+            for source, connections in surface_sources
+        ])  # fmt:skip
 
         if surf_std:
             from smriprep.workflows.surfaces import init_resample_surfaces_wf
@@ -690,6 +754,8 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
                 omp_nthreads=omp_nthreads,
                 mem_gb=mem_gb['resampled'],
                 dilate=True,
+                sample_native=not anat_series,
+                jacobian=jacobian,
             )
             workflow.connect([
                 (inputnode, wb_vol_surf_wf,[
@@ -697,9 +763,10 @@ Non-gridded (surface) resamplings were performed using `mri_vol2surf`
                     ('pial', 'inputnode.pial'),
                     ('midthickness', 'inputnode.midthickness'),
                 ]),
-                (bold_anat_wf, wb_vol_surf_wf, [
-                    ('outputnode.bold_file', 'inputnode.bold_file'),
-                ]),
+            ])  # fmt:skip
+            workflow.connect([
+                (source, wb_vol_surf_wf, connections)
+                for source, connections in surface_sources
             ])  # fmt:skip
 
             if config.workflow.project_goodvoxels:
@@ -28,20 +28,19 @@ Calculate BOLD confounds
 
 """
 
-from nipype.algorithms import confounds as nac
 from nipype.interfaces import utility as niu
 from nipype.pipeline import engine as pe
 from templateflow.api import get as get_template
 
+from ... import config
 from ...config import DEFAULT_MEMORY_MIN_GB
 from ...interfaces import DerivativesDataSink
 from ...interfaces.confounds import (
+    ComputeConfounds,
     FilterDropped,
     FMRISummary,
-    FramewiseDisplacement,
-    FSLMotionParams,
-    FSLRMSDeviation,
     GatherConfounds,
+    MotionMetrics,
     RenameACompCor,
 )
 from ...utils.bids import dismiss_echo
@@ -158,13 +157,10 @@ def init_bold_confs_wf(
     from niworkflows.engine.workflows import LiterateWorkflow as Workflow
     from niworkflows.interfaces.confounds import ExpandModel, SpikeRegressors
     from niworkflows.interfaces.fixes import FixHeaderApplyTransforms as ApplyTransforms
-    from niworkflows.interfaces.images import SignalExtraction
     from niworkflows.interfaces.morphology import BinaryDilation, BinarySubtraction
     from niworkflows.interfaces.nibabel import ApplyMask, Binarize
-    from niworkflows.interfaces.patches import RobustACompCor as ACompCor
-    from niworkflows.interfaces.patches import RobustTCompCor as TCompCor
     from niworkflows.interfaces.reportlets.masks import ROIsPlot
-    from niworkflows.interfaces.utility import TSV2JSON, AddTSVHeader, DictMerge
+    from niworkflows.interfaces.utility import TSV2JSON, DictMerge
 
     from ...interfaces.confounds import aCompCorMasks
 
@@ -254,27 +250,24 @@ the edge of the brain, as proposed by [@patriat_improved_2017].
         name='t1w_mask_tfm',
     )
     union_mask = pe.Node(niu.Function(function=_binary_union), name='union_mask')
+    union_mask.inputs.work_compression = config.execution.work_compression
 
     # Create the crown mask
     dilated_mask = pe.Node(BinaryDilation(), name='dilated_mask')
     subtract_mask = pe.Node(BinarySubtraction(), name='subtract_mask')
 
-    # DVARS
-    dvars = pe.Node(
-        nac.ComputeDVARS(save_nstd=True, save_std=True, remove_zerovariance=True),
-        name='dvars',
-        mem_gb=mem_gb,
-    )
-
-    # Motion parameters
-    motion_params = pe.Node(FSLMotionParams(), name='motion_params')
-
-    # Frame displacement
-    fdisp = pe.Node(FramewiseDisplacement(), name='fdisp')
-    rmsd = pe.Node(FSLRMSDeviation(), name='rmsd')
+    # Motion parameters, RMSD and framewise displacement
+    motion_metrics = pe.Node(MotionMetrics(), name='motion_metrics')
 
     # Generate aCompCor probseg maps
-    acc_masks = pe.Node(aCompCorMasks(is_aseg=freesurfer), name='acc_masks')
+    acc_masks = pe.Node(
+        aCompCorMasks(
+            is_aseg=freesurfer,
+            work_compression=config.execution.work_compression,
+            cache_dir=str(config.execution.work_dir / 'acompcor_cache'),
+        ),
+        name='acc_masks',
+    )
 
     # Resample probseg maps in BOLD space via BOLD-to-T1w transform
     acc_msk_tfm = pe.MapNode(
@@ -285,64 +278,18 @@ the edge of the brain, as proposed by [@patriat_improved_2017].
     )
     acc_msk_brain = pe.MapNode(ApplyMask(), name='acc_msk_brain', iterfield=['in_file'])
     acc_msk_bin = pe.MapNode(Binarize(thresh_low=0.99), name='acc_msk_bin', iterfield=['in_file'])
-    acompcor = pe.Node(
-        ACompCor(
-            components_file='acompcor.tsv',
-            header_prefix='a_comp_cor_',
-            pre_filter='cosine',
-            save_pre_filter=True,
-            save_metadata=True,
-            mask_names=['CSF', 'WM', 'combined'],
-            merge_method='none',
-            failure_mode='NaN',
-        ),
-        name='acompcor',
-        mem_gb=mem_gb,
-    )
-
-    crowncompcor = pe.Node(
-        ACompCor(
-            components_file='crown_compcor.tsv',
-            header_prefix='edge_comp_',
-            pre_filter='cosine',
-            save_pre_filter=True,
-            save_metadata=True,
-            mask_names=['Edge'],
-            merge_method='none',
-            failure_mode='NaN',
-            num_components=24,
-        ),
-        name='crowncompcor',
-        mem_gb=mem_gb,
-    )
 
-    tcompcor = pe.Node(
-        TCompCor(
-            components_file='tcompcor.tsv',
-            header_prefix='t_comp_cor_',
-            pre_filter='cosine',
-            save_pre_filter=True,
-            save_metadata=True,
-            percentile_threshold=0.02,
-            failure_mode='NaN',
+    # DVARS, tissue signals and CompCor, calculated from a single read of the series
+    bold_confounds = pe.Node(
+        ComputeConfounds(
+            all_components=regressors_all_comps,
+            work_compression=config.execution.work_compression,
         ),
-        name='tcompcor',
+        name='bold_confounds',
         mem_gb=mem_gb,
     )
-
-    # Set number of components
-    if regressors_all_comps:
-        acompcor.inputs.num_components = 'all'
-        tcompcor.inputs.num_components = 'all'
-    else:
-        acompcor.inputs.variance_threshold = 0.5
-        tcompcor.inputs.variance_threshold = 0.5
-
-    # Set TR if present
     if 'RepetitionTime' in metadata:
-        tcompcor.inputs.repetition_time = metadata['RepetitionTime']
-        acompcor.inputs.repetition_time = metadata['RepetitionTime']
-        crowncompcor.inputs.repetition_time = metadata['RepetitionTime']
+        bold_confounds.inputs.repetition_time = metadata['RepetitionTime']
 
     # Split aCompCor results into a_comp_cor, c_comp_cor, w_comp_cor
     rename_acompcor = pe.Node(RenameACompCor(), name='rename_acompcor')
@@ -355,26 +302,8 @@ the edge of the brain, as proposed by [@patriat_improved_2017].
         'csf_wm',
         'tcompcor',
     ]
-    merge_rois = pe.Node(
-        niu.Merge(3, ravel_inputs=True), name='merge_rois', run_without_submitting=True
-    )
-    signals = pe.Node(
-        SignalExtraction(class_labels=signals_class_labels), name='signals', mem_gb=mem_gb
-    )
 
     # Arrange confounds
-    add_dvars_header = pe.Node(
-        AddTSVHeader(columns=['dvars']),
-        name='add_dvars_header',
-        mem_gb=0.01,
-        run_without_submitting=True,
-    )
-    add_std_dvars_header = pe.Node(
-        AddTSVHeader(columns=['std_dvars']),
-        name='add_std_dvars_header',
-        mem_gb=0.01,
-        run_without_submitting=True,
-    )
     concat = pe.Node(GatherConfounds(), name='concat', mem_gb=0.01, run_without_submitting=True)
 
     # CompCor metadata
@@ -516,13 +445,11 @@ the edge of the brain, as proposed by [@patriat_improved_2017].
 
     workflow.connect([
         # connect inputnode to each non-anatomical confound node
-        (inputnode, dvars, [('bold', 'in_file'),
-                            ('bold_mask', 'in_mask')]),
-        (inputnode, motion_params, [('motion_xfm', 'xfm_file'),
-                                    ('hmc_boldref', 'boldref_file')]),
-        (inputnode, rmsd, [('motion_xfm', 'xfm_file'),
-                           ('hmc_boldref', 'boldref_file')]),
-        (motion_params, fdisp, [('out_file', 'in_file')]),
+        (inputnode, bold_confounds, [('bold', 'in_file'),
+                                     ('bold_mask', 'in_mask'),
+                                     ('skip_vols', 'skip_vols')]),
+        (inputnode, motion_metrics, [('motion_xfm', 'xfm_file'),
+                                     ('hmc_boldref', 'boldref_file')]),
         # Brain mask
         (inputnode, t1w_mask_tfm, [('t1w_mask', 'input_image'),
                                    ('bold_mask', 'reference_image'),
@@ -533,9 +460,8 @@ the edge of the brain, as proposed by [@patriat_improved_2017].
         (union_mask, subtract_mask, [('out', 'in_subtract')]),
         (dilated_mask, subtract_mask, [('out_mask', 'in_base')]),
         (subtract_mask, outputnode, [('out_mask', 'crown_mask')]),
+        (subtract_mask, bold_confounds, [('out_mask', 'crown_mask')]),
         # aCompCor
-        (inputnode, acompcor, [('bold', 'realigned_file'),
-                               ('skip_vols', 'ignore_initial_volumes')]),
         (inputnode, acc_masks, [('t1w_tpms', 'in_vfs'),
                                 (('bold', _get_zooms), 'bold_zooms')]),
         (inputnode, acc_msk_tfm, [('boldref2anat_xfm', 'transforms'),
@@ -544,46 +470,28 @@ the edge of the brain, as proposed by [@patriat_improved_2017].
         (acc_masks, acc_msk_tfm, [('out_masks', 'input_image')]),
         (acc_msk_tfm, acc_msk_brain, [('output_image', 'in_file')]),
         (acc_msk_brain, acc_msk_bin, [('out_file', 'in_file')]),
-        (acc_msk_bin, acompcor, [('out_file', 'mask_files')]),
-        (acompcor, rename_acompcor, [('components_file', 'components_file'),
-                                     ('metadata_file', 'metadata_file')]),
-
-        # crownCompCor
-        (inputnode, crowncompcor, [('bold', 'realigned_file'),
-                                   ('skip_vols', 'ignore_initial_volumes')]),
-        (subtract_mask, crowncompcor, [('out_mask', 'mask_files')]),
-
-        # tCompCor
-        (inputnode, tcompcor, [('bold', 'realigned_file'),
-                               ('skip_vols', 'ignore_initial_volumes'),
-                               ('bold_mask', 'mask_files')]),
-        # Global signals extraction (constrained by anatomy)
-        (inputnode, signals, [('bold', 'in_file')]),
-        (inputnode, merge_rois, [('bold_mask', 'in1')]),
-        (acc_msk_bin, merge_rois, [('out_file', 'in2')]),
-        (tcompcor, merge_rois, [('high_variance_masks', 'in3')]),
-        (merge_rois, signals, [('out', 'label_files')]),
+        (acc_msk_bin, bold_confounds, [('out_file', 'acompcor_masks')]),
+        (bold_confounds, rename_acompcor, [('acompcor', 'components_file'),
+                                           ('acompcor_metadata', 'metadata_file')]),
 
         # Collate computed confounds together
-        (dvars, add_dvars_header, [('out_nstd', 'in_file')]),
-        (dvars, add_std_dvars_header, [('out_std', 'in_file')]),
-        (signals, concat, [('out_file', 'signals')]),
-        (fdisp, concat, [('out_file', 'fd')]),
-        (tcompcor, concat, [('components_file', 'tcompcor'),
-                            ('pre_filter_file', 'cos_basis')]),
+        (bold_confounds, concat, [('signals', 'signals'),
+                                  ('tcompcor', 'tcompcor'),
+                                  ('cos_basis', 'cos_basis'),
+                                  ('crowncompcor', 'crowncompcor'),
+                                  ('dvars', 'dvars'),
+                                  ('std_dvars', 'std_dvars')]),
         (rename_acompcor, concat, [('components_file', 'acompcor')]),
-        (crowncompcor, concat, [('components_file', 'crowncompcor')]),
-        (motion_params, concat, [('out_file', 'motion')]),
-        (rmsd, concat, [('out_file', 'rmsd')]),
-        (add_dvars_header, concat, [('out_file', 'dvars')]),
-        (add_std_dvars_header, concat, [('out_file', 'std_dvars')]),
+        (motion_metrics, concat, [('motion_file', 'motion'),
+                                  ('rmsd_file', 'rmsd'),
+                                  ('fd_file', 'fd')]),
 
         # Confounds metadata
-        (tcompcor, tcc_metadata_filter, [('metadata_file', 'in_file')]),
+        (bold_confounds, tcc_metadata_filter, [('tcompcor_metadata', 'in_file')]),
         (tcc_metadata_filter, tcc_metadata_fmt, [('out_file', 'in_file')]),
         (rename_acompcor, acc_metadata_filter, [('metadata_file', 'in_file')]),
         (acc_metadata_filter, acc_metadata_fmt, [('out_file', 'in_file')]),
-        (crowncompcor, crowncc_metadata_fmt, [('metadata_file', 'in_file')]),
+        (bold_confounds, crowncc_metadata_fmt, [('crowncompcor_metadata', 'in_file')]),
         (tcc_metadata_fmt, mrg_conf_metadata, [('output', 'in1')]),
         (acc_metadata_fmt, mrg_conf_metadata, [('output', 'in2')]),
         (crowncc_metadata_fmt, mrg_conf_metadata, [('output', 'in3')]),
@@ -596,18 +504,18 @@ the edge of the brain, as proposed by [@patriat_improved_2017].
         # Set outputs
         (spike_regress, outputnode, [('confounds_file', 'confounds_file')]),
         (mrg_conf_metadata2, outputnode, [('out_dict', 'confounds_metadata')]),
-        (tcompcor, outputnode, [('high_variance_masks', 'tcompcor_mask')]),
+        (bold_confounds, outputnode, [('tcompcor_mask', 'tcompcor_mask')]),
         (acc_msk_bin, outputnode, [('out_file', 'acompcor_masks')]),
-        (inputnode, rois_plot, [('bold', 'in_file'),
-                                ('bold_mask', 'in_mask')]),
-        (tcompcor, mrg_compcor, [('high_variance_masks', 'in1')]),
+        (inputnode, rois_plot, [('bold_mask', 'in_mask')]),
+        (bold_confounds, rois_plot, [('ref_file', 'in_file')]),
+        (bold_confounds, mrg_compcor, [('tcompcor_mask', 'in1')]),
         (acc_msk_bin, mrg_compcor, [(('out_file', _last), 'in2')]),
         (subtract_mask, mrg_compcor, [('out_mask', 'in3')]),
         (mrg_compcor, rois_plot, [('out', 'in_rois')]),
         (rois_plot, ds_report_bold_rois, [('out_report', 'in_file')]),
-        (tcompcor, mrg_cc_metadata, [('metadata_file', 'in1')]),
-        (acompcor, mrg_cc_metadata, [('metadata_file', 'in2')]),
-        (crowncompcor, mrg_cc_metadata, [('metadata_file', 'in3')]),
+        (bold_confounds, mrg_cc_metadata, [('tcompcor_metadata', 'in1'),
+                                           ('acompcor_metadata', 'in2'),
+                                           ('crowncompcor_metadata', 'in3')]),
         (mrg_cc_metadata, compcor_plot, [('out', 'metadata_files')]),
         (compcor_plot, ds_report_compcor, [('out_file', 'in_file')]),
         (inputnode, conf_corr_plot, [('skip_vols', 'ignore_initial_volumes')]),
@@ -716,6 +624,7 @@ def init_carpetplot_wf(
 
     parcels = pe.Node(niu.Function(function=_carpet_parcellation), name='parcels')
     parcels.inputs.nifti = not cifti_output
+    parcels.inputs.work_compression = config.execution.work_compression
     # List transforms
     mrg_xfms = pe.Node(niu.Merge(2), name='mrg_xfms')
 
@@ -765,30 +674,36 @@ def init_carpetplot_wf(
     return workflow
 
 
-def _binary_union(mask1, mask2):
+def _binary_union(mask1, mask2, work_compression='default'):
     """Generate the union of two masks."""
     from pathlib import Path
 
     import nibabel as nb
     import numpy as np
 
+    from fmriprep.utils.compression import to_filename, work_compresslevel, work_filename
+
     img = nb.load(mask1)
     mskarr1 = np.asanyarray(img.dataobj, dtype=int) > 0
     mskarr2 = np.asanyarray(nb.load(mask2).dataobj, dtype=int) > 0
     out = img.__class__(mskarr1 | mskarr2, img.affine, img.header)
     out.set_data_dtype('uint8')
-    out_name = Path('mask_union.nii.gz').absolute()
-    out.to_filename(out_name)
-    return str(out_name)
+    out_name = work_filename(Path('mask_union.nii.gz').absolute(), work_compression)
+    to_filename(out, out_name, compresslevel=work_compresslevel(work_compression))
+    return out_name
 
 
-def _carpet_parcellation(segmentation, crown_mask, acompcor_mask, nifti=False):
+def _carpet_parcellation(
+    segmentation, crown_mask, acompcor_mask, nifti=False, work_compression='default'
+):
     """Generate the union of two masks."""
     from pathlib import Path
 
     import nibabel as nb
     import numpy as np
 
+    from fmriprep.utils.compression import to_filename, work_compresslevel, work_filename
+
     img = nb.load(segmentation)
 
     lut = np.zeros((256,), dtype='uint8')
@@ -804,9 +719,9 @@ def _carpet_parcellation(segmentation, crown_mask, acompcor_mask, nifti=False):
 
     outimg = img.__class__(seg.astype('uint8'), img.affine, img.header)
     outimg.set_data_dtype('uint8')
-    out_file = Path('segments.nii.gz').absolute()
-    outimg.to_filename(out_file)
-    return str(out_file)
+    out_file = work_filename(Path('segments.nii.gz').absolute(), work_compression)
+    to_filename(outimg, out_file, compresslevel=work_compresslevel(work_compression))
+    return out_file
 
 
 def _get_zooms(in_file):
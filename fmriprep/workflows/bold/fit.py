@@ -40,6 +40,7 @@ from ...interfaces.resampling import (
     DistortionParameters,
     ReconstructFieldmap,
     ResampleSeries,
+    SplineFilterSeries,
 )
 from ...utils.bids import extract_entities
 from ...utils.misc import estimate_bold_mem_usage
@@ -171,8 +172,9 @@ def init_bold_fit_wf(
     bold_mask
         Mask of ``coreg_boldref``.
     motion_xfm
-        Affine transforms from each BOLD volume to ``hmc_boldref``, written
-        as concatenated ITK affine transforms.
+        Affine transforms from each BOLD volume to ``hmc_boldref``, stored as
+        an N x 4 x 4 array of RAS affines (``.npy``), or as concatenated ITK
+        affine transforms if only those were found among precomputed derivatives.
     boldref2anat_xfm
         Affine transform mapping from BOLD reference space to the anatomical
         space.
@@ -457,8 +459,11 @@ def init_bold_fit_wf(
                 ('boldref', 'inputnode.raw_ref_image'),
                 ('bold_file', 'inputnode.bold_file'),
             ]),
-            (bold_hmc_wf, ds_hmc_wf, [('outputnode.xforms', 'inputnode.xforms')]),
-            (ds_hmc_wf, hmc_buffer, [('outputnode.xforms', 'hmc_xforms')]),
+            (bold_hmc_wf, ds_hmc_wf, [
+                ('outputnode.xforms', 'inputnode.xforms'),
+                ('outputnode.xforms_array', 'inputnode.xforms_array'),
+            ]),
+            (ds_hmc_wf, hmc_buffer, [('outputnode.xforms_array', 'hmc_xforms')]),
         ])  # fmt:skip
     else:
         config.loggers.workflow.info('Found motion correction transforms - skipping Stage 2')
@@ -475,7 +480,14 @@ def init_bold_fit_wf(
             run_without_submitting=True,
         )
 
-        boldref_fmap = pe.Node(ReconstructFieldmap(inverse=[True]), name='boldref_fmap', mem_gb=1)
+        boldref_fmap = pe.Node(
+            ReconstructFieldmap(
+                inverse=[True],
+                fmap_cache_dir=str(config.execution.work_dir / 'fmap_cache'),
+            ),
+            name='boldref_fmap',
+            mem_gb=1,
+        )
 
         workflow.connect([
             (inputnode, fmap_select, [
@@ -598,7 +610,10 @@ def init_bold_fit_wf(
             )
 
             unwarp_boldref = pe.Node(
-                ResampleSeries(jacobian=jacobian),
+                ResampleSeries(
+                    jacobian=jacobian,
+                    work_compression=config.execution.work_compression,
+                ),
                 name='unwarp_boldref',
                 n_procs=omp_nthreads,
                 mem_gb=mem_gb['resampled'],
@@ -757,8 +772,8 @@ def init_bold_native_wf(
     bold_mask
         Mask of BOLD reference file
     motion_xfm
-        Affine transforms from each BOLD volume to ``hmc_boldref``, written
-        as concatenated ITK affine transforms.
+        Affine transforms from each BOLD volume to ``hmc_boldref``, as an
+        N x 4 x 4 array of RAS affines (``.npy``) or concatenated ITK affine transforms.
     boldref2fmap_xfm
         Affine transform mapping from BOLD reference space to the fieldmap
         space, if applicable.
@@ -775,6 +790,10 @@ def init_bold_native_wf(
         BOLD series ready for further resampling. For single-echo data, only
         slice-timing correction (STC) may have been applied. For multi-echo
         data, this is identical to bold_native.
+    bold_coeffs
+        Cubic B-spline coefficients of ``bold_minimal``, stored uncompressed.
+        Resampling these without prefiltering is equivalent to resampling
+        ``bold_minimal``, and avoids repeating the prefilter for each target space.
     bold_native
         BOLD series resampled into BOLD reference space. Slice-timing,
         head motion and susceptibility distortion correction (STC, HMC, SDC)
@@ -854,6 +873,7 @@ def init_bold_native_wf(
         niu.IdentityInterface(
             fields=[
                 'bold_minimal',
+                'bold_coeffs',
                 'bold_native',
                 'metadata',
                 # Transforms
@@ -927,9 +947,22 @@ def init_bold_native_wf(
             ]),
         ])  # fmt:skip
 
+    # Spline coefficients of the minimally-processed series, shared by all resamplers
+    prefilter_bold = pe.Node(
+        SplineFilterSeries(max_volumes=50),
+        name='prefilter_bold',
+        mem_gb=mem_gb['resampled'],
+    )
+
     # Resample to boldref
+    # Single-echo series share the coefficients of bold_minimal
     boldref_bold = pe.Node(
-        ResampleSeries(jacobian=jacobian),
+        ResampleSeries(
+            jacobian=jacobian,
+            prefilter=multiecho,
+            work_compression=config.execution.work_compression,
+            max_volumes=50,
+        ),
         name='boldref_bold',
         n_procs=omp_nthreads,
         mem_gb=mem_gb['resampled'],
@@ -941,14 +974,20 @@ def init_bold_native_wf(
             ('motion_xfm', 'transforms'),
         ]),
         (boldbuffer, boldref_bold, [
-            ('bold_file', 'in_file'),
             ('ro_time', 'ro_time'),
             ('pe_dir', 'pe_dir'),
         ]),
     ])  # fmt:skip
 
     if fieldmap_id:
-        boldref_fmap = pe.Node(ReconstructFieldmap(inverse=[True]), name='boldref_fmap', mem_gb=1)
+        boldref_fmap = pe.Node(
+            ReconstructFieldmap(
+                inverse=[True],
+                fmap_cache_dir=str(config.execution.work_dir / 'fmap_cache'),
+            ),
+            name='boldref_fmap',
+            mem_gb=1,
+        )
         workflow.connect([
             (inputnode, boldref_fmap, [
                 ('boldref', 'target_ref_file'),
@@ -982,9 +1021,11 @@ def init_bold_native_wf(
         # This prevents downstream resamplers from double-dipping
         workflow.connect([
             (inputnode, bold_t2s_wf, [('bold_mask', 'inputnode.bold_mask')]),
+            (boldbuffer, boldref_bold, [('bold_file', 'in_file')]),
             (boldref_bold, join_echos, [('out_file', 'bold_files')]),
             (join_echos, bold_t2s_wf, [('bold_files', 'inputnode.bold_file')]),
             (join_echos, outputnode, [('bold_files', 'bold_echos')]),
+            (bold_t2s_wf, prefilter_bold, [('outputnode.bold', 'in_file')]),
             (bold_t2s_wf, outputnode, [
                 ('outputnode.bold', 'bold_minimal'),
                 ('outputnode.bold', 'bold_native'),
@@ -994,10 +1035,14 @@ def init_bold_native_wf(
     else:
         workflow.connect([
             (inputnode, outputnode, [('motion_xfm', 'motion_xfm')]),
+            (boldbuffer, prefilter_bold, [('bold_file', 'in_file')]),
+            (prefilter_bold, boldref_bold, [('out_file', 'in_file')]),
             (boldbuffer, outputnode, [('bold_file', 'bold_minimal')]),
             (boldref_bold, outputnode, [('out_file', 'bold_native')]),
         ])  # fmt:skip
 
+    workflow.connect([(prefilter_bold, outputnode, [('out_file', 'bold_coeffs')])])
+
     return workflow
 
 
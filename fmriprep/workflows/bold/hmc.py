@@ -71,11 +71,15 @@ def init_bold_hmc_wf(mem_gb: float, omp_nthreads: int, name: str = 'bold_hmc_wf'
     -------
     xforms
         ITKTransform file aligning each volume to ``ref_image``
+    xforms_array
+        The same transforms, as an N x 4 x 4 array of RAS affines (``.npy``)
 
     """
     from niworkflows.engine.workflows import LiterateWorkflow as Workflow
     from niworkflows.interfaces.itk import MCFLIRT2ITK
 
+    from ...interfaces.nitransforms import AffinesToArray
+
     workflow = Workflow(name=name)
     workflow.__desc__ = f"""\
 Head-motion parameters with respect to the BOLD reference
@@ -87,12 +91,15 @@ parameters) are estimated before any spatiotemporal filtering using
     inputnode = pe.Node(
         niu.IdentityInterface(fields=['bold_file', 'raw_ref_image']), name='inputnode'
     )
-    outputnode = pe.Node(niu.IdentityInterface(fields=['xforms']), name='outputnode')
+    outputnode = pe.Node(
+        niu.IdentityInterface(fields=['xforms', 'xforms_array']), name='outputnode'
+    )
 
     # Head motion correction (hmc)
     mcflirt = pe.Node(fsl.MCFLIRT(save_mats=True), name='mcflirt', mem_gb=mem_gb * 3)
 
     fsl2itk = pe.Node(MCFLIRT2ITK(), name='fsl2itk', mem_gb=0.05, n_procs=omp_nthreads)
+    itk2array = pe.Node(AffinesToArray(), name='itk2array', mem_gb=0.05)
 
     workflow.connect([
         (inputnode, mcflirt, [('raw_ref_image', 'ref_file'),
@@ -100,7 +107,9 @@ parameters) are estimated before any spatiotemporal filtering using
         (inputnode, fsl2itk, [('raw_ref_image', 'in_source'),
                               ('raw_ref_image', 'in_reference')]),
         (mcflirt, fsl2itk, [('mat_file', 'in_files')]),
+        (fsl2itk, itk2array, [('out_file', 'in_file')]),
         (fsl2itk, outputnode, [('out_file', 'xforms')]),
+        (itk2array, outputnode, [('out_file', 'xforms_array')]),
     ])  # fmt:skip
 
     return workflow
@@ -596,10 +596,12 @@ def init_ds_hmc_wf(
     workflow = pe.Workflow(name=name)
 
     inputnode = pe.Node(
-        niu.IdentityInterface(fields=['source_files', 'xforms']),
+        niu.IdentityInterface(fields=['source_files', 'xforms', 'xforms_array']),
         name='inputnode',
     )
-    outputnode = pe.Node(niu.IdentityInterface(fields=['xforms']), name='outputnode')
+    outputnode = pe.Node(
+        niu.IdentityInterface(fields=['xforms', 'xforms_array']), name='outputnode'
+    )
 
     sources = pe.Node(
         BIDSURI(
@@ -624,12 +626,29 @@ def init_ds_hmc_wf(
         name='ds_xforms',
         run_without_submitting=True,
     )
+    # Binary sidecar of the same transforms, for fast loading by later consumers
+    ds_xforms_array = pe.Node(
+        DerivativesDataSink(
+            source_file=source_file,
+            base_directory=output_dir,
+            desc='hmc',
+            suffix='xfm',
+            extension='.npy',
+            dismiss_entities=dismiss_echo(),
+            **{'from': 'orig', 'to': 'boldref'},
+        ),
+        name='ds_xforms_array',
+        run_without_submitting=True,
+    )
 
     workflow.connect([
         (inputnode, sources, [('source_files', 'in1')]),
         (inputnode, ds_xforms, [('xforms', 'in_file')]),
+        (inputnode, ds_xforms_array, [('xforms_array', 'in_file')]),
         (sources, ds_xforms, [('out', 'Sources')]),
+        (sources, ds_xforms_array, [('out', 'Sources')]),
         (ds_xforms, outputnode, [('out_file', 'xforms')]),
+        (ds_xforms_array, outputnode, [('out_file', 'xforms_array')]),
     ])  # fmt:skip
 
     return workflow
@@ -695,6 +714,7 @@ def init_ds_bold_native_wf(
             ),
             name='ds_bold',
             mem_gb=DEFAULT_MEMORY_MIN_GB,
+            n_procs=config.nipype.omp_nthreads,
         )
         workflow.connect([
             (inputnode, ds_bold, [
@@ -818,6 +838,7 @@ def init_ds_volumes_wf(
         ),
         name='ds_bold',
         mem_gb=DEFAULT_MEMORY_MIN_GB,
+        n_procs=config.nipype.omp_nthreads,
     )
     workflow.connect([
         (inputnode, sources, [
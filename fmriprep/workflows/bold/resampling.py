@@ -37,21 +37,29 @@ from __future__ import annotations
 
 import typing as ty
 
-from nipype import Function
 from nipype.interfaces import freesurfer as fs
-from nipype.interfaces import fsl
 from nipype.interfaces import utility as niu
 from nipype.pipeline import engine as pe
-from niworkflows.interfaces.fixes import FixHeaderApplyTransforms as ApplyTransforms
 from niworkflows.interfaces.freesurfer import MedialNaNs
 
 from ... import config
 from ...config import DEFAULT_MEMORY_MIN_GB
 from ...interfaces.bids import BIDSURI
-from ...interfaces.workbench import MetricDilate, MetricMask, MetricResample
+from ...interfaces.maths import GoodVoxelsMask
+from ...interfaces.workbench import MetricDilate
 from ...utils.bids import dismiss_echo
 from .outputs import prepare_timing_parameters
 
+# Inputs of surface sampling workflows that sample the native BOLD series directly,
+# and the corresponding inputs of ResampleSeriesRibbon
+NATIVE_SAMPLING_INPUTS = {
+    'resampling_reference': 'ref_file',
+    'bold_transforms': 'transforms',
+    'fieldmap': 'fieldmap',
+    'ro_time': 'ro_time',
+    'pe_dir': 'pe_dir',
+}
+
 
 def init_bold_surf_wf(
     *,
@@ -305,212 +313,17 @@ def init_goodvoxels_bold_mask_wf(mem_gb: float, name: str = 'goodvoxels_bold_mas
         ),
         name='outputnode',
     )
-    ribbon_boldsrc_xfm = pe.Node(
-        ApplyTransforms(interpolation='MultiLabel', transforms='identity'),
-        name='ribbon_boldsrc_xfm',
-        mem_gb=mem_gb,
-    )
-
-    stdev_volume = pe.Node(
-        fsl.maths.StdImage(dimension='T'),
-        name='stdev_volume',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    mean_volume = pe.Node(
-        fsl.maths.MeanImage(dimension='T'),
-        name='mean_volume',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_volume = pe.Node(
-        fsl.maths.BinaryMaths(operation='div'),
-        name='cov_volume',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_ribbon = pe.Node(
-        fsl.ApplyMask(),
-        name='cov_ribbon',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_ribbon_mean = pe.Node(
-        fsl.ImageStats(op_string='-M'),
-        name='cov_ribbon_mean',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_ribbon_std = pe.Node(
-        fsl.ImageStats(op_string='-S'),
-        name='cov_ribbon_std',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_ribbon_norm = pe.Node(
-        fsl.maths.BinaryMaths(operation='div'),
-        name='cov_ribbon_norm',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    smooth_norm = pe.Node(
-        fsl.maths.MathsCommand(args='-bin -s 5'),
-        name='smooth_norm',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    merge_smooth_norm = pe.Node(
-        niu.Merge(1),
-        name='merge_smooth_norm',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-        run_without_submitting=True,
-    )
-
-    cov_ribbon_norm_smooth = pe.Node(
-        fsl.maths.MultiImageMaths(op_string='-s 5 -div %s -dilD'),
-        name='cov_ribbon_norm_smooth',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_norm = pe.Node(
-        fsl.maths.BinaryMaths(operation='div'),
-        name='cov_norm',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_norm_modulate = pe.Node(
-        fsl.maths.BinaryMaths(operation='div'),
-        name='cov_norm_modulate',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    cov_norm_modulate_ribbon = pe.Node(
-        fsl.ApplyMask(),
-        name='cov_norm_modulate_ribbon',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    def _calc_upper_thr(in_stats):
-        return in_stats[0] + (in_stats[1] * 0.5)
-
-    upper_thr_val = pe.Node(
-        Function(
-            input_names=['in_stats'], output_names=['upper_thresh'], function=_calc_upper_thr
-        ),
-        name='upper_thr_val',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    def _calc_lower_thr(in_stats):
-        return in_stats[1] - (in_stats[0] * 0.5)
-
-    lower_thr_val = pe.Node(
-        Function(
-            input_names=['in_stats'], output_names=['lower_thresh'], function=_calc_lower_thr
-        ),
-        name='lower_thr_val',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    mod_ribbon_mean = pe.Node(
-        fsl.ImageStats(op_string='-M'),
-        name='mod_ribbon_mean',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    mod_ribbon_std = pe.Node(
-        fsl.ImageStats(op_string='-S'),
-        name='mod_ribbon_std',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    merge_mod_ribbon_stats = pe.Node(
-        niu.Merge(2),
-        name='merge_mod_ribbon_stats',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-        run_without_submitting=True,
-    )
-
-    bin_mean_volume = pe.Node(
-        fsl.maths.UnaryMaths(operation='bin'),
-        name='bin_mean_volume',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    merge_goodvoxels_operands = pe.Node(
-        niu.Merge(2),
-        name='merge_goodvoxels_operands',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-        run_without_submitting=True,
-    )
-
-    goodvoxels_thr = pe.Node(
-        fsl.maths.Threshold(),
-        name='goodvoxels_thr',
-        mem_gb=mem_gb,
-    )
-
     goodvoxels_mask = pe.Node(
-        fsl.maths.MultiImageMaths(op_string='-bin -sub %s -mul -1'),
-        name='goodvoxels_mask',
-        mem_gb=mem_gb,
+        GoodVoxelsMask(max_volumes=50), name='goodvoxels_mask', mem_gb=mem_gb
     )
 
     # make HCP-style "goodvoxels" mask in t1w space for filtering outlier voxels
     # in bold timeseries, based on modulated normalized covariance
-    workflow.connect(
-        [
-            (inputnode, ribbon_boldsrc_xfm, [('anat_ribbon', 'input_image')]),
-            (inputnode, stdev_volume, [('bold_file', 'in_file')]),
-            (inputnode, mean_volume, [('bold_file', 'in_file')]),
-            (mean_volume, ribbon_boldsrc_xfm, [('out_file', 'reference_image')]),
-            (stdev_volume, cov_volume, [('out_file', 'in_file')]),
-            (mean_volume, cov_volume, [('out_file', 'operand_file')]),
-            (cov_volume, cov_ribbon, [('out_file', 'in_file')]),
-            (ribbon_boldsrc_xfm, cov_ribbon, [('output_image', 'mask_file')]),
-            (cov_ribbon, cov_ribbon_mean, [('out_file', 'in_file')]),
-            (cov_ribbon, cov_ribbon_std, [('out_file', 'in_file')]),
-            (cov_ribbon, cov_ribbon_norm, [('out_file', 'in_file')]),
-            (cov_ribbon_mean, cov_ribbon_norm, [('out_stat', 'operand_value')]),
-            (cov_ribbon_norm, smooth_norm, [('out_file', 'in_file')]),
-            (smooth_norm, merge_smooth_norm, [('out_file', 'in1')]),
-            (cov_ribbon_norm, cov_ribbon_norm_smooth, [('out_file', 'in_file')]),
-            (merge_smooth_norm, cov_ribbon_norm_smooth, [('out', 'operand_files')]),
-            (cov_ribbon_mean, cov_norm, [('out_stat', 'operand_value')]),
-            (cov_volume, cov_norm, [('out_file', 'in_file')]),
-            (cov_norm, cov_norm_modulate, [('out_file', 'in_file')]),
-            (cov_ribbon_norm_smooth, cov_norm_modulate, [('out_file', 'operand_file')]),
-            (cov_norm_modulate, cov_norm_modulate_ribbon, [('out_file', 'in_file')]),
-            (ribbon_boldsrc_xfm, cov_norm_modulate_ribbon, [('output_image', 'mask_file')]),
-            (cov_norm_modulate_ribbon, mod_ribbon_mean, [('out_file', 'in_file')]),
-            (cov_norm_modulate_ribbon, mod_ribbon_std, [('out_file', 'in_file')]),
-            (mod_ribbon_mean, merge_mod_ribbon_stats, [('out_stat', 'in1')]),
-            (mod_ribbon_std, merge_mod_ribbon_stats, [('out_stat', 'in2')]),
-            (merge_mod_ribbon_stats, upper_thr_val, [('out', 'in_stats')]),
-            (merge_mod_ribbon_stats, lower_thr_val, [('out', 'in_stats')]),
-            (mean_volume, bin_mean_volume, [('out_file', 'in_file')]),
-            (upper_thr_val, goodvoxels_thr, [('upper_thresh', 'thresh')]),
-            (cov_norm_modulate, goodvoxels_thr, [('out_file', 'in_file')]),
-            (bin_mean_volume, merge_goodvoxels_operands, [('out_file', 'in1')]),
-            (goodvoxels_thr, goodvoxels_mask, [('out_file', 'in_file')]),
-            (merge_goodvoxels_operands, goodvoxels_mask, [('out', 'operand_files')]),
-        ]
-    )
-
-    goodvoxels_ribbon_mask = pe.Node(
-        fsl.ApplyMask(),
-        name_source=['in_file'],
-        keep_extension=True,
-        name='goodvoxels_ribbon_mask',
-        mem_gb=DEFAULT_MEMORY_MIN_GB,
-    )
-
-    # apply goodvoxels ribbon mask to bold
     workflow.connect([
-        (goodvoxels_mask, goodvoxels_ribbon_mask, [('out_file', 'in_file')]),
-        (ribbon_boldsrc_xfm, goodvoxels_ribbon_mask, [('output_image', 'mask_file')]),
-        (goodvoxels_mask, outputnode, [('out_file', 'goodvoxels_mask')]),
-        (goodvoxels_ribbon_mask, outputnode, [('out_file', 'goodvoxels_ribbon')]),
+        (inputnode, goodvoxels_mask, [('bold_file', 'in_file'),
+                                      ('anat_ribbon', 'ribbon_file')]),
+        (goodvoxels_mask, outputnode, [('goodvoxels_mask', 'goodvoxels_mask'),
+                                       ('goodvoxels_ribbon', 'goodvoxels_ribbon')]),
     ])  # fmt:skip
 
     return workflow
@@ -521,6 +334,8 @@ def init_wb_vol_surf_wf(
     mem_gb: float,
     name: str = 'wb_vol_surf_wf',
     dilate: bool = True,
+    sample_native: bool = False,
+    jacobian: bool = False,
 ):
     """Resample volume to native surface and dilate it using the Workbench.
 
@@ -548,11 +363,17 @@ def init_wb_vol_surf_wf(
         Size of BOLD file in GB.
     name : :class:`str`
         Name of workflow (default: ``wb_vol_surf_wf``).
+    sample_native : :class:`bool`
+        Sample the native BOLD series directly through its transforms, instead of
+        a BOLD series resampled into T1 space.
+    jacobian : :class:`bool`
+        Whether to apply Jacobian correction when sampling the native series.
 
     Inputs
     ------
     bold_file : :class:`str`
-        Path to BOLD file resampled into T1 space
+        Path to BOLD file resampled into T1 space, or, if ``sample_native``,
+        the B-spline coefficients of the native BOLD series
     white : :class:`list` of :class:`str`
         Path to left and right hemisphere white matter GIFTI surfaces.
     pial : :class:`list` of :class:`str`
@@ -561,6 +382,9 @@ def init_wb_vol_surf_wf(
         Path to left and right hemisphere midthickness GIFTI surfaces.
     volume_roi : :class:`str` or Undefined
         Pre-calculated goodvoxels mask. Not required.
+    resampling_reference, bold_transforms, fieldmap, ro_time, pe_dir
+        Outputs of :func:`~fmriprep.workflows.bold.apply.init_bold_volumetric_resample_wf`
+        into T1 space. Only required if ``sample_native``.
 
     Outputs
     -------
@@ -571,8 +395,6 @@ def init_wb_vol_surf_wf(
     from niworkflows.engine.workflows import LiterateWorkflow as Workflow
     from niworkflows.interfaces.utility import KeySelect
 
-    from fmriprep.interfaces.workbench import VolumeToSurfaceMapping
-
     workflow = Workflow(name=name)
     workflow.__desc__ = """\
 The BOLD time-series were resampled onto the native surface of the subject
@@ -587,6 +409,7 @@ using the "ribbon-constrained" method{' and then dilated by 10 mm' * dilate}.
                 'pial',
                 'midthickness',
                 'volume_roi',
+                *NATIVE_SAMPLING_INPUTS,
             ]
         ),
         name='inputnode',
@@ -610,12 +433,7 @@ using the "ribbon-constrained" method{' and then dilated by 10 mm' * dilate}.
         run_without_submitting=True,
     )
 
-    volume_to_surface = pe.Node(
-        VolumeToSurfaceMapping(method='ribbon-constrained'),
-        name='volume_to_surface',
-        mem_gb=mem_gb * 3,
-        n_procs=omp_nthreads,
-    )
+    volume_to_surface = _volume_to_surface_node(sample_native, jacobian, omp_nthreads, mem_gb)
 
     workflow.connect([
         (inputnode, select_surfaces, [
@@ -635,6 +453,11 @@ using the "ribbon-constrained" method{' and then dilated by 10 mm' * dilate}.
         ]),
     ])  # fmt:skip
 
+    if sample_native:
+        workflow.connect([
+            (inputnode, volume_to_surface, list(NATIVE_SAMPLING_INPUTS.items())),
+        ])  # fmt:skip
+
     if dilate:
         metric_dilate = pe.Node(
             MetricDilate(distance=10, nearest=True),
@@ -724,6 +547,8 @@ def init_wb_surf_surf_wf(
     from niworkflows.engine.workflows import LiterateWorkflow as Workflow
     from niworkflows.interfaces.utility import KeySelect
 
+    from fmriprep.interfaces.resampling import MetricResampleSparse
+
     if name is None:
         name = f'wb_surf_native_{template}_{density}_wf'
     workflow = Workflow(name=name)
@@ -779,10 +604,11 @@ def init_wb_surf_surf_wf(
     ]
 
     resample_to_template = pe.Node(
-        MetricResample(method='ADAP_BARY_AREA', area_surfs=True),
+        MetricResampleSparse(
+            weights_cache_dir=str(config.execution.work_dir / 'metric_resample_cache'),
+        ),
         name='resample_to_template',
         mem_gb=mem_gb,
-        n_procs=omp_nthreads,
     )
 
     workflow.connect([
@@ -825,6 +651,8 @@ def init_bold_fsLR_resampling_wf(
     omp_nthreads: int,
     mem_gb: float,
     name: str = 'bold_fsLR_resampling_wf',
+    sample_native: bool = False,
+    jacobian: bool = False,
 ):
     """Resample BOLD time series to fsLR surface.
 
@@ -855,11 +683,17 @@ def init_bold_fsLR_resampling_wf(
         Size of BOLD file in GB
     name : :class:`str`
         Name of workflow (default: ``bold_fsLR_resampling_wf``)
+    sample_native : :class:`bool`
+        Sample the native BOLD series directly through its transforms, instead of
+        a BOLD series resampled into T1 space.
+    jacobian : :class:`bool`
+        Whether to apply Jacobian correction when sampling the native series.
 
     Inputs
     ------
     bold_file : :class:`str`
-        Path to BOLD file resampled into T1 space
+        Path to BOLD file resampled into T1 space, or, if ``sample_native``,
+        the B-spline coefficients of the native BOLD series
     white : :class:`list` of :class:`str`
         Path to left and right hemisphere white matter GIFTI surfaces.
     pial : :class:`list` of :class:`str`
@@ -874,6 +708,9 @@ def init_bold_fsLR_resampling_wf(
         Path to left and right hemisphere cortical masks.
     volume_roi : :class:`str` or Undefined
         Pre-calculated goodvoxels mask. Not required.
+    resampling_reference, bold_transforms, fieldmap, ro_time, pe_dir
+        Outputs of :func:`~fmriprep.workflows.bold.apply.init_bold_volumetric_resample_wf`
+        into T1 space. Only required if ``sample_native``.
 
     Outputs
     -------
@@ -886,7 +723,7 @@ def init_bold_fsLR_resampling_wf(
     from niworkflows.engine.workflows import LiterateWorkflow as Workflow
     from niworkflows.interfaces.utility import KeySelect
 
-    from fmriprep.interfaces.workbench import VolumeToSurfaceMapping
+    from fmriprep.interfaces.resampling import MetricResampleSparse
 
     fslr_density = '32k' if grayord_density == '91k' else '59k'
 
@@ -908,6 +745,7 @@ The BOLD time-series were resampled onto the left/right-symmetric template
                 'sphere_reg_fsLR',
                 'cortex_mask',
                 'volume_roi',
+                *NATIVE_SAMPLING_INPUTS,
             ]
         ),
         name='inputnode',
@@ -966,27 +804,21 @@ The BOLD time-series were resampled onto the left/right-symmetric template
 
     # RibbonVolumeToSurfaceMapping.sh
     # Line 85 thru ...
-    volume_to_surface = pe.Node(
-        VolumeToSurfaceMapping(method='ribbon-constrained'),
-        name='volume_to_surface',
-        mem_gb=mem_gb * 3,
-        n_procs=omp_nthreads,
-    )
+    volume_to_surface = _volume_to_surface_node(sample_native, jacobian, omp_nthreads, mem_gb)
     metric_dilate = pe.Node(
         MetricDilate(distance=10, nearest=True),
         name='metric_dilate',
         mem_gb=1,
         n_procs=omp_nthreads,
     )
-    mask_native = pe.Node(MetricMask(), name='mask_native')
+    # Masking the native and fsLR metrics is folded into the resampling weights
     resample_to_fsLR = pe.Node(
-        MetricResample(method='ADAP_BARY_AREA', area_surfs=True),
+        MetricResampleSparse(
+            weights_cache_dir=str(config.execution.work_dir / 'metric_resample_cache'),
+        ),
         name='resample_to_fsLR',
         mem_gb=1,
-        n_procs=omp_nthreads,
     )
-    # ... line 89
-    mask_fsLR = pe.Node(MetricMask(), name='mask_fsLR')
 
     workflow.connect([
         (inputnode, select_surfaces, [
@@ -1009,25 +841,27 @@ The BOLD time-series were resampled onto the left/right-symmetric template
             ('pial', 'outer_surface'),
         ]),
         (select_surfaces, metric_dilate, [('midthickness', 'surf_file')]),
-        (select_surfaces, mask_native, [('cortex_mask', 'mask')]),
         (volume_to_surface, metric_dilate, [('out_file', 'in_file')]),
-        (metric_dilate, mask_native, [('out_file', 'in_file')]),
         # Resample BOLD to fsLR and mask
         (select_surfaces, resample_to_fsLR, [
             ('sphere_reg_fsLR', 'current_sphere'),
             ('template_sphere', 'new_sphere'),
             ('midthickness', 'current_area'),
             ('midthickness_fsLR', 'new_area'),
-            ('cortex_mask', 'roi_metric'),
+            ('cortex_mask', 'current_roi'),
+            ('template_roi', 'new_roi'),
         ]),
-        (mask_native, resample_to_fsLR, [('out_file', 'in_file')]),
-        (select_surfaces, mask_fsLR, [('template_roi', 'mask')]),
-        (resample_to_fsLR, mask_fsLR, [('out_file', 'in_file')]),
+        (metric_dilate, resample_to_fsLR, [('out_file', 'in_file')]),
         # Output
-        (mask_fsLR, joinnode, [('out_file', 'bold_fsLR')]),
+        (resample_to_fsLR, joinnode, [('out_file', 'bold_fsLR')]),
         (joinnode, outputnode, [('bold_fsLR', 'bold_fsLR')]),
     ])  # fmt:skip
 
+    if sample_native:
+        workflow.connect([
+            (inputnode, volume_to_surface, list(NATIVE_SAMPLING_INPUTS.items())),
+        ])  # fmt:skip
+
     return workflow
 
 
@@ -1036,6 +870,8 @@ def init_bold_grayords_wf(
     mem_gb: float,
     repetition_time: float,
     name: str = 'bold_grayords_wf',
+    jacobian: bool = False,
+    omp_nthreads: int = 1,
 ):
     """
     Sample Grayordinates files onto the fsLR atlas.
@@ -1060,15 +896,21 @@ def init_bold_grayords_wf(
         Repetition time in seconds
     name : :obj:`str`
         Unique name for the subworkflow (default: ``"bold_grayords_wf"``)
+    jacobian : :obj:`bool`
+        Whether to apply Jacobian correction when sampling the native series.
+    omp_nthreads : :obj:`int`
+        Maximum number of threads an individual process may use.
 
     Inputs
     ------
     bold_fsLR : :obj:`str`
         List of paths to BOLD series resampled as functional GIFTI files in fsLR space
-    bold_std : :obj:`str`
-        List of BOLD conversions to standard spaces.
-    spatial_reference : :obj:`str`
-        List of unique identifiers corresponding to the BOLD standard-conversions.
+    bold_coeffs : :obj:`str`
+        B-spline coefficients of the native BOLD series. The subcortical grayordinates
+        are sampled directly from them.
+    bold_transforms, fieldmap, ro_time, pe_dir
+        Outputs of :func:`~fmriprep.workflows.bold.apply.init_bold_volumetric_resample_wf`
+        into MNI152NLin6Asym.
 
 
     Outputs
@@ -1080,7 +922,8 @@ def init_bold_grayords_wf(
 
     """
     from niworkflows.engine.workflows import LiterateWorkflow as Workflow
-    from niworkflows.interfaces.cifti import GenerateCifti
+
+    from fmriprep.interfaces.resampling import ResampleSeriesCifti
 
     workflow = Workflow(name=name)
 
@@ -1093,7 +936,16 @@ data transformed to {mni_density} mm resolution MNI152NLin6Asym space.
 """
 
     inputnode = pe.Node(
-        niu.IdentityInterface(fields=['bold_std', 'bold_fsLR']),
+        niu.IdentityInterface(
+            fields=[
+                'bold_coeffs',
+                'bold_fsLR',
+                'bold_transforms',
+                'fieldmap',
+                'ro_time',
+                'pe_dir',
+            ],
+        ),
         name='inputnode',
     )
 
@@ -1102,19 +954,30 @@ data transformed to {mni_density} mm resolution MNI152NLin6Asym space.
         name='outputnode',
     )
 
+    # Sampled from B-spline coefficients, as the MNI152NLin6Asym series would be resampled
     gen_cifti = pe.Node(
-        GenerateCifti(
+        ResampleSeriesCifti(
             TR=repetition_time,
             grayordinates=grayord_density,
+            jacobian=jacobian,
+            prefilter=False,
+            max_volumes=50,
+            num_threads=omp_nthreads,
+            transforms_cache_dir=str(config.execution.work_dir / 'transforms_cache'),
         ),
         name='gen_cifti',
+        n_procs=omp_nthreads,
         mem_gb=mem_gb,
     )
 
     workflow.connect([
         (inputnode, gen_cifti, [
+            ('bold_coeffs', 'in_file'),
+            ('bold_transforms', 'transforms'),
+            ('fieldmap', 'fieldmap'),
+            ('ro_time', 'ro_time'),
+            ('pe_dir', 'pe_dir'),
             ('bold_fsLR', 'surface_bolds'),
-            ('bold_std', 'bold_file'),
         ]),
         (gen_cifti, outputnode, [
             ('out_file', 'cifti_bold'),
@@ -1122,3 +985,36 @@ data transformed to {mni_density} mm resolution MNI152NLin6Asym space.
         ]),
     ])  # fmt:skip
     return workflow
+
+
+def _volume_to_surface_node(
+    sample_native: bool,
+    jacobian: bool,
+    omp_nthreads: int,
+    mem_gb: float,
+) -> pe.Node:
+    """Ribbon-constrained sampling of a T1w-space BOLD series, or of the native series"""
+    from fmriprep.interfaces.resampling import ResampleSeriesRibbon, VolumeToSurfaceRibbon
+
+    weights_cache_dir = str(config.execution.work_dir / 'ribbon_cache')
+    if not sample_native:
+        return pe.Node(
+            VolumeToSurfaceRibbon(max_volumes=50, weights_cache_dir=weights_cache_dir),
+            name='volume_to_surface',
+            mem_gb=mem_gb * 3,
+        )
+
+    # Sampled from B-spline coefficients, as the T1w-space series would be resampled
+    return pe.Node(
+        ResampleSeriesRibbon(
+            jacobian=jacobian,
+            prefilter=False,
+            max_volumes=50,
+            num_threads=omp_nthreads,
+            weights_cache_dir=weights_cache_dir,
+            transforms_cache_dir=str(config.execution.work_dir / 'transforms_cache'),
+        ),
+        name='volume_to_surface',
+        n_procs=omp_nthreads,
+        mem_gb=mem_gb * 3,
+    )